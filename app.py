@@ -1,5 +1,4 @@
 import os
-import sys
 import time
 import re
 import struct
@@ -11,24 +10,38 @@ from flask_mail import Mail, Message
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 import split
+import jobs
+import ingest
+import output_cache
+import chunked_upload
+import preview_index
+import stats_store
+import storage
+import mail_outbox
+import request_logging
+import metrics
+import logging
 import uuid
 import openpyxl
 import json
+import zipfile
+import shutil
+import mimetypes
+import threading
+import hmac
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from collections import defaultdict
 
-# Force unbuffered output for better debugging
-try:
-    sys.stdout.reconfigure(line_buffering=True)
-    sys.stderr.reconfigure(line_buffering=True)
-except:
-    # Fallback for older Python versions
-    import io
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, line_buffering=True)
-    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, line_buffering=True)
-
 # Load environment variables from .env file
 load_dotenv()
 
+# JSON-lines logs, written by a background thread so requests never wait on stdout
+request_logging.setup_logging(os.environ.get('LOG_LEVEL', 'INFO'))
+log = logging.getLogger('app')
+mail_log = logging.getLogger('app.mail')
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', os.urandom(24).hex())
 
@@ -47,7 +60,34 @@ app.config['GOOGLE_DISCOVERY_URL'] = "https://accounts.google.com/.well-known/op
 
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'outputs'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max request size (single-request uploads, batch ZIPs, upload chunks)
+
+# Retention of uploads and outputs: removed after STORAGE_MAX_AGE_HOURS without use, and least
+# recently used first once both folders together exceed STORAGE_MAX_MB
+app.config['STORAGE_DB'] = 'storage_index.db'
+app.config['STORAGE_MAX_BYTES'] = int(os.environ.get('STORAGE_MAX_MB', 5000)) * 1024 * 1024
+app.config['STORAGE_MAX_AGE'] = int(os.environ.get('STORAGE_MAX_AGE_HOURS', 72)) * 3600
+
+# Downloads: with USE_X_ACCEL_REDIRECT=True Flask only authorizes them and nginx sends the file from
+# the internal location X_ACCEL_REDIRECT_PREFIX/<folder>/ (see nginx_https_config.conf)
+app.config['USE_X_ACCEL_REDIRECT'] = os.environ.get('USE_X_ACCEL_REDIRECT', 'False').lower() == 'true'
+app.config['X_ACCEL_REDIRECT_PREFIX'] = os.environ.get('X_ACCEL_REDIRECT_PREFIX', '/protected').rstrip('/')
+
+# Chunked, resumable uploads: a chunk per request, so files can be larger than MAX_CONTENT_LENGTH
+app.config['UPLOAD_SESSION_FOLDER'] = 'upload_sessions'
+app.config['MAX_UPLOAD_SIZE'] = int(os.environ.get('MAX_UPLOAD_MB', 200)) * 1024 * 1024
+app.config['UPLOAD_SESSION_MAX_AGE'] = int(os.environ.get('UPLOAD_SESSION_MAX_AGE_HOURS', 24)) * 3600
+app.config['MAX_UPLOAD_SESSIONS'] = int(os.environ.get('MAX_UPLOAD_SESSIONS', 5))  # Unfinished chunked uploads per user
+
+# Background processing jobs
+app.config['JOB_FOLDER'] = 'jobs'
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))  # Processing threads per worker process
+app.config['JOB_MAX_AGE'] = int(os.environ.get('JOB_MAX_AGE_HOURS', 24)) * 3600  # Finished jobs are removed after this long
+
+# Cache of processed outputs, keyed by input fingerprint + column + max_chars
+app.config['OUTPUT_CACHE_FOLDER'] = 'output_cache'
+app.config['OUTPUT_CACHE_MAX_BYTES'] = int(os.environ.get('OUTPUT_CACHE_MAX_MB', 500)) * 1024 * 1024
+app.config['OUTPUT_CACHE_MAX_AGE'] = int(os.environ.get('OUTPUT_CACHE_MAX_AGE_HOURS', 24 * 7)) * 3600
 
 # Email configuration
 app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -62,22 +102,27 @@ app.config['MAIL_ENABLED'] = os.environ.get('MAIL_ENABLED', 'False').lower() ==
 # Initialize Flask-Mail
 mail = Mail(app)
 
-# Debug: Print email configuration on startup
+# Notifications are delivered by a background sender over a reused SMTP connection
+outbox = mail_outbox.MailOutbox(
+    app,
+    mail,
+    max_attempts=int(os.environ.get('MAIL_MAX_ATTEMPTS', mail_outbox.DEFAULT_MAX_ATTEMPTS)),
+    idle_timeout=float(os.environ.get('MAIL_IDLE_TIMEOUT', mail_outbox.DEFAULT_IDLE_TIMEOUT))
+)
+
+# Log the email configuration on startup
 if app.config['MAIL_ENABLED']:
-    print("\n" + "="*60)
-    print("EMAIL CONFIGURATION (on startup):")
-    print("="*60)
-    print(f"MAIL_ENABLED: {app.config['MAIL_ENABLED']}")
-    print(f"MAIL_SERVER: {app.config['MAIL_SERVER']}")
-    print(f"MAIL_PORT: {app.config['MAIL_PORT']}")
-    print(f"MAIL_USE_TLS: {app.config['MAIL_USE_TLS']}")
-    print(f"MAIL_USE_SSL: {app.config['MAIL_USE_SSL']}")
-    print(f"MAIL_USERNAME: {app.config['MAIL_USERNAME']}")
-    print(f"MAIL_PASSWORD: {'*' * len(app.config['MAIL_PASSWORD']) if app.config['MAIL_PASSWORD'] else 'NOT SET'}")
-    print(f"MAIL_DEFAULT_SENDER: {app.config['MAIL_DEFAULT_SENDER']}")
-    print("="*60 + "\n")
+    mail_log.info('Email notifications enabled', extra={
+        'mail_server': app.config['MAIL_SERVER'],
+        'mail_port': app.config['MAIL_PORT'],
+        'mail_use_tls': app.config['MAIL_USE_TLS'],
+        'mail_use_ssl': app.config['MAIL_USE_SSL'],
+        'mail_username': app.config['MAIL_USERNAME'],
+        'mail_password_set': bool(app.config['MAIL_PASSWORD']),
+        'mail_default_sender': app.config['MAIL_DEFAULT_SENDER']
+    })
 else:
-    print("EMAIL DEBUG: Email notifications are DISABLED (MAIL_ENABLED=False)")
+    mail_log.info('Email notifications are disabled (MAIL_ENABLED=False)')
 
 # Initialize Flask-Login
 login_manager = LoginManager()
@@ -125,65 +170,119 @@ def load_user(user_id):
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 
-# Statistics tracking file
+# Background job queue used by /process
+job_queue = jobs.JobQueue(app.config['JOB_FOLDER'], max_workers=app.config['JOB_WORKERS'],
+                          max_age=app.config['JOB_MAX_AGE'])
+
+# Unfinished chunked uploads used by /uploads
+upload_sessions = chunked_upload.UploadSessions(
+    app.config['UPLOAD_SESSION_FOLDER'],
+    max_size=app.config['MAX_UPLOAD_SIZE'],
+    max_age=app.config['UPLOAD_SESSION_MAX_AGE'],
+    max_sessions=app.config['MAX_UPLOAD_SESSIONS']
+)
+
+# Processed outputs cache used by /process
+processed_cache = output_cache.OutputCache(
+    app.config['OUTPUT_CACHE_FOLDER'],
+    max_bytes=app.config['OUTPUT_CACHE_MAX_BYTES'],
+    max_age=app.config['OUTPUT_CACHE_MAX_AGE'],
+    sidecar_suffixes=(preview_index.OUTPUT_PREVIEW_SUFFIX,),
+    on_store=preview_index.copy_output_preview
+)
+
+# Statistics tracking database (the old JSON file is imported into it once)
+STATS_DB = 'processing_stats.db'
 STATS_FILE = 'processing_stats.json'
+stats = stats_store.StatsStore(STATS_DB, legacy_json_path=STATS_FILE)
 
-def load_stats():
-    """Load processing statistics from file"""
-    if os.path.exists(STATS_FILE):
-        try:
-            with open(STATS_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            pass
-    return {
-        'total_processed': 0,
-        'total_successful': 0,
-        'total_failed': 0,
-        'total_processing_time': 0.0,
-        'processing_history': []
-    }
+# Prometheus-style metrics: every worker writes snapshots that /metrics merges
+app.config['METRICS_FOLDER'] = 'metrics'
+# Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; without a token only direct requests from localhost are allowed
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN', '')
+app_metrics = metrics.Metrics(app.config['METRICS_FOLDER'])
+app_metrics.counter('processing_jobs_total', 'Processed files by outcome')
+app_metrics.histogram('processing_duration_seconds', 'Processing time of successfully processed files')
+app_metrics.counter('output_cache_requests_total', 'Output cache lookups by result')
+app_metrics.counter('uploaded_bytes_total', 'Bytes received in uploads (batch ZIPs count the files unpacked from them)')
+app_metrics.counter('downloaded_bytes_total', 'Bytes sent in downloads')
+app_metrics.counter('processed_rows_total', 'Rows in successfully processed files')
+app_metrics.counter('processed_cells_total', 'Cells split into overflow columns in successfully processed files')
+app_metrics.counter('storage_removed_files_total', 'Files removed by the storage janitor by reason')
+app_metrics.gauge('job_queue_depth', 'Processing jobs queued or running', lambda: job_queue.depth())
+app_metrics.gauge('mail_outbox_depth', 'Emails waiting to be sent', lambda: outbox.depth())
+
+ETAG_SUFFIX = '.etag'  # Sidecar with the content hash of a downloaded output, see get_file_etag
 
-def save_stats(stats):
-    """Save processing statistics to file"""
+# Index of stored files, cleaned up by a background janitor thread
+storage_janitor = storage.StorageJanitor(
+    app.config['STORAGE_DB'],
+    [app.config['UPLOAD_FOLDER'], app.config['OUTPUT_FOLDER']],
+    max_bytes=app.config['STORAGE_MAX_BYTES'],
+    max_age=app.config['STORAGE_MAX_AGE'],
+    sidecar_suffixes=(ingest.METADATA_SUFFIX, preview_index.PAGES_SUFFIX, preview_index.INDEX_SUFFIX,
+                      preview_index.OUTPUT_PREVIEW_SUFFIX, ETAG_SUFFIX),
+    on_remove=lambda reason, size: app_metrics.inc('storage_removed_files_total', reason=reason)
+)
+
+def add_processing_record(success, processing_time, user_email=None, report=None):
+    """Add a processing record (with the split report of the job, if any) to statistics"""
+    app_metrics.inc('processing_jobs_total', outcome='succeeded' if success else 'failed')
+    if success:
+        app_metrics.observe('processing_duration_seconds', processing_time)
+        if report:
+            app_metrics.inc('processed_rows_total', report['rows_scanned'])
+            app_metrics.inc('processed_cells_total', report['cells_split'])
     try:
-        with open(STATS_FILE, 'w') as f:
-            json.dump(stats, f, indent=2)
+        stats.add_record(success, processing_time, user_email, report)
     except Exception as e:
-        print(f"Error saving stats: {e}")
+        # Statistics must never fail a job
+        log.warning('Error saving stats: %s', e)
 
-def add_processing_record(success, processing_time, user_email=None):
-    """Add a processing record to statistics"""
-    stats = load_stats()
-    stats['total_processed'] += 1
-    if success:
-        stats['total_successful'] += 1
-    else:
-        stats['total_failed'] += 1
-    
-    if processing_time:
-        stats['total_processing_time'] += processing_time
-    
-    # Add to history (keep last 1000 records)
-    stats['processing_history'].append({
-        'timestamp': datetime.now().isoformat(),
-        'success': success,
-        'processing_time': processing_time,
-        'user_email': user_email
-    })
-    
-    # Keep only last 1000 records
-    if len(stats['processing_history']) > 1000:
-        stats['processing_history'] = stats['processing_history'][-1000:]
-    
-    save_stats(stats)
+def add_cache_hit_record(user_email=None):
+    """Count a /process request answered from the output cache (kept out of the processing times)"""
+    try:
+        stats.add_cache_hit(user_email)
+    except Exception as e:
+        log.warning('Error saving stats: %s', e)
 
-ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
+ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv', 'tsv', 'txt'}
+INVALID_FILE_TYPE_ERROR = 'Invalid file type. Please upload .xlsx, .xls, .csv, .tsv or .txt files'
 MAX_COLUMN_LENGTH = 3  # Maximum column name length (e.g., "ZZZ")
 MAX_CHARS_LIMIT = 23  # Maximum characters per cell limit (recommended: 18-20)
 MIN_CHARS_LIMIT = 18  # Minimum characters per cell limit
 SUGGESTED_MAX_CHARS = 20  # Suggested optimal value
 
+# Batch processing limits
+MAX_BATCH_FILES = 50  # Maximum number of workbooks per batch (files or ZIP members)
+MAX_BATCH_UNCOMPRESSED_SIZE = 200 * 1024 * 1024  # Maximum total size of workbooks extracted from ZIP uploads
+# Processes of the batch pool shared by all batches of a worker process; every gunicorn worker has
+# one, so by default the pools of the 4 workers together use about as many processes as CPUs
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 0)) or max(1, (os.cpu_count() or 1) // 4)
+
+# Job progress streams (/jobs/<id>/events)
+JOB_EVENTS_POLL_INTERVAL = 0.5  # Seconds between two reads of the job file
+JOB_EVENTS_HEARTBEAT = 15  # Seconds of silence before a heartbeat comment
+JOB_EVENTS_MAX_DURATION = 300  # Seconds a stream stays open before the browser reconnects
+JOB_EVENTS_RETRY_MS = 2000  # Reconnection delay announced to EventSource
+
+# Dry-run estimates (/api/estimate), calibrated from the statistics history
+ESTIMATE_CALIBRATION_JOBS = 200  # Most recent history records looked at
+ESTIMATE_MIN_JOBS = 3  # With fewer matching jobs the defaults below are used
+# Seconds per row of a job by engine and output format, measured on generated 50k row files (max_chars 20)
+ESTIMATE_DEFAULT_SECONDS_PER_ROW = {
+    (split.ENGINE_RAW_XML, split.OUTPUT_XLSX): 0.00003,
+    (split.ENGINE_STREAMING, split.OUTPUT_XLSX): 0.00009,
+    (split.ENGINE_IN_MEMORY, split.OUTPUT_XLSX): 0.00007,
+    (split.ENGINE_TEXT, split.OUTPUT_XLSX): 0.00006,
+    (split.ENGINE_TEXT, split.OUTPUT_CSV): 0.000005
+}
+ESTIMATE_DEFAULT_OVERFLOW_CELL_BYTES = 4  # Compressed bytes an overflow cell adds to an xlsx output
+ESTIMATE_DEFAULT_TEXT_SIZE_RATIO = {  # Output size / CSV-TSV-TXT input size, by output format
+    split.OUTPUT_XLSX: 0.5,
+    split.OUTPUT_CSV: 1.0  # Every split turns the space it happens on into a delimiter
+}
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -207,7 +306,9 @@ def validate_max_chars(max_chars):
     return True, None
 
 def validate_excel_file(filepath):
-    """Validate that the file is a valid Excel file"""
+    """Validate that the file is a valid Excel file (text files are read without openpyxl)"""
+    if split.is_text_file(filepath):
+        return True, None
     try:
         wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
         wb.close()
@@ -215,33 +316,143 @@ def validate_excel_file(filepath):
     except Exception as e:
         return False, f"Invalid Excel file: {str(e)}"
 
+def validate_text_content(header):
+    """Check that a CSV/TSV/TXT upload is text (no NUL bytes at its start, as in binary files)"""
+    if b'\x00' in header:
+        return False, "File does not appear to be a text file (binary content found)"
+    return True, None
+
+def check_file_signature(header, filename):
+    """
+    Check the first bytes of a file (up to chunked_upload.SNIFF_SIZE) against the signatures of its type.
+    
+    Returns: (is_valid, error_message)
+    """
+    if split.is_text_file(filename):
+        return validate_text_content(header)
+    
+    # Excel file signatures:
+    # .xlsx: PK\x03\x04 (ZIP archive, Excel 2007+)
+    # .xls: \xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1 (OLE2, Excel 97-2003)
+    
+    if len(header) < 8:
+        return False, "File too small or corrupted"
+    
+    # Check for .xlsx (ZIP-based format)
+    if header[:2] == b'PK':
+        # Verify it's actually a ZIP file
+        if header[2:4] == b'\x03\x04':
+            return True, None
+    
+    # Check for .xls (OLE2 format)
+    if header[:8] == b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1':
+        return True, None
+    
+    return False, "File does not appear to be a valid Excel file (invalid file signature)"
+
 def validate_file_content(filepath):
     """Enhanced file validation: Check file signature/MIME type"""
     try:
         with open(filepath, 'rb') as f:
-            # Read first 8 bytes to check file signature
-            header = f.read(8)
-            
-            # Excel file signatures:
-            # .xlsx: PK\x03\x04 (ZIP archive, Excel 2007+)
-            # .xls: \xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1 (OLE2, Excel 97-2003)
-            
-            if len(header) < 8:
-                return False, "File too small or corrupted"
-            
-            # Check for .xlsx (ZIP-based format)
-            if header[:2] == b'PK':
-                # Verify it's actually a ZIP file
-                if header[2:4] == b'\x03\x04':
-                    return True, None
-            
-            # Check for .xls (OLE2 format)
-            if header[:8] == b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1':
-                return True, None
-            
-            return False, "File does not appear to be a valid Excel file (invalid file signature)"
+            header = f.read(chunked_upload.SNIFF_SIZE)
     except Exception as e:
         return False, f"Error reading file: {str(e)}"
+    return check_file_signature(header, filepath)
+
+def save_upload(file, filepath):
+    """
+    Write an uploaded file to disk, hashing its bytes while they are written
+    (block fingerprint, the same as for chunked uploads).
+    
+    Returns: (content_hash, size)
+    """
+    hasher = chunked_upload.BlockHasher()
+    size = 0
+    with open(filepath, 'wb') as f:
+        while True:
+            chunk = file.stream.read(1024 * 1024)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    app_metrics.inc('uploaded_bytes_total', size)
+    return hasher.hexdigest(), size
+
+def ingest_file(filepath, content_hash=None):
+    """
+    Validate a stored upload and parse it once: the file signature is checked, then the
+    workbook is opened a single time to collect its metadata, which is stored next to
+    the file for the later steps (validation, processing, preview).
+    
+    Returns: (metadata, error_message)
+    """
+    is_valid, error_msg = validate_file_content(filepath)
+    if not is_valid:
+        return None, error_msg
+    
+    try:
+        metadata = ingest.inspect_file(filepath)
+    except Exception as e:
+        if split.is_text_file(filepath):
+            return None, f"Invalid text file: {str(e)}"
+        return None, f"Invalid Excel file: {str(e)}"
+    
+    metadata['content_hash'] = content_hash
+    ingest.save_metadata(filepath, metadata)
+    return metadata, None
+
+def build_validation_result(metadata):
+    """
+    Check that a workbook has only one sheet and only one column with data, from its metadata.
+    
+    Returns: (response_data, status_code)
+    """
+    if metadata['sheet_count'] != 1:
+        return {
+            'success': False,
+            'error': f'File must contain exactly ONE sheet. Found {metadata["sheet_count"]} sheet(s): {", ".join(metadata["sheet_names"])}',
+            'sheet_count': metadata['sheet_count'],
+            'sheet_names': metadata['sheet_names']
+        }, 400
+    
+    columns_with_data = metadata['columns_with_data']
+    if len(columns_with_data) == 0:
+        return {
+            'success': False,
+            'error': 'No data found in the file. The file appears to be empty.',
+            'columns_with_data': []
+        }, 400
+    
+    if len(columns_with_data) > 1:
+        column_letters = [col['letter'] for col in columns_with_data]
+        return {
+            'success': False,
+            'error': f'Data exists in multiple columns: {", ".join(column_letters)}. Data must exist ONLY in one column.',
+            'columns_with_data': columns_with_data
+        }, 400
+    
+    # File is valid - suggest optimal parameters
+    single_column = columns_with_data[0]
+    # Always suggest 20 characters (optimal range is 18-20, max 23)
+    suggested_max_chars = SUGGESTED_MAX_CHARS
+    
+    return {
+        'success': True,
+        'valid': True,
+        'sheet_count': 1,
+        'column_with_data': single_column['letter'],
+        'suggested_parameters': {
+            'column': single_column['letter'],
+            'max_chars': suggested_max_chars,
+            'reason': 'Optimal value: 20 characters (recommended range: 18-20, maximum: 23)'
+        },
+        'file_info': {
+            'total_rows': metadata['total_rows'],
+            'total_columns': metadata['total_columns'],
+            'column_stats': single_column
+        }
+    }, 200
 
 def sanitize_filename(filename):
     """Additional sanitization for filename"""
@@ -350,9 +561,7 @@ def callback():
         
         return redirect(url_for('index'))
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"Authentication error: {error_details}")  # Debug output
+        log.exception('Authentication error')
         return render_template('login.html', error=f"Error during authentication: {str(e)}"), 400
 
 @app.route('/logout')
@@ -366,77 +575,198 @@ def logout():
     session.permanent = False
     return redirect(url_for('login'))
 
-@app.route('/upload', methods=['POST'])
-@login_required
-def upload_file():
-    if 'file' not in request.files:
-        return jsonify({'success': False, 'error': 'No file provided'}), 400
+def check_upload_filename(filename):
+    """
+    Validate the name of an uploaded file and pick its unique stored name.
     
-    file = request.files['file']
-    
-    if file.filename == '':
-        return jsonify({'success': False, 'error': 'No file selected'}), 400
+    Returns: (upload, error_message) - upload is a dict with file_id, filename, uploaded_filename and filepath
+    """
+    if not filename:
+        return None, 'No file selected'
     
     # Validate file extension
-    if not allowed_file(file.filename):
-        return jsonify({'success': False, 'error': 'Invalid file type. Please upload .xlsx or .xls files'}), 400
+    if not allowed_file(filename):
+        return None, INVALID_FILE_TYPE_ERROR
     
     # Sanitize filename
-    original_filename = sanitize_filename(secure_filename(file.filename))
+    original_filename = sanitize_filename(secure_filename(filename))
     if not original_filename:
-        return jsonify({'success': False, 'error': 'Invalid filename'}), 400
+        return None, 'Invalid filename'
     
     # Generate unique filename to avoid conflicts
     file_id = str(uuid.uuid4())
-    filename = f"{file_id}_{original_filename}"
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    stored_filename = f"{file_id}_{original_filename}"
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], stored_filename)
     
     # Ensure path is within upload folder (prevent path traversal)
     filepath = os.path.normpath(filepath)
     if not filepath.startswith(os.path.normpath(app.config['UPLOAD_FOLDER'])):
-        return jsonify({'success': False, 'error': 'Invalid file path'}), 400
+        return None, 'Invalid file path'
+    
+    return {
+        'file_id': file_id,
+        'filename': original_filename,
+        'uploaded_filename': stored_filename,
+        'filepath': filepath
+    }, None
+
+def finish_upload(upload, content_hash, require_valid):
+    """
+    Ingest a stored upload and build the /upload response. With require_valid the file is
+    only kept if it passes the single-sheet/single-column validation.
+    
+    Returns: (response_data, status_code)
+    """
+    filepath = upload['filepath']
+    # Check the file signature and parse the workbook once, keeping its metadata
+    with metrics.server_timing('ingest'):
+        metadata, error_msg = ingest_file(filepath, content_hash)
+    if metadata is None:
+        # Clean up invalid file
+        try:
+            os.remove(filepath)
+        except:
+            pass
+        return {'success': False, 'error': error_msg}, 400
+    
+    validation, status_code = build_validation_result(metadata)
+    if require_valid and status_code != 200:
+        try:
+            os.remove(filepath)
+        except:
+            pass
+        ingest.remove_metadata(filepath)
+        validation['validation_failed'] = True
+        return validation, status_code
+    
+    storage_janitor.record(filepath, owner=current_user.email)
+    return {
+        'success': True,
+        'file_id': upload['file_id'],
+        'filename': upload['filename'],
+        'uploaded_filename': upload['uploaded_filename'],
+        'upload_time': datetime.now().isoformat(),
+        'validation': validation
+    }, 200
+
+def get_require_valid():
+    return (request.form.get('require_valid') or request.args.get('require_valid') or 'false').lower() in ('1', 'true')
+
+@app.route('/upload', methods=['POST'])
+@login_required
+def upload_file():
+    if 'file' not in request.files:
+        return jsonify({'success': False, 'error': 'No file provided'}), 400
+    
+    file = request.files['file']
+    upload, error_msg = check_upload_filename(file.filename)
+    if upload is None:
+        return jsonify({'success': False, 'error': error_msg}), 400
     
     try:
-        file.save(filepath)
-        
-        # Enhanced file validation: Check file content/signature
-        is_valid, error_msg = validate_file_content(filepath)
-        if not is_valid:
-            # Clean up invalid file
-            try:
-                os.remove(filepath)
-            except:
-                pass
-            return jsonify({'success': False, 'error': error_msg}), 400
-        
-        # Validate that the file is actually a valid Excel file (can be opened)
-        is_valid, error_msg = validate_excel_file(filepath)
-        if not is_valid:
-            # Clean up invalid file
-            try:
-                os.remove(filepath)
-            except:
-                pass
-            return jsonify({'success': False, 'error': error_msg}), 400
-        
+        with metrics.server_timing('save'):
+            content_hash, _ = save_upload(file, upload['filepath'])
+        response_data, status_code = finish_upload(upload, content_hash, get_require_valid())
     except Exception as e:
         return jsonify({'success': False, 'error': f'Error saving file: {str(e)}'}), 500
     
-    return jsonify({
-        'success': True,
-        'file_id': file_id,
-        'filename': original_filename,
-        'uploaded_filename': filename,
-        'upload_time': datetime.now().isoformat()
-    })
+    return jsonify(response_data), status_code
 
-@app.route('/process', methods=['POST'])
+@app.route('/uploads', methods=['POST'])
 @login_required
-def process_file():
+def start_upload():
+    """Start a chunked upload: {"filename": ..., "size": bytes}. Chunks then go to PUT /uploads/<id>/chunks/<index>."""
     data = request.json
     if not data:
         return jsonify({'success': False, 'error': 'Invalid request data'}), 400
     
+    upload, error_msg = check_upload_filename(sanitize_input(data.get('filename'), max_length=300))
+    if upload is None:
+        return jsonify({'success': False, 'error': error_msg}), 400
+    try:
+        size = int(data.get('size'))
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'error': 'Invalid file size'}), 400
+    
+    try:
+        state = upload_sessions.create(upload['filename'], size, owner=current_user.email)
+    except chunked_upload.UploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status_code
+    
+    return jsonify({
+        'success': True,
+        'upload': chunked_upload.public_state(state),
+        'status_url': url_for('get_upload', upload_id=state['id'])
+    }), 201
+
+@app.route('/uploads/<upload_id>')
+@login_required
+def get_upload(upload_id):
+    """State of a chunked upload, used to resume it from the first missing chunk"""
+    try:
+        state = upload_sessions.get(upload_id, owner=current_user.email)
+    except chunked_upload.UploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status_code
+    return jsonify({'success': True, 'upload': chunked_upload.public_state(state)})
+
+@app.route('/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@login_required
+def put_upload_chunk(upload_id, index):
+    """Store one chunk (raw request body), written to disk and hashed as it is received"""
+    if request.content_length is None:
+        return jsonify({'success': False, 'error': 'Content-Length is required'}), 411
+    
+    try:
+        state = upload_sessions.get(upload_id, owner=current_user.email)
+        with metrics.server_timing('save'):
+            state = upload_sessions.add_chunk(
+                upload_id, index, request.stream, request.content_length, owner=current_user.email,
+                check_header=lambda header: check_file_signature(header, state['filename'])
+            )
+    except chunked_upload.UploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status_code
+    
+    app_metrics.inc('uploaded_bytes_total', request.content_length)
+    return jsonify({'success': True, 'upload': chunked_upload.public_state(state)})
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_upload(upload_id):
+    """Finish a chunked upload once every chunk was received. Answers like /upload."""
+    try:
+        state = upload_sessions.get(upload_id, owner=current_user.email)
+        upload, error_msg = check_upload_filename(state['filename'])
+        if upload is None:
+            return jsonify({'success': False, 'error': error_msg}), 400
+        content_hash, _ = upload_sessions.complete(upload_id, upload['filepath'], owner=current_user.email)
+    except chunked_upload.UploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status_code
+    
+    try:
+        response_data, status_code = finish_upload(upload, content_hash, get_require_valid())
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error saving file: {str(e)}'}), 500
+    return jsonify(response_data), status_code
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def abort_upload(upload_id):
+    """Cancel a chunked upload and drop the chunks received so far"""
+    try:
+        upload_sessions.abort(upload_id, owner=current_user.email)
+    except chunked_upload.UploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status_code
+    return jsonify({'success': True})
+
+def parse_process_request(data):
+    """
+    Check the uploaded_filename, column, max_chars and output_format of a /process or /api/estimate request.
+
+    Returns: (params, error_message, status_code); params is None if the request is invalid
+    """
+    if not data:
+        return None, 'Invalid request data', 400
+    
     # Enhanced input sanitization
     uploaded_filename = sanitize_input(data.get('uploaded_filename'), max_length=300)
     column = sanitize_input(data.get('column'), max_length=3)
@@ -446,24 +776,29 @@ def process_file():
     # Handle max_chars - it might be int or string from JSON
     max_chars_value = data.get('max_chars')
     if max_chars_value is None:
-        return jsonify({'success': False, 'error': 'Missing max_chars parameter'}), 400
+        return None, 'Missing max_chars parameter', 400
     
     if not all([uploaded_filename, column]):
-        return jsonify({'success': False, 'error': 'Missing required parameters'}), 400
+        return None, 'Missing required parameters', 400
+    
+    # CSV output is only available for CSV/TSV/TXT uploads
+    output_format = data.get('output_format') or split.OUTPUT_XLSX
+    if output_format not in split.OUTPUT_FORMATS:
+        return None, f'Invalid output format. Available formats: {", ".join(split.OUTPUT_FORMATS)}', 400
     
     # Validate column name again
     is_valid, error_msg = validate_column_name(column)
     if not is_valid:
-        return jsonify({'success': False, 'error': error_msg}), 400
+        return None, error_msg, 400
     
     # Validate max_chars - convert to int (handles both int and string)
     try:
         max_chars = int(max_chars_value)
         is_valid, error_msg = validate_max_chars(max_chars)
         if not is_valid:
-            return jsonify({'success': False, 'error': error_msg}), 400
+            return None, error_msg, 400
     except (ValueError, TypeError):
-        return jsonify({'success': False, 'error': 'Invalid max characters value'}), 400
+        return None, 'Invalid max characters value', 400
     
     # Sanitize filename to prevent path traversal
     uploaded_filename = sanitize_filename(uploaded_filename)
@@ -472,20 +807,132 @@ def process_file():
     # Ensure path is within upload folder (prevent path traversal)
     filepath = os.path.normpath(filepath)
     if not filepath.startswith(os.path.normpath(app.config['UPLOAD_FOLDER'])):
-        return jsonify({'success': False, 'error': 'Invalid file path'}), 400
+        return None, 'Invalid file path', 400
     
     if not os.path.exists(filepath):
-        return jsonify({'success': False, 'error': 'File not found'}), 404
+        return None, 'File not found', 404
+    
+    if output_format != split.OUTPUT_XLSX and not split.is_text_file(filepath):
+        return None, 'CSV output is only available for CSV, TSV and TXT files', 400
+    
+    # Reject files that cannot pass validation using the metadata stored at upload, without opening the workbook
+    metadata = ingest.load_metadata(filepath)
+    if metadata is not None:
+        is_valid, error_msg = ingest.check_column(metadata, column, text=split.is_text_file(filepath))
+        if not is_valid:
+            return None, error_msg, 400
     
+    return {
+        'uploaded_filename': uploaded_filename,
+        'filepath': filepath,
+        'column': column,
+        'max_chars': max_chars,
+        'output_format': output_format,
+        'metadata': metadata
+    }, None, 200
+
+@app.route('/process', methods=['POST'])
+@login_required
+def process_file():
+    params, error_msg, status_code = parse_process_request(request.json)
+    if params is None:
+        return jsonify({'success': False, 'error': error_msg}), status_code
+    uploaded_filename = params['uploaded_filename']
+    filepath = params['filepath']
+    column = params['column']
+    max_chars = params['max_chars']
+    output_format = params['output_format']
+    metadata = params['metadata']
+    
+    user_email = current_user.email if current_user.is_authenticated else None
+    storage_janitor.touch(filepath)
+    
+    # The same file was already processed with the same parameters - return the cached output
+    cache_key = None
+    if metadata is not None and metadata.get('content_hash'):
+        cache_key = output_cache.make_key(metadata['content_hash'], column, max_chars, output_format)
+        start_time = time.time()
+        cached_path = processed_cache.get(cache_key)
+        app_metrics.inc('output_cache_requests_total', result='hit' if cached_path else 'miss')
+        if cached_path:
+            output_basename = os.path.basename(split.get_output_filename(filepath, output_format=output_format))
+            output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_basename)
+            try:
+                output_cache.link_or_copy(cached_path, output_path)
+                # The stored output preview, so /preview does not have to open the file
+                preview_index.copy_output_preview(cached_path, output_path)
+                storage_janitor.record(output_path, owner=user_email)
+                processing_time = time.time() - start_time
+                add_cache_hit_record(user_email)
+                return jsonify({
+                    'success': True,
+                    'message': 'File successfully processed.',
+                    'output_filename': output_basename,
+                    'processing_time': round(processing_time, 2),
+                    'cached': True
+                })
+            except OSError as e:
+                # Evicted in the meantime - process the file normally
+                log.warning('Output cache: could not reuse cached output: %s', e)
+    
+    # Capture everything the job needs from the request, it runs outside the request context
+    user_name = current_user.name if current_user.is_authenticated else None
+    base_url = os.environ.get('BASE_URL', '') or request.host_url.rstrip('/')
+
+    job_id = job_queue.submit(
+        run_processing_job,
+        kwargs={
+            'filepath': filepath,
+            'uploaded_filename': uploaded_filename,
+            'column': column,
+            'max_chars': max_chars,
+            'user_email': user_email,
+            'user_name': user_name,
+            'base_url': base_url,
+            'cache_key': cache_key,
+            'output_format': output_format
+        },
+        owner=user_email,
+        params={'uploaded_filename': uploaded_filename, 'column': column, 'max_chars': max_chars, 'output_format': output_format},
+        progress=True
+    )
+
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'state': jobs.JOB_QUEUED,
+        'status_url': url_for('get_job', job_id=job_id),
+        'events_url': url_for('job_events', job_id=job_id)
+    }), 202
+
+def run_processing_job(**kwargs):
+    """Job entry point: jobs run on a background thread, so give them an application context (needed by Flask-Mail)"""
+    with app.app_context():
+        return process_uploaded_file(**kwargs)
+
+def process_uploaded_file(filepath, uploaded_filename, column, max_chars, user_email, user_name, base_url, cache_key=None,
+                          output_format=split.OUTPUT_XLSX, progress=None):
+    """
+    Process an uploaded file in the background. progress(dict) receives the split progress, see split.SplitProgress.
+
+    Returns the same result dict /process used to return, so the front-end can handle it unchanged.
+    """
     try:
         # Start timing
         start_time = time.time()
         
-        # Process the file using split.py
-        success, message, output_filename = split.main(filepath, column, max_chars)
+        # Process the file using split.py (one split cache, report and output preview per job)
+        split_cache = split.SplitCache()
+        split_report = split.SplitReport()
+        split_preview = split.OutputPreview()
+        split_progress = split.SplitProgress(progress)
+        success, message, output_filename = split.main(filepath, column, max_chars, cache=split_cache, report=split_report,
+                                                       output_format=output_format, preview=split_preview,
+                                                       progress=split_progress)
         
         # Calculate processing time
         processing_time = time.time() - start_time
+        report = split_report.to_dict()
         
         if success:
             # Move output file to outputs folder
@@ -493,90 +940,534 @@ def process_file():
                 output_basename = os.path.basename(output_filename)
                 output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_basename)
                 os.rename(output_filename, output_path)
+                storage_janitor.record(output_path, owner=user_email)
+                
+                # The first rows kept while writing answer the output preview without opening the file
+                try:
+                    preview_index.save_output_preview(output_path, split_preview)
+                except OSError as e:
+                    log.warning('Could not store the output preview: %s', e)
+                
+                # Keep the output for identical future requests
+                if cache_key:
+                    try:
+                        processed_cache.put(cache_key, output_path)
+                    except OSError as e:
+                        log.warning('Output cache: could not store output: %s', e)
                 
                 # Send email notification if enabled
-                if app.config['MAIL_ENABLED'] and current_user.is_authenticated:
-                    print(f"\nEMAIL DEBUG: Attempting to send email to {current_user.email}")
+                if app.config['MAIL_ENABLED'] and user_email:
                     try:
                         send_processing_complete_email(
-                            current_user.email,
-                            current_user.name,
+                            user_email,
+                            user_name,
                             uploaded_filename,
                             output_basename,
-                            round(processing_time, 2)
+                            round(processing_time, 2),
+                            base_url
                         )
                     except Exception as e:
-                        # Don't fail the request if email fails
-                        print(f"EMAIL DEBUG: Exception caught in process_file: {str(e)}")
-                        import traceback
-                        traceback.print_exc()
-                elif not app.config['MAIL_ENABLED']:
-                    print("EMAIL DEBUG: Email disabled or user not authenticated - skipping email")
-                elif not current_user.is_authenticated:
-                    print("EMAIL DEBUG: User not authenticated - skipping email")
+                        # Don't fail the job if email fails
+                        mail_log.exception('Could not queue the completion email')
+                elif not user_email:
+                    mail_log.debug('User not authenticated - skipping email')
                 
                 # Track successful processing
-                user_email = current_user.email if current_user.is_authenticated else None
-                add_processing_record(True, round(processing_time, 2), user_email)
+                add_processing_record(True, round(processing_time, 2), user_email, report)
                 
-                return jsonify({
+                return {
                     'success': True,
                     'message': message,
                     'output_filename': output_basename,
-                    'processing_time': round(processing_time, 2)
-                })
+                    'processing_time': round(processing_time, 2),
+                    'split_cache': split_cache.stats(),
+                    'report': report,
+                    'cached': False
+                }
             else:
                 # Track failed processing
-                user_email = current_user.email if current_user.is_authenticated else None
-                add_processing_record(False, round(processing_time, 2), user_email)
-                return jsonify({'success': False, 'error': 'Output file was not created'}), 500
+                add_processing_record(False, round(processing_time, 2), user_email, report)
+                return {'success': False, 'error': 'Output file was not created', 'report': report}
         else:
             # Track failed processing
-            user_email = current_user.email if current_user.is_authenticated else None
-            add_processing_record(False, 0, user_email)
-            return jsonify({'success': False, 'error': message}), 500
+            add_processing_record(False, 0, user_email, report)
+            return {'success': False, 'error': message, 'report': report}
             
     except Exception as e:
         # Track failed processing
-        user_email = current_user.email if current_user.is_authenticated else None
         add_processing_record(False, 0, user_email)
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return {'success': False, 'error': str(e)}
+
+def job_status(job):
+    """Public view of a job, for /jobs/<id> and its event stream"""
+    result = job.get('result') or {}
+    return {
+        'job_id': job['id'],
+        'state': job['state'],
+        'done': job['state'] in jobs.FINISHED_STATES,
+        'params': job['params'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'queue_time': job['queue_time'],
+        'run_time': job['run_time'],
+        'progress': job.get('progress'),
+        'output_filename': result.get('output_filename'),
+        'error': job['error'],
+        'result': job['result']
+    }
+
+@app.route('/jobs/<job_id>')
+@login_required
+def get_job(job_id):
+    """Get the state, timings, progress and result of a processing job"""
+    job = job_queue.get(job_id)
+    # Only the user who started a job can see it
+    if job is None or job.get('owner') != current_user.email:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    return jsonify({'success': True, 'job': job_status(job)})
+
+def format_sse(event, data):
+    """One Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/jobs/<job_id>/events')
+@login_required
+def job_events(job_id):
+    """
+    Stream the progress of a job as Server-Sent Events: a 'progress' event whenever
+    the job reports progress, then one 'done' event with the /jobs/<id> payload.
+
+    The job file is the only state shared between workers, so the stream checks it
+    every JOB_EVENTS_POLL_INTERVAL. A comment line is sent when nothing happened for
+    JOB_EVENTS_HEARTBEAT seconds so proxies keep the connection open, and streams end
+    after JOB_EVENTS_MAX_DURATION; EventSource reconnects on its own and gets the
+    current state again.
+    """
+    job = job_queue.get(job_id)
+    if job is None or job.get('owner') != current_user.email:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    def generate(job):
+        started = last_sent = time.monotonic()
+        yield f"retry: {JOB_EVENTS_RETRY_MS}\n\n"
+        sent = None
+        while True:
+            if job['state'] in jobs.FINISHED_STATES:
+                yield format_sse('done', job_status(job))
+                return
+            current = (job['state'], job.get('progress'))
+            now = time.monotonic()
+            if current != sent:
+                yield format_sse('progress', {'state': job['state'], 'progress': job.get('progress')})
+                sent = current
+                last_sent = now
+            elif now - last_sent >= JOB_EVENTS_HEARTBEAT:
+                yield ': heartbeat\n\n'
+                last_sent = now
+            if now - started >= JOB_EVENTS_MAX_DURATION:
+                return
+            time.sleep(JOB_EVENTS_POLL_INTERVAL)
+            job = job_queue.get(job_id)
+            if job is None:
+                yield format_sse('done', {'job_id': job_id, 'done': True, 'state': jobs.JOB_FAILED,
+                                          'error': 'Job not found', 'result': None})
+                return
+    
+    response = app.response_class(generate(job), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # nginx must pass the events on as they come instead of buffering the response
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def calibrate_estimate(engine, output_format):
+    """
+    Runtime and output size factors from the last successful jobs with the same engine and output
+    format in the statistics history (reports from before output formats were recorded count as xlsx,
+    only reports with file sizes are used for the size), or defaults when there are too few of them.
+    """
+    timed = []
+    sized = []
+    for record in stats.get_history(ESTIMATE_CALIBRATION_JOBS):
+        report = record['report']
+        if not record['success'] or not report or report.get('engine') != engine:
+            continue
+        if (report.get('output_format') or split.OUTPUT_XLSX) != output_format:
+            continue
+        if report.get('rows_scanned') and record['processing_time']:
+            timed.append((record['processing_time'], report['rows_scanned']))
+        if report.get('input_bytes') and report.get('output_bytes'):
+            sized.append(report)
+    
+    calibration = {'engine': engine, 'timed_jobs': len(timed), 'sized_jobs': len(sized)}
+    if len(timed) >= ESTIMATE_MIN_JOBS:
+        calibration['seconds_per_row'] = sum(seconds for seconds, _ in timed) / sum(rows for _, rows in timed)
+    else:
+        calibration['seconds_per_row'] = ESTIMATE_DEFAULT_SECONDS_PER_ROW.get(
+            (engine, output_format), ESTIMATE_DEFAULT_SECONDS_PER_ROW[(split.ENGINE_STREAMING, split.OUTPUT_XLSX)]
+        )
+    
+    # Text inputs are rewritten (size ratio); xlsx inputs keep their size plus the overflow cells
+    if engine == split.ENGINE_TEXT:
+        if len(sized) >= ESTIMATE_MIN_JOBS:
+            calibration['text_size_ratio'] = (
+                sum(report['output_bytes'] for report in sized) / sum(report['input_bytes'] for report in sized)
+            )
+        else:
+            calibration['text_size_ratio'] = ESTIMATE_DEFAULT_TEXT_SIZE_RATIO[output_format]
+    else:
+        sized = [report for report in sized if report.get('overflow_cells')]
+        if len(sized) >= ESTIMATE_MIN_JOBS:
+            calibration['overflow_cell_bytes'] = (
+                sum(report['output_bytes'] - report['input_bytes'] for report in sized)
+                / sum(report['overflow_cells'] for report in sized)
+            )
+        else:
+            calibration['overflow_cell_bytes'] = ESTIMATE_DEFAULT_OVERFLOW_CELL_BYTES
+    return calibration
+
+def estimate_output_bytes(input_bytes, overflow_cells, engine, calibration):
+    """Projected size of the output file"""
+    if engine == split.ENGINE_TEXT:
+        return round(input_bytes * calibration['text_size_ratio'])
+    return max(round(input_bytes + overflow_cells * calibration['overflow_cell_bytes']), 0)
+
+@app.route('/api/estimate', methods=['POST'])
+@login_required
+def estimate_processing():
+    """
+    Dry run of /process: projected overflow columns, parts per cell, output size and runtime
+    for the given column and max_chars, without writing any output. Workbooks are sampled
+    (ESTIMATE_SAMPLE_ROWS rows) unless sample_rows is 0, which reads the whole column.
+    """
+    data = request.json
+    params, error_msg, status_code = parse_process_request(data)
+    if params is None:
+        return jsonify({'success': False, 'error': error_msg}), status_code
+    try:
+        sample_rows = int(data.get('sample_rows', split.ESTIMATE_SAMPLE_ROWS)) or None
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'error': 'Invalid sample_rows value'}), 400
+    if sample_rows is not None and sample_rows < 1:
+        return jsonify({'success': False, 'error': 'sample_rows must be 0 (whole column) or positive'}), 400
+    
+    filepath = params['filepath']
+    storage_janitor.touch(filepath)
+    report = split.SplitReport()
+    estimate = split.SplitEstimate(sample_rows)
+    with metrics.server_timing('dry_run'):
+        success, message, _ = split.main(filepath, params['column'], params['max_chars'], report=report,
+                                         output_format=params['output_format'], estimate=estimate)
+    if not success:
+        return jsonify({'success': False, 'error': message}), 400
+    
+    result = estimate.to_dict()
+    calibration = calibrate_estimate(report.engine, params['output_format'])
+    output_bytes = estimate_output_bytes(report.input_bytes, result['overflow_cells'], report.engine, calibration)
+    runtime = round(result['total_rows'] * calibration['seconds_per_row'], 2)
+    
+    # /process would answer from the output cache right away
+    cached_path = None
+    metadata = params['metadata']
+    if metadata is not None and metadata.get('content_hash'):
+        cached_path = processed_cache.get(output_cache.make_key(metadata['content_hash'], params['column'],
+                                                                params['max_chars'], params['output_format']))
+    if cached_path:
+        try:
+            output_bytes = os.path.getsize(cached_path)
+            runtime = 0.0
+        except OSError:
+            cached_path = None
+    
+    return jsonify({
+        'success': True,
+        'engine': report.engine,
+        'output_format': params['output_format'],
+        'max_chars': params['max_chars'],
+        **result,
+        'input_bytes': report.input_bytes,
+        'estimated_output_bytes': output_bytes,
+        'estimated_runtime': runtime,
+        'cached': bool(cached_path),
+        'calibration': calibration,
+        'dry_run_time': round(report.total_time, 3)
+    })
 
-def send_processing_complete_email(user_email, user_name, input_filename, output_filename, processing_time):
-    """Send email notification when processing completes"""
-    print("\n" + "="*60)
-    print("EMAIL DEBUG: Starting email send process")
-    print("="*60)
+@app.route('/batch', methods=['POST'])
+@login_required
+def batch_process():
+    """Process many workbooks (or one ZIP of workbooks) with the same column and max_chars"""
+    files = request.files.getlist('files')
+    if not files or all(f.filename == '' for f in files):
+        return jsonify({'success': False, 'error': 'No files provided'}), 400
+    
+    # Validate parameters once for the whole batch
+    column = sanitize_input(request.form.get('column'), max_length=3)
+    if column:
+        column = column.upper()
+    is_valid, error_msg = validate_column_name(column)
+    if not is_valid:
+        return jsonify({'success': False, 'error': error_msg}), 400
     
+    try:
+        max_chars = int(request.form.get('max_chars', SUGGESTED_MAX_CHARS))
+        is_valid, error_msg = validate_max_chars(max_chars)
+        if not is_valid:
+            return jsonify({'success': False, 'error': error_msg}), 400
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'error': 'Invalid max characters value'}), 400
+    
+    # Store the workbooks, ZIP uploads are unpacked into individual workbooks
+    batch_id = uuid.uuid4().hex
+    entries = []
+    try:
+        for file in files:
+            if file.filename == '':
+                continue
+            if file.filename.lower().endswith('.zip'):
+                entries.extend(save_batch_zip(file, batch_id))
+            elif allowed_file(file.filename):
+                original_filename = sanitize_filename(secure_filename(file.filename))
+                filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4()}_{original_filename}")
+                file.save(filepath)
+                app_metrics.inc('uploaded_bytes_total', os.path.getsize(filepath))
+                entries.append({'filename': original_filename, 'filepath': filepath})
+            else:
+                entries.append({'filename': file.filename, 'filepath': None, 'error': INVALID_FILE_TYPE_ERROR})
+            
+            if len(entries) > MAX_BATCH_FILES:
+                raise ValueError(f'A batch can contain at most {MAX_BATCH_FILES} files')
+    except ValueError as e:
+        for entry in entries:
+            if entry['filepath']:
+                try:
+                    os.remove(entry['filepath'])
+                except:
+                    pass
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    user_email = current_user.email if current_user.is_authenticated else None
+    job_id = job_queue.submit(
+        run_batch_job,
+        kwargs={
+            'batch_id': batch_id,
+            'entries': entries,
+            'column': column,
+            'max_chars': max_chars,
+            'user_email': user_email
+        },
+        owner=user_email,
+        params={'batch_id': batch_id, 'files': len(entries), 'column': column, 'max_chars': max_chars},
+        progress=True
+    )
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'batch_id': batch_id,
+        'files': len(entries),
+        'state': jobs.JOB_QUEUED,
+        'status_url': url_for('get_job', job_id=job_id),
+        'events_url': url_for('job_events', job_id=job_id)
+    }), 202
+
+def save_batch_zip(file, batch_id):
+    """Unpack the workbooks from an uploaded ZIP into the upload folder"""
+    entries = []
+    total_size = 0
+    try:
+        archive = zipfile.ZipFile(file.stream)
+    except zipfile.BadZipFile:
+        return [{'filename': file.filename, 'filepath': None, 'error': 'Invalid ZIP file'}]
+    
+    with archive:
+        for member in archive.infolist():
+            member_name = os.path.basename(member.filename)
+            # Skip folders and metadata added by archivers (e.g. __MACOSX/._file.xlsx)
+            if member.is_dir() or not member_name or member_name.startswith('.') or '__MACOSX' in member.filename:
+                continue
+            if not allowed_file(member_name):
+                entries.append({'filename': member_name, 'filepath': None, 'error': INVALID_FILE_TYPE_ERROR})
+                continue
+            
+            # Guard against ZIP bombs: limit file count and the declared uncompressed size
+            if len(entries) >= MAX_BATCH_FILES:
+                raise ValueError(f'A batch can contain at most {MAX_BATCH_FILES} files')
+            total_size += member.file_size
+            if total_size > MAX_BATCH_UNCOMPRESSED_SIZE:
+                raise ValueError(f'The ZIP file is too large once unpacked (maximum {MAX_BATCH_UNCOMPRESSED_SIZE // (1024 * 1024)}MB)')
+            
+            original_filename = sanitize_filename(secure_filename(member_name))
+            if not original_filename:
+                entries.append({'filename': member_name, 'filepath': None, 'error': 'Invalid filename'})
+                continue
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4()}_{original_filename}")
+            with archive.open(member) as src, open(filepath, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+                app_metrics.inc('uploaded_bytes_total', dst.tell())
+            entries.append({'filename': original_filename, 'filepath': filepath})
+    return entries
+
+_batch_pool = None
+_batch_pool_pid = None
+_batch_pool_lock = threading.Lock()
+
+def get_batch_pool():
+    """
+    Process pool shared by the batches of this worker process (created lazily, and again after a fork).
+
+    Its processes come from a forkserver: forking this multithreaded process directly would copy locks
+    held by other threads (logging, SQLite, mail outbox) into the children. They only import split.
+    """
+    global _batch_pool, _batch_pool_pid
+    with _batch_pool_lock:
+        if _batch_pool is None or _batch_pool_pid != os.getpid():
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['split'])
+            _batch_pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS, mp_context=context)
+            _batch_pool_pid = os.getpid()
+        return _batch_pool
+
+def reset_batch_pool(pool):
+    """Drop a pool broken by a crashed process, the next batch gets a new one"""
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is pool:
+            _batch_pool = None
+    pool.shutdown(wait=False)
+
+def run_batch_job(**kwargs):
+    """Job entry point for batches, see run_processing_job"""
+    with app.app_context():
+        return process_batch(**kwargs)
+
+def process_batch(batch_id, entries, column, max_chars, user_email, progress=None):
+    """
+    Validate every batch file, split the valid ones in parallel across CPU cores and
+    write all outputs plus a manifest.json into one ZIP in the outputs folder.
+    progress(dict) is called after every finished file.
+    """
+    start_time = time.time()
+    manifest = []
+    
+    # Reuse the single-file upload checks for every file
+    to_process = []
+    for entry in entries:
+        item = {'filename': entry['filename'], 'status': 'invalid', 'error': entry.get('error'), 'output': None, 'processing_time': None, 'report': None}
+        manifest.append(item)
+        if item['error']:
+            continue
+        for validate in (validate_file_content, validate_excel_file):
+            is_valid, error_msg = validate(entry['filepath'])
+            if not is_valid:
+                item['error'] = error_msg
+                # Clean up invalid file
+                try:
+                    os.remove(entry['filepath'])
+                except:
+                    pass
+                break
+        else:
+            storage_janitor.record(entry['filepath'], owner=user_email)
+            to_process.append((item, entry['filepath']))
+    
+    zip_basename = f"batch_{batch_id}_ProjectTextReady.zip"
+    zip_path = os.path.join(app.config['OUTPUT_FOLDER'], zip_basename)
+    used_names = set()
+    
+    # Outputs are written into the ZIP as soon as each file finishes
+    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        if to_process:
+            def submit(pool):
+                return {pool.submit(split.process_file, filepath, column, max_chars): item for item, filepath in to_process}
+            
+            pool = get_batch_pool()
+            try:
+                futures = submit(pool)
+            except BrokenProcessPool:
+                # A process of the shared pool died during an earlier batch
+                reset_batch_pool(pool)
+                pool = get_batch_pool()
+                futures = submit(pool)
+            for files_processed, future in enumerate(as_completed(futures), start=1):
+                item = futures[future]
+                try:
+                    result = future.result()
+                    success, message, output_filename = result['success'], result['message'], result['output']
+                    processing_time, report = result['time'], result['report']
+                except BrokenProcessPool as e:
+                    reset_batch_pool(pool)
+                    success, message, output_filename, processing_time, report = False, str(e), None, 0, None
+                except Exception as e:
+                    success, message, output_filename, processing_time, report = False, str(e), None, 0, None
+                if progress:
+                    progress({
+                        'phase': split.PHASE_SPLIT,
+                        'files_processed': files_processed,
+                        'files_total': len(to_process),
+                        'percent': round(files_processed / len(to_process) * 100, 1)
+                    })
+                
+                item['processing_time'] = round(processing_time, 2)
+                item['report'] = report
+                if not success or not output_filename or not os.path.exists(output_filename):
+                    item['status'] = 'failed'
+                    item['error'] = message if not success else 'Output file was not created'
+                    add_processing_record(False, 0, user_email, report)
+                    continue
+                
+                # Name entries after the original file, keeping them unique inside the ZIP
+                arcname = f"{os.path.splitext(item['filename'])[0]}_ProjectTextReady.xlsx"
+                counter = 1
+                while arcname in used_names:
+                    counter += 1
+                    arcname = f"{os.path.splitext(item['filename'])[0]}_{counter}_ProjectTextReady.xlsx"
+                used_names.add(arcname)
+                
+                # xlsx files are already compressed
+                archive.write(output_filename, arcname, compress_type=zipfile.ZIP_STORED)
+                os.remove(output_filename)
+                item['status'] = 'ok'
+                item['output'] = arcname
+                add_processing_record(True, item['processing_time'], user_email, report)
+    
+        archive.writestr('manifest.json', json.dumps({
+            'batch_id': batch_id,
+            'column': column,
+            'max_chars': max_chars,
+            'created_at': datetime.now().isoformat(),
+            'files': manifest
+        }, indent=2))
+    storage_janitor.record(zip_path, owner=user_email)
+    
+    processed = sum(1 for item in manifest if item['status'] == 'ok')
+    return {
+        'success': processed > 0,
+        'message': f'{processed} of {len(manifest)} files successfully processed.',
+        'error': None if processed else 'No file in the batch could be processed',
+        'output_filename': zip_basename,
+        'processing_time': round(time.time() - start_time, 2),
+        'files': manifest
+    }
+
+def send_processing_complete_email(user_email, user_name, input_filename, output_filename, processing_time, base_url=None):
+    """Queue the email notification sent when processing completes"""
     if not app.config['MAIL_ENABLED']:
-        print("EMAIL DEBUG: MAIL_ENABLED is False - email disabled")
-        print("="*60 + "\n")
+        mail_log.debug('MAIL_ENABLED is False - email disabled')
         return
     
-    print(f"EMAIL DEBUG: MAIL_ENABLED = {app.config['MAIL_ENABLED']}")
-    print(f"EMAIL DEBUG: MAIL_SERVER = {app.config['MAIL_SERVER']}")
-    print(f"EMAIL DEBUG: MAIL_PORT = {app.config['MAIL_PORT']}")
-    print(f"EMAIL DEBUG: MAIL_USE_TLS = {app.config['MAIL_USE_TLS']}")
-    print(f"EMAIL DEBUG: MAIL_USE_SSL = {app.config['MAIL_USE_SSL']}")
-    print(f"EMAIL DEBUG: MAIL_USERNAME = {app.config['MAIL_USERNAME']}")
-    print(f"EMAIL DEBUG: MAIL_PASSWORD = {'*' * len(app.config['MAIL_PASSWORD']) if app.config['MAIL_PASSWORD'] else 'NOT SET'}")
-    print(f"EMAIL DEBUG: MAIL_DEFAULT_SENDER = {app.config['MAIL_DEFAULT_SENDER']}")
-    
     try:
-        # Get base URL from environment or use default
-        base_url = os.environ.get('BASE_URL', '')
+        # Get base URL from the caller, environment or use default
+        if not base_url:
+            base_url = os.environ.get('BASE_URL', '')
         if not base_url:
             try:
                 base_url = request.host_url.rstrip('/')
-                print(f"EMAIL DEBUG: Using request host URL: {base_url}")
             except:
                 base_url = 'https://pt.schrack.lastchance.ro'
-                print(f"EMAIL DEBUG: Using default URL: {base_url}")
-        else:
-            print(f"EMAIL DEBUG: Using BASE_URL from env: {base_url}")
         
         download_url = f"{base_url}/download/outputs/{output_filename}"
-        print(f"EMAIL DEBUG: Download URL = {download_url}")
         
         subject = f"Procesare Completă: {input_filename}"
         
@@ -704,18 +1595,10 @@ Echipa Integral ProjectText FileProcessor"""
         if not sender:
             # Fallback to MAIL_USERNAME if it's a valid email
             sender = app.config['MAIL_USERNAME'] if app.config['MAIL_USERNAME'] and '@' in app.config['MAIL_USERNAME'] else None
-            print(f"EMAIL DEBUG: Sender not set, using fallback: {sender}")
         
         if not sender:
-            print("EMAIL DEBUG: WARNING - MAIL_DEFAULT_SENDER not set. Email may fail.")
             sender = app.config['MAIL_USERNAME'] if app.config['MAIL_USERNAME'] else 'noreply@example.com'
-            print(f"EMAIL DEBUG: Using fallback sender: {sender}")
-        else:
-            print(f"EMAIL DEBUG: Using sender: {sender}")
-        
-        print(f"EMAIL DEBUG: Recipient: {user_email}")
-        print(f"EMAIL DEBUG: Subject: {subject}")
-        print(f"EMAIL DEBUG: HTML body length: {len(html_body)} characters")
+            mail_log.warning('MAIL_DEFAULT_SENDER not set, using fallback sender %s. Email may fail.', sender)
         
         # Create message with both HTML and plain text (multipart)
         msg = Message(
@@ -726,52 +1609,117 @@ Echipa Integral ProjectText FileProcessor"""
             sender=sender
         )
         
-        print("EMAIL DEBUG: Attempting to send email...")
-        try:
-            mail.send(msg)
-            print("EMAIL DEBUG: ✓ Flask-Mail send() completed without exception")
-            print("EMAIL DEBUG: Email sent successfully via Gmail SMTP")
-            print("EMAIL DEBUG: Check spam folder if email is not received")
-        except Exception as send_error:
-            print(f"EMAIL DEBUG: ✗ Flask-Mail send() raised exception: {type(send_error).__name__}")
-            print(f"EMAIL DEBUG: Error: {str(send_error)}")
-            raise  # Re-raise to be caught by outer exception handler
-        print("="*60 + "\n")
+        # The outbox sends it in the background (and retries on failure)
+        outbox.enqueue(msg)
+        mail_log.info('Email queued', extra={
+            'recipient': user_email,
+            'subject': subject,
+            'sender': sender,
+            'download_url': download_url,
+            'outbox_depth': outbox.depth()
+        })
         
-    except Exception as e:
+    except Exception:
         # Don't raise - email failure shouldn't break the request
-        print(f"EMAIL DEBUG: ✗ ERROR sending email notification")
-        print(f"EMAIL DEBUG: Error type: {type(e).__name__}")
-        print(f"EMAIL DEBUG: Error message: {str(e)}")
-        import traceback
-        print("EMAIL DEBUG: Full traceback:")
-        traceback.print_exc()
-        print("="*60 + "\n")
+        mail_log.exception('Error preparing email notification')
 
-@app.route('/api/statistics')
+@app.route('/api/mail/outbox')
 @login_required
-def get_statistics():
-    """Get processing statistics"""
-    stats = load_stats()
-    
+def get_mail_outbox():
+    """Email outbox depth and delivery counters of this worker"""
+    return jsonify({
+        'success': True,
+        'mail_enabled': app.config['MAIL_ENABLED'],
+        'outbox': outbox.stats()
+    })
+
+# Statistics payload of this worker, rebuilt only when the counters version or the current hour changes
+statistics_cache = {'key': None, 'payload': None, 'last_modified': None}
+STATISTICS_HISTORY_DEFAULT_RANGE = {
+    stats_store.ROLLUP_HOUR: timedelta(hours=23),
+    stats_store.ROLLUP_DAY: timedelta(days=29)
+}
+
+
+def get_statistics_payload():
+    """Return (cache_key, payload, last_modified) of the statistics endpoint"""
+    version, updated_at = stats.get_version()
+    now = datetime.now()
+    hour_bucket = now.strftime(stats_store.ROLLUP_BUCKET_FORMATS[stats_store.ROLLUP_HOUR])
+    day_bucket = now.strftime(stats_store.ROLLUP_BUCKET_FORMATS[stats_store.ROLLUP_DAY])
+    key = f"{version}-{hour_bucket}"
+    if statistics_cache['key'] == key:
+        return key, statistics_cache['payload'], statistics_cache['last_modified']
+
+    totals = stats.get_totals()
+    all_time = stats.get_rollup(stats_store.ROLLUP_ALL, stats_store.ROLLUP_ALL) or {}
+
     # Calculate averages
     avg_processing_time = 0.0
-    if stats['total_successful'] > 0:
-        avg_processing_time = stats['total_processing_time'] / stats['total_successful']
+    if totals['total_successful'] > 0:
+        avg_processing_time = totals['total_processing_time'] / totals['total_successful']
     
     success_rate = 0.0
-    if stats['total_processed'] > 0:
-        success_rate = (stats['total_successful'] / stats['total_processed']) * 100
-    
-    return jsonify({
+    if totals['total_processed'] > 0:
+        success_rate = (totals['total_successful'] / totals['total_processed']) * 100
+
+    payload = {
         'success': True,
         'statistics': {
-            'total_processed': stats['total_processed'],
-            'total_successful': stats['total_successful'],
-            'total_failed': stats['total_failed'],
+            'total_processed': totals['total_processed'],
+            'total_successful': totals['total_successful'],
+            'total_failed': totals['total_failed'],
+            'total_cache_hits': totals['total_cache_hits'],
             'average_processing_time': round(avg_processing_time, 2),
-            'success_rate': round(success_rate, 2)
+            'success_rate': round(success_rate, 2),
+            'p50_processing_time': all_time.get('p50_processing_time', 0.0),
+            'p95_processing_time': all_time.get('p95_processing_time', 0.0),
+            # The percentiles only cover the history kept when the rollups were first built
+            'percentiles_partial': all_time.get('partial', False),
+            'this_hour': stats.get_rollup(stats_store.ROLLUP_HOUR, hour_bucket),
+            'today': stats.get_rollup(stats_store.ROLLUP_DAY, day_bucket)
         }
+    }
+    last_modified = datetime.fromisoformat(updated_at) if updated_at else None
+    statistics_cache.update(key=key, payload=payload, last_modified=last_modified)
+    return key, payload, last_modified
+
+@app.route('/api/statistics')
+@login_required
+def get_statistics():
+    """Get processing statistics (supports If-None-Match / If-Modified-Since)"""
+    key, payload, last_modified = get_statistics_payload()
+    response = jsonify(payload)
+    response.set_etag(f"stats-{key}")
+    if last_modified:
+        response.last_modified = last_modified.astimezone()
+    # Browsers keep the response but revalidate it on every poll
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/statistics/history')
+@login_required
+def get_statistics_history():
+    """Hourly or daily statistics rollups for a time range"""
+    granularity = request.args.get('granularity', stats_store.ROLLUP_HOUR)
+    if granularity not in STATISTICS_HISTORY_DEFAULT_RANGE:
+        return jsonify({'success': False, 'error': f"Invalid granularity. Use one of: {', '.join(STATISTICS_HISTORY_DEFAULT_RANGE)}"}), 400
+
+    bucket_format = stats_store.ROLLUP_BUCKET_FORMATS[granularity]
+    try:
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else datetime.now()
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else end - STATISTICS_HISTORY_DEFAULT_RANGE[granularity]
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid start or end. Use ISO format, e.g. 2024-01-31 or 2024-01-31T14:00'}), 400
+    if start > end:
+        return jsonify({'success': False, 'error': 'start must not be after end'}), 400
+
+    return jsonify({
+        'success': True,
+        'granularity': granularity,
+        'start': start.strftime(bucket_format),
+        'end': end.strftime(bucket_format),
+        'rollups': stats.get_rollups(granularity, start.strftime(bucket_format), end.strftime(bucket_format))
     })
 
 @app.route('/api/validate-file', methods=['POST'])
@@ -788,7 +1736,7 @@ def validate_file_advanced():
     
     # Validate file extension
     if not allowed_file(file.filename):
-        return jsonify({'success': False, 'error': 'Invalid file type. Please upload .xlsx or .xls files'}), 400
+        return jsonify({'success': False, 'error': INVALID_FILE_TYPE_ERROR}), 400
     
     # Save file temporarily for validation
     temp_filename = f"temp_{uuid.uuid4()}_{secure_filename(file.filename)}"
@@ -797,137 +1745,25 @@ def validate_file_advanced():
     try:
         file.save(temp_filepath)
         
-        # Validate file content/signature
-        is_valid, error_msg = validate_file_content(temp_filepath)
-        if not is_valid:
-            try:
-                os.remove(temp_filepath)
-            except:
-                pass
-            return jsonify({'success': False, 'error': error_msg}), 400
-        
-        # Validate Excel file can be opened
-        is_valid, error_msg = validate_excel_file(temp_filepath)
-        if not is_valid:
-            try:
-                os.remove(temp_filepath)
-            except:
-                pass
+        # Validate the file signature and parse the workbook once
+        metadata, error_msg = ingest_file(temp_filepath)
+        if metadata is None:
             return jsonify({'success': False, 'error': error_msg}), 400
         
         # Advanced validation: Check sheets and columns
-        wb = openpyxl.load_workbook(temp_filepath, read_only=True, data_only=True)
-        sheet_count = len(wb.sheetnames)
-        
-        if sheet_count != 1:
-            wb.close()
-            try:
-                os.remove(temp_filepath)
-            except:
-                pass
-            return jsonify({
-                'success': False,
-                'error': f'File must contain exactly ONE sheet. Found {sheet_count} sheet(s): {", ".join(wb.sheetnames)}',
-                'sheet_count': sheet_count,
-                'sheet_names': wb.sheetnames
-            }), 400
-        
-        sheet = wb.active
-        
-        # Check which columns have data
-        columns_with_data = []
-        from openpyxl.utils import get_column_letter
-        
-        if sheet.max_column > 0 and sheet.max_row > 0:
-            for col_idx in range(1, sheet.max_column + 1):
-                has_data = False
-                for row_idx in range(1, min(sheet.max_row + 1, 1000)):  # Check first 1000 rows
-                    cell = sheet.cell(row=row_idx, column=col_idx)
-                    if cell.value is not None and str(cell.value).strip():
-                        has_data = True
-                        break
-                
-                if has_data:
-                    col_letter = get_column_letter(col_idx)
-                    # Get sample data from first non-empty cell
-                    sample_value = ''
-                    for row_idx in range(1, min(sheet.max_row + 1, 100)):
-                        cell = sheet.cell(row=row_idx, column=col_idx)
-                        if cell.value is not None and str(cell.value).strip():
-                            sample_value = str(cell.value)[:50]
-                            break
-                    
-                    # Calculate average cell length in this column
-                    cell_lengths = []
-                    for row_idx in range(1, min(sheet.max_row + 1, 100)):
-                        cell = sheet.cell(row=row_idx, column=col_idx)
-                        if cell.value is not None and isinstance(cell.value, str):
-                            cell_lengths.append(len(cell.value.strip()))
-                    
-                    avg_length = sum(cell_lengths) / len(cell_lengths) if cell_lengths else 0
-                    max_length = max(cell_lengths) if cell_lengths else 0
-                    
-                    columns_with_data.append({
-                        'letter': col_letter,
-                        'index': col_idx,
-                        'sample': sample_value,
-                        'avg_length': round(avg_length, 0),
-                        'max_length': max_length
-                    })
-        
-        wb.close()
-        
-        # Clean up temp file
-        try:
-            os.remove(temp_filepath)
-        except:
-            pass
-        
-        if len(columns_with_data) == 0:
-            return jsonify({
-                'success': False,
-                'error': 'No data found in the file. The file appears to be empty.',
-                'columns_with_data': []
-            }), 400
-        
-        if len(columns_with_data) > 1:
-            column_letters = [col['letter'] for col in columns_with_data]
-            return jsonify({
-                'success': False,
-                'error': f'Data exists in multiple columns: {", ".join(column_letters)}. Data must exist ONLY in one column.',
-                'columns_with_data': columns_with_data
-            }), 400
-        
-        # File is valid - suggest optimal parameters
-        single_column = columns_with_data[0]
-        # Always suggest 20 characters (optimal range is 18-20, max 23)
-        suggested_max_chars = 20
-        
-        return jsonify({
-            'success': True,
-            'valid': True,
-            'sheet_count': 1,
-            'column_with_data': single_column['letter'],
-            'suggested_parameters': {
-                'column': single_column['letter'],
-                'max_chars': suggested_max_chars,
-                'reason': 'Optimal value: 20 characters (recommended range: 18-20, maximum: 23)'
-            },
-            'file_info': {
-                'total_rows': sheet.max_row,
-                'total_columns': sheet.max_column,
-                'column_stats': single_column
-            }
-        })
+        validation, status_code = build_validation_result(metadata)
+        return jsonify(validation), status_code
         
     except Exception as e:
-        # Clean up temp file on error
+        return jsonify({'success': False, 'error': f'Error validating file: {str(e)}'}), 500
+    finally:
+        # Clean up temp file
         try:
             if os.path.exists(temp_filepath):
                 os.remove(temp_filepath)
         except:
             pass
-        return jsonify({'success': False, 'error': f'Error validating file: {str(e)}'}), 500
+        ingest.remove_metadata(temp_filepath)
 
 @app.route('/preview/<folder>/<filename>')
 @login_required
@@ -942,7 +1778,7 @@ def preview_file(folder, filename):
     
     # Get pagination parameters (only used for input files)
     page = request.args.get('page', 1, type=int)
-    rows_per_page = 50
+    rows_per_page = preview_index.ROWS_PER_PAGE
     
     # Sanitize filename to prevent path traversal
     filename = sanitize_filename(filename)
@@ -956,18 +1792,41 @@ def preview_file(folder, filename):
     
     if not os.path.exists(filepath):
         return jsonify({'success': False, 'error': 'File not found'}), 404
+    storage_janitor.touch(filepath)
+    
+    # Outputs are answered from the preview stored when they were written (the page only shows their first rows)
+    if is_output_file and page == 1:
+        with metrics.server_timing('page'):
+            stored = preview_index.load_output_preview(filepath)
+        if stored is not None:
+            total_rows = stored['total_rows']
+            return jsonify({
+                'success': True,
+                'filename': filename,
+                'sheet_name': stored['sheet_name'],
+                'total_rows': total_rows,
+                'total_columns': stored['total_columns'],
+                'preview_columns': stored['preview_columns'],
+                'has_more_columns': stored['total_columns'] > preview_index.PREVIEW_MAX_COLUMNS,
+                'current_page': 1,
+                'total_pages': max(1, (total_rows + rows_per_page - 1) // rows_per_page),
+                'rows_per_page': rows_per_page,
+                'start_row': 1,
+                'end_row': min(rows_per_page, total_rows),
+                'is_output_file': True,
+                'longest_chain': stored['longest_chain'],
+                'data': stored['rows']
+            })
     
     try:
-        # Load workbook in read-only mode for better performance
-        wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
-        sheet = wb.active
+        # The sheet is parsed once per file into a page index, every page is then a direct seek
+        with metrics.server_timing('index'):
+            index = preview_index.get_index(filepath, rows_per_page)
         
         # Get total dimensions
-        total_rows = sheet.max_row
-        total_cols = sheet.max_column
-        
-        # Limit columns for very wide files
-        preview_col_count = min(50, total_cols)
+        total_rows = index['total_rows']
+        total_cols = index['total_columns']
+        preview_col_count = index['preview_columns']
         
         # Calculate pagination
         total_pages = (total_rows + rows_per_page - 1) // rows_per_page  # Ceiling division
@@ -980,45 +1839,28 @@ def preview_file(folder, filename):
         end_row = min(start_row + rows_per_page - 1, total_rows)
         
         # Get preview data for current page
-        preview_data = []
+        with metrics.server_timing('page'):
+            preview_data = preview_index.read_page(filepath, index, page)
         
-        # Use iter_rows for better memory efficiency
-        for row in sheet.iter_rows(min_row=start_row, max_row=end_row, 
-                                   min_col=1, max_col=preview_col_count, 
-                                   values_only=True):
-            row_data = []
-            for cell_value in row:
-                # Get cell value, limit string length for preview
-                if cell_value is None:
-                    row_data.append('')
-                elif isinstance(cell_value, str):
-                    # Limit string length to prevent huge JSON responses
-                    if len(cell_value) > 200:
-                        row_data.append(cell_value[:200] + '...')
-                    else:
-                        row_data.append(cell_value)
-                else:
-                    # Convert other types to string
-                    str_value = str(cell_value)
-                    if len(str_value) > 200:
-                        row_data.append(str_value[:200] + '...')
-                    else:
-                        row_data.append(str_value)
-            preview_data.append(row_data)
-        
-        wb.close()
-        
-        # Debug: Print pagination info
-        print(f"DEBUG Preview: folder={folder}, total_rows={total_rows}, rows_per_page={rows_per_page}, total_pages={total_pages}, page={page}, start_row={start_row}, end_row={end_row}, data_rows={len(preview_data)}")
+        log.debug('Preview page', extra={
+            'folder': folder,
+            'total_rows': total_rows,
+            'rows_per_page': rows_per_page,
+            'total_pages': total_pages,
+            'page': page,
+            'start_row': start_row,
+            'end_row': end_row,
+            'data_rows': len(preview_data)
+        })
         
         return jsonify({
             'success': True,
             'filename': filename,
-            'sheet_name': sheet.title,
+            'sheet_name': index['sheet_name'],
             'total_rows': total_rows,
             'total_columns': total_cols,
             'preview_columns': preview_col_count,
-            'has_more_columns': total_cols > 50,
+            'has_more_columns': total_cols > preview_index.PREVIEW_MAX_COLUMNS,
             'current_page': page,
             'total_pages': total_pages,
             'rows_per_page': rows_per_page,
@@ -1036,6 +1878,44 @@ def preview_file(folder, filename):
             error_msg = error_msg[:200] + '...'
         return jsonify({'success': False, 'error': f'Eroare la citirea fișierului: {error_msg}'}), 500
 
+def get_file_etag(filepath):
+    """
+    Strong ETag of a stored file: its content hash. Uploads have it in their metadata; for other
+    files (outputs) it is computed on first use and kept in a sidecar, checked against the file's
+    size and inode (files are replaced, never edited in place).
+    """
+    metadata = ingest.load_metadata(filepath)
+    if metadata is not None and metadata.get('content_hash'):
+        return metadata['content_hash']
+    
+    stat = os.stat(filepath)
+    signature = [stat.st_size, stat.st_ino]
+    etag_path = f"{filepath}{ETAG_SUFFIX}"
+    try:
+        with open(etag_path, 'r') as f:
+            stored = json.load(f)
+        if stored['signature'] == signature:
+            return stored['etag']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    
+    hasher = chunked_upload.BlockHasher()
+    with open(filepath, 'rb') as f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    etag = hasher.hexdigest()
+    try:
+        tmp_path = f"{etag_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'signature': signature, 'etag': etag}, f)
+        os.replace(tmp_path, etag_path)
+    except OSError as e:
+        log.warning('Could not store ETag of %s: %s', filepath, e)
+    return etag
+
 @app.route('/download/<folder>/<filename>')
 @login_required
 def download_file(folder, filename):
@@ -1055,25 +1935,52 @@ def download_file(folder, filename):
     if not os.path.exists(filepath):
         return jsonify({'error': 'File not found'}), 404
     
-    return send_file(filepath, as_attachment=True)
+    storage_janitor.touch(filepath)
+    if app.config['USE_X_ACCEL_REDIRECT']:
+        # nginx sends the file (with its own ETag and Range handling), the worker is free right away
+        response = app.response_class(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = f"{app.config['X_ACCEL_REDIRECT_PREFIX']}/{folder}/{filename}"
+        response.headers.set('Content-Disposition', 'attachment', filename=filename)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        app_metrics.inc('downloaded_bytes_total', os.path.getsize(filepath))
+        return response
+    
+    # Conditional GET (If-None-Match with the content hash) and Range requests for resumed downloads
+    response = send_file(os.path.abspath(filepath), as_attachment=True, conditional=True, etag=get_file_etag(filepath))
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    app_metrics.inc('downloaded_bytes_total', response.content_length or 0)
+    return response
+
+def metrics_access_allowed():
+    """Check a /metrics request: the bearer token if METRICS_TOKEN is set, else a direct request from localhost"""
+    token = app.config['METRICS_TOKEN']
+    if token:
+        authorization = request.headers.get('Authorization', '')
+        return hmac.compare_digest(authorization.encode('utf-8'), f"Bearer {token}".encode('utf-8'))
+    # Proxies add X-Forwarded-For: their requests come from localhost too (nginx does not add it for /metrics)
+    return request.remote_addr in ('127.0.0.1', '::1') and 'X-Forwarded-For' not in request.headers
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Metrics of all workers in the Prometheus text format"""
+    if not metrics_access_allowed():
+        return app.response_class('Forbidden\n', status=403, mimetype='text/plain')
+    return app.response_class(app_metrics.render(), mimetype='text/plain; version=0.0.4')
 
 # Add request logging middleware
-@app.before_request
-def log_request_info():
-    """Log all incoming requests"""
-    print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {request.method} {request.path}")
-    if request.method == 'POST':
-        print(f"  Content-Type: {request.content_type}")
-        if request.is_json:
-            print(f"  JSON Data: {request.json}")
-    sys.stdout.flush()
-
-@app.after_request
-def log_response_info(response):
-    """Log all responses"""
-    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {response.status_code} {request.method} {request.path}")
-    sys.stdout.flush()
-    return response
+# One structured log line per request (with its duration); polled routes are sampled.
+# LOG_SAMPLE_RATES is a comma separated list of path_prefix=rate, errors and slow requests are always logged.
+request_logger = request_logging.RequestLogger(
+    app,
+    sample_rates=request_logging.parse_sample_rates(
+        os.environ.get('LOG_SAMPLE_RATES', '/preview/=0.1,/api/statistics=0.1,/jobs/=0.1')
+    ),
+    slow_ms=float(os.environ.get('LOG_SLOW_REQUEST_MS', 1000))
+)
+
+# Per-route latency histograms and a Server-Timing header on every response
+request_metrics = metrics.RequestMetrics(app, app_metrics)
 
 if __name__ == '__main__':
     # Development server only - DO NOT use in production!
@@ -1083,19 +1990,8 @@ if __name__ == '__main__':
     debug_mode = flask_debug_raw.lower() == 'true'  # Default to True for local dev
     print(f"DEBUG: FLASK_DEBUG from environment: '{flask_debug_raw}' -> debug_mode={debug_mode}", flush=True)
     
-    # Enable logging for better visibility
-    import logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S',
-        force=True  # Force reconfiguration
-    )
-    
-    # Enable Werkzeug request logging
-    log = logging.getLogger('werkzeug')
-    log.setLevel(logging.INFO)
-    log.disabled = False  # Make sure it's enabled
+    # Werkzeug's own access log duplicates the structured request log
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
     
     # Print startup message
     print("\n" + "="*60, flush=True)
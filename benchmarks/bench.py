@@ -0,0 +1,258 @@
+"""
+Benchmarks for the split pipeline.
+
+    python benchmarks/bench.py run [--sizes 1000,10000] [--repeat 3] [--output results.json]
+    python benchmarks/bench.py run --baseline benchmarks/baselines/default.json
+    python benchmarks/bench.py compare OLD.json NEW.json [--threshold 15]
+
+Every case is timed `repeat` times (median wall time is compared) and run once
+more under tracemalloc for its peak Python memory. `compare` flags cases whose
+wall time or peak memory grew by more than the threshold and exits with 1.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import openpyxl
+import split
+import workbooks
+
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+DEFAULT_SIZES = (1000, 10000)
+ALL_SIZES = (1000, 10000, 100000, 500000)
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 15.0  # Percent
+IN_MEMORY_MAX_ROWS = 100000  # Full workbook loads (in-memory engine, column validation) are skipped above this size
+RESULTS_VERSION = 1
+# Changes smaller than these are noise, whatever their percentage
+MIN_TIME_DELTA = 0.005  # Seconds
+MIN_MEMORY_DELTA = 64 * 1024  # Bytes
+
+
+def measure(func, repeat):
+    """Time func() `repeat` times, then run it once under tracemalloc. Returns the result entry."""
+    wall_times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        wall_times.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'wall_time': round(statistics.median(wall_times), 6),
+        'wall_times': [round(t, 6) for t in wall_times],
+        'peak_memory': peak
+    }
+
+
+class PreviewClient:
+    """The Flask app in a scratch working directory, with a logged-in test client"""
+
+    def __init__(self):
+        self.workdir = tempfile.mkdtemp(prefix='bench_app_')
+        self._cwd = os.getcwd()
+        os.chdir(self.workdir)
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        import app as app_module
+        self.app_module = app_module
+        app_module.app.config['TESTING'] = True
+        self.client = app_module.app.test_client()
+        with self.client.session_transaction() as session:
+            session['user_info'] = {'id': 'bench', 'email': 'bench@example.com', 'name': 'Bench', 'picture': ''}
+            session['_user_id'] = 'bench'
+            session['_fresh'] = True
+
+    def add_upload(self, path):
+        """Copy a workbook into the uploads folder. Returns its stored name."""
+        name = os.path.basename(path)
+        shutil.copyfile(path, os.path.join(self.workdir, self.app_module.app.config['UPLOAD_FOLDER'], name))
+        return name
+
+    def preview(self, name, page):
+        response = self.client.get(f'/preview/uploads/{name}?page={page}')
+        if response.status_code != 200:
+            raise RuntimeError(f"Preview failed ({response.status_code}): {response.get_data(as_text=True)[:200]}")
+        return response
+
+    def close(self):
+        os.chdir(self._cwd)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def run_cases(sizes, repeat, kinds, log=print):
+    """Run every benchmark case. Returns {case_id: result entry}."""
+    import preview_index
+
+    results = {}
+    preview = PreviewClient()
+    try:
+        for rows in sizes:
+            for kind in kinds:
+                path = workbooks.get_workbook(DATA_DIR, kind, rows)
+                column = workbooks.TARGET_COLUMN
+                max_chars = workbooks.MAX_CHARS
+                suffix = f"rows={rows}/{kind}"
+
+                def validate_column():
+                    # Needs a regular worksheet (it reads the sheet dimensions), like the in-memory engine
+                    wb = openpyxl.load_workbook(path)
+                    split.validate_column_data(wb.active, column)
+
+                cases = [('validate_file_content', lambda: preview.app_module.validate_file_content(path))]
+                if rows <= IN_MEMORY_MAX_ROWS:
+                    cases.append(('validate_column_data', validate_column))
+                for engine in split.ENGINES:
+                    if engine == split.ENGINE_IN_MEMORY and rows > IN_MEMORY_MAX_ROWS:
+                        continue
+                    cases.append((f'split.main[{engine}]', lambda engine=engine: _run_main(path, column, max_chars, engine)))
+
+                name = preview.add_upload(path)
+                stored = os.path.join(preview.workdir, 'uploads', name)
+                last_page = max(1, (rows + preview_index.ROWS_PER_PAGE - 1) // preview_index.ROWS_PER_PAGE)
+
+                def preview_cold():
+                    # First fetch of a file: builds the page index
+                    preview_index.remove_index(stored)
+                    preview.preview(name, 1)
+
+                cases.append(('preview[first fetch]', preview_cold))
+                cases.append(('preview[last page]', lambda: preview.preview(name, last_page)))
+
+                for case_name, func in cases:
+                    case_id = f"{case_name}/{suffix}"
+                    results[case_id] = measure(func, repeat)
+                    log(f"{case_id:<60} {results[case_id]['wall_time'] * 1000:>10.1f} ms "
+                        f"{results[case_id]['peak_memory'] / 1024 / 1024:>8.1f} MiB")
+    finally:
+        preview.close()
+    return results
+
+
+def _run_main(path, column, max_chars, engine):
+    success, message, output_filename = split.main(path, column, max_chars, engine=engine)
+    if output_filename and os.path.exists(output_filename):
+        os.remove(output_filename)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, threshold):
+    """
+    Compare two result files.
+
+    Returns: (lines, regressions) - a report line per common case and the number of regressions
+    """
+    lines = []
+    regressions = 0
+    for case_id in sorted(set(baseline['results']) & set(current['results'])):
+        old = baseline['results'][case_id]
+        new = current['results'][case_id]
+        flags = []
+        changes = []
+        for key, label, min_delta in (('wall_time', 'time', MIN_TIME_DELTA), ('peak_memory', 'memory', MIN_MEMORY_DELTA)):
+            if not old[key]:
+                continue
+            change = (new[key] - old[key]) / old[key] * 100
+            changes.append(f"{label} {change:+6.1f}%")
+            if change > threshold and new[key] - old[key] > min_delta:
+                flags.append(label)
+        if flags:
+            regressions += 1
+        marker = 'REGRESSION' if flags else 'ok'
+        lines.append(f"{marker:<10} {case_id:<60} {'  '.join(changes)}")
+    for case_id in sorted(set(baseline['results']) - set(current['results'])):
+        lines.append(f"{'missing':<10} {case_id}")
+    return lines, regressions
+
+
+def _load(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the split pipeline.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('--sizes', type=str, default=','.join(map(str, DEFAULT_SIZES)),
+                            help=f"comma separated row counts (all: {','.join(map(str, ALL_SIZES))})")
+    run_parser.add_argument('--kinds', type=str, default=','.join(workbooks.KINDS), help='comma separated workbook kinds')
+    run_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='timed runs per case')
+    run_parser.add_argument('--output', type=str, help='write the results to this JSON file')
+    run_parser.add_argument('--baseline', type=str, help='compare the results with this JSON file')
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='regression threshold in percent')
+
+    compare_parser = commands.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('baseline', type=str)
+    compare_parser.add_argument('current', type=str)
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='regression threshold in percent')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        current = _load(args.current)
+        baseline = _load(args.baseline)
+    else:
+        sizes = [int(size) for size in args.sizes.split(',') if size]
+        kinds = [kind for kind in args.kinds.split(',') if kind]
+        unknown = [kind for kind in kinds if kind not in workbooks.KINDS]
+        if unknown:
+            parser.error(f"unknown kinds: {', '.join(unknown)}")
+        current = {
+            'version': RESULTS_VERSION,
+            'meta': {
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'commit': _git_commit(),
+                'python': platform.python_version(),
+                'openpyxl': openpyxl.__version__,
+                'platform': platform.platform(),
+                'repeat': args.repeat,
+                'generator_version': workbooks.GENERATOR_VERSION
+            },
+            'results': run_cases(sizes, args.repeat, kinds)
+        }
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(current, f, indent=2)
+            print(f"Results written to {args.output}")
+        if not args.baseline:
+            return 0
+        baseline = _load(args.baseline)
+
+    lines, regressions = compare(baseline, current, args.threshold)
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'} (threshold {args.threshold:.0f}%):")
+    print('\n'.join(lines))
+    if regressions:
+        print(f"\n{regressions} case(s) regressed by more than {args.threshold:.0f}%")
+        return 1
+    print('\nNo regressions')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
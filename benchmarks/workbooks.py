@@ -0,0 +1,91 @@
+"""
+Deterministic generator of benchmark workbooks.
+
+The same (kind, rows, seed) always produces the same cell values, so timings
+of different commits are measured on identical input. Workbooks are written
+with a write-only workbook to keep generation of large sizes fast.
+"""
+import os
+import random
+import openpyxl
+from openpyxl.utils import get_column_letter, column_index_from_string
+
+# Bump when the generated content changes, so cached workbooks are rebuilt
+GENERATOR_VERSION = 1
+DEFAULT_SEED = 1234
+
+TARGET_COLUMN = 'B'
+MAX_CHARS = 40  # max_chars used for the split benchmarks
+DECOY_COLUMN_INDEX = 120  # Decoy workbooks have one stray value this far to the right, in the last row
+
+# Kinds of workbooks
+# - short: every description fits in MAX_CHARS (nothing to split)
+# - long: unique descriptions of 80-400 characters (split-bound)
+# - repeated: a small pool of long descriptions repeated (split cache hits)
+# - decoy: long descriptions plus one value in a far column in the last row,
+#   so validation has to scan everything (and wide rows) before failing
+KINDS = ('short', 'long', 'repeated', 'decoy')
+
+_WORDS = (
+    'cablu', 'NYY-J', 'NYM-J', 'CYY-F', 'H07RN-F', '3x1.5', '3x2.5', '5x6', 'mm2', 'negru', 'gri', 'rola', '100m',
+    'tub', 'flexibil', 'PVC', 'diametru', '20mm', 'doza', 'aparent', 'ingropat', 'IP65', 'priza', 'dubla',
+    'intrerupator', 'cap', 'scara', 'alb', 'siguranta', 'automata', 'C16', 'B10', '6kA', 'modul', 'tablou',
+    'distributie', '24', 'module', 'sina', 'DIN', 'corp', 'iluminat', 'LED', '36W', '4000K', 'etans',
+    'prelungitor', 'borne', 'conector', 'rapid', 'clema', 'legatura', 'impamantare', 'banda', 'izolatoare'
+)
+
+
+def workbook_name(kind, rows, seed=DEFAULT_SEED):
+    return f"{kind}_{rows}_s{seed}_v{GENERATOR_VERSION}.xlsx"
+
+
+def _description(rng, min_length, max_length):
+    length = rng.randint(min_length, max_length)
+    words = []
+    total = 0
+    while total < length:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        total += len(word) + 1
+    return ' '.join(words)[:max_length].strip()
+
+
+def _values(kind, rows, rng):
+    if kind == 'short':
+        for _ in range(rows):
+            yield _description(rng, 8, MAX_CHARS - 4)
+    elif kind == 'repeated':
+        pool = [_description(rng, 80, 400) for _ in range(50)]
+        for _ in range(rows):
+            yield rng.choice(pool)
+    else:
+        for _ in range(rows):
+            yield _description(rng, 80, 400)
+
+
+def generate(kind, rows, path, seed=DEFAULT_SEED):
+    """Write a benchmark workbook with `rows` descriptions in TARGET_COLUMN"""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown workbook kind '{kind}'. Available kinds: {', '.join(KINDS)}")
+    rng = random.Random(f"{kind}:{rows}:{seed}")
+    wb = openpyxl.Workbook(write_only=True)
+    sheet = wb.create_sheet(title='Sheet1')
+    padding = [None] * (column_index_from_string(TARGET_COLUMN) - 1)
+    for row_idx, value in enumerate(_values(kind, rows, rng), start=1):
+        row = padding + [value]
+        if kind == 'decoy' and row_idx == rows:
+            row += [None] * (DECOY_COLUMN_INDEX - len(row) - 1) + [f"stray value in {get_column_letter(DECOY_COLUMN_INDEX)}"]
+        sheet.append(row)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    wb.save(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def get_workbook(folder, kind, rows, seed=DEFAULT_SEED):
+    """Path of a benchmark workbook, generated on first use"""
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, workbook_name(kind, rows, seed))
+    if not os.path.exists(path):
+        generate(kind, rows, path, seed)
+    return path
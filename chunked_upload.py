@@ -0,0 +1,274 @@
+"""
+Chunked, resumable uploads.
+
+An upload is started with its file name and size, its chunks are then sent one
+request each, in order, and it is completed once every chunk arrived. Chunks
+are streamed straight into a .part file and hashed on the way; the upload state
+(chunks received and their digests) is one JSON file next to it, so any
+gunicorn worker can take the next chunk. A client whose connection dropped asks
+for the state and resumes from the first missing chunk.
+
+Chunks are hashed independently, so the fingerprint of a file is the SHA-256 of
+the SHA-256 digests of its CHUNK_SIZE blocks. BlockHasher computes the same
+fingerprint for files uploaded in one request.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import fcntl
+import shutil
+import hashlib
+import threading
+
+CHUNK_SIZE = 4 * 1024 * 1024  # Also the block size of the fingerprint, changing it changes every fingerprint
+READ_SIZE = 64 * 1024  # Bytes read from the request at a time
+SNIFF_SIZE = 8192  # Bytes of the first chunk passed to the file signature check
+
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def fingerprint(digests):
+    """Fingerprint of a file from the hex digests of its blocks"""
+    return hashlib.sha256(''.join(digests).encode('ascii')).hexdigest()
+
+
+class BlockHasher:
+    """hashlib-like hasher producing the block fingerprint of the bytes fed to it"""
+
+    def __init__(self):
+        self._digests = []
+        self._block = hashlib.sha256()
+        self._block_size = 0
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), CHUNK_SIZE - self._block_size)
+            self._block.update(view[:take])
+            self._block_size += take
+            view = view[take:]
+            if self._block_size == CHUNK_SIZE:
+                self._digests.append(self._block.hexdigest())
+                self._block = hashlib.sha256()
+                self._block_size = 0
+
+    def hexdigest(self):
+        digests = list(self._digests)
+        if self._block_size or not digests:
+            digests.append(self._block.hexdigest())
+        return fingerprint(digests)
+
+
+class UploadError(Exception):
+    """An upload request that cannot be accepted, with the HTTP status to answer with"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UploadSessions:
+    """Upload sessions stored as <id>.json (state) and <id>.part (data) in one folder"""
+
+    def __init__(self, folder, max_size, max_age, max_sessions=None):
+        self.folder = folder
+        self.max_size = max_size
+        self.max_age = max_age
+        self.max_sessions = max_sessions  # Unfinished uploads per owner, None for no limit
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, upload_id, suffix):
+        return os.path.join(self.folder, f"{upload_id}{suffix}")
+
+    def _write(self, state):
+        """Write the state atomically so readers never see a partial file"""
+        path = self._path(state['id'], '.json')
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def _load(self, upload_id, owner):
+        if not UPLOAD_ID_PATTERN.match(upload_id or ''):
+            raise UploadError('Upload not found', 404)
+        try:
+            with open(self._path(upload_id, '.json'), 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            raise UploadError('Upload not found', 404)
+        if state.get('owner') != owner:
+            raise UploadError('Upload not found', 404)
+        return state
+
+    def _remove(self, upload_id):
+        for suffix in ('.part', '.json'):
+            try:
+                os.remove(self._path(upload_id, suffix))
+            except OSError:
+                pass
+
+    def _count(self, owner):
+        """Number of unfinished uploads of an owner"""
+        count = 0
+        for entry in os.scandir(self.folder):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path, 'r') as f:
+                    if json.load(f).get('owner') == owner:
+                        count += 1
+            except (OSError, ValueError):
+                continue
+        return count
+
+    def create(self, filename, size, owner=None):
+        """
+        Start an upload of `size` bytes. An owner already at max_sessions
+        unfinished uploads gets an UploadError 429.
+
+        Returns: the upload state
+        """
+        if size <= 0:
+            raise UploadError('File is empty')
+        if size > self.max_size:
+            raise UploadError(f'File is too large (maximum {self.max_size // (1024 * 1024)} MB)', 413)
+        self.remove_expired()
+
+        with open(os.path.join(self.folder, '.create.lock'), 'w') as lock:
+            # Counting and creating under one lock, so parallel requests of an owner cannot exceed the limit
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if self.max_sessions is not None and self._count(owner) >= self.max_sessions:
+                raise UploadError(f'Too many unfinished uploads (maximum {self.max_sessions}), '
+                                  'complete or cancel one first', 429)
+            return self._create(filename, size, owner)
+
+    def _create(self, filename, size, owner):
+        now = time.time()
+        state = {
+            'id': uuid.uuid4().hex,
+            'owner': owner,
+            'filename': filename,
+            'size': size,
+            'chunk_size': CHUNK_SIZE,
+            'total_chunks': (size + CHUNK_SIZE - 1) // CHUNK_SIZE,
+            'received': 0,
+            'digests': [],
+            'created_at': now,
+            'updated_at': now
+        }
+        open(self._path(state['id'], '.part'), 'wb').close()
+        self._write(state)
+        return state
+
+    def get(self, upload_id, owner=None):
+        """The state of an upload (UploadError 404 for unknown ids and other owners)"""
+        return self._load(upload_id, owner)
+
+    def add_chunk(self, upload_id, index, stream, length, owner=None, check_header=None):
+        """
+        Stream chunk `index` of `length` bytes from `stream` into the upload.
+
+        Chunks must arrive in order; a chunk that was already received is
+        acknowledged without being written again, so clients can retry a chunk
+        whose response was lost. check_header(header) -> (is_valid, error_message)
+        is called with the first SNIFF_SIZE bytes of the file; the upload is
+        dropped if it fails.
+
+        Returns: the upload state
+        """
+        state = self._load(upload_id, owner)
+        if index < 0 or index >= state['total_chunks']:
+            raise UploadError(f"Chunk index must be between 0 and {state['total_chunks'] - 1}")
+        offset = index * state['chunk_size']
+        expected = min(state['chunk_size'], state['size'] - offset)
+        if length != expected:
+            raise UploadError(f'Chunk {index} must be {expected} bytes, got {length}')
+
+        try:
+            part = open(self._path(upload_id, '.part'), 'r+b')
+        except OSError:
+            raise UploadError('Upload not found', 404)
+        with part:
+            # One writer per upload across workers and threads; the state is re-read under the lock
+            fcntl.flock(part, fcntl.LOCK_EX)
+            state = self._load(upload_id, owner)
+            if index < state['received']:
+                return state
+            if index > state['received']:
+                raise UploadError(f"Chunk {index} is out of order, expected chunk {state['received']}", 409)
+
+            hasher = hashlib.sha256()
+            header = bytearray() if index == 0 and check_header else None
+            part.seek(offset)
+            remaining = length
+            while remaining:
+                data = stream.read(min(READ_SIZE, remaining))
+                if not data:
+                    raise UploadError(f'Chunk {index} is incomplete, send it again')
+                hasher.update(data)
+                part.write(data)
+                remaining -= len(data)
+                if header is not None:
+                    header += data[:SNIFF_SIZE - len(header)]
+                    if len(header) >= min(SNIFF_SIZE, length):
+                        is_valid, error_msg = check_header(bytes(header))
+                        if not is_valid:
+                            self._remove(upload_id)
+                            raise UploadError(error_msg)
+                        header = None
+
+            state['digests'].append(hasher.hexdigest())
+            state['received'] += 1
+            state['updated_at'] = time.time()
+            self._write(state)
+        return state
+
+    def complete(self, upload_id, filepath, owner=None):
+        """
+        Move a fully received upload to filepath.
+
+        Returns: (content_hash, size)
+        """
+        state = self._load(upload_id, owner)
+        if state['received'] != state['total_chunks']:
+            raise UploadError(f"Upload is incomplete: {state['received']} of {state['total_chunks']} chunks received", 409)
+        try:
+            shutil.move(self._path(upload_id, '.part'), filepath)
+        except OSError:
+            raise UploadError('Upload not found', 404)
+        self._remove(upload_id)
+        return fingerprint(state['digests']), state['size']
+
+    def abort(self, upload_id, owner=None):
+        """Drop an upload and its received chunks"""
+        self._load(upload_id, owner)
+        self._remove(upload_id)
+
+    def remove_expired(self):
+        """Remove uploads that received nothing for max_age seconds"""
+        now = time.time()
+        for entry in os.scandir(self.folder):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                if now - entry.stat().st_mtime > self.max_age:
+                    self._remove(entry.name[:-len('.json')])
+            except OSError:
+                continue
+
+
+def public_state(state):
+    """The upload state as returned to clients"""
+    return {
+        'upload_id': state['id'],
+        'filename': state['filename'],
+        'size': state['size'],
+        'chunk_size': state['chunk_size'],
+        'total_chunks': state['total_chunks'],
+        'received_chunks': state['received'],
+        'received_bytes': min(state['received'] * state['chunk_size'], state['size']),
+        'next_chunk': state['received'] if state['received'] < state['total_chunks'] else None,
+        'complete': state['received'] == state['total_chunks']
+    }
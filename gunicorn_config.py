@@ -1,8 +1,13 @@
 bind = "127.0.0.1:5000"
 workers = 4
-worker_class = "sync"
+# Threaded workers: job progress streams (/jobs/<id>/events) stay open while a job runs,
+# a sync worker would be blocked by each one (and killed after timeout)
+worker_class = "gthread"
+threads = 8
 worker_connections = 1000
 timeout = 30
+# /process only enqueues a job; give running background jobs time to finish when a worker restarts
+graceful_timeout = 120
 keepalive = 2
 max_requests = 1000
 max_requests_jitter = 100
@@ -0,0 +1,189 @@
+"""
+Upload ingest: parse a workbook (or CSV/TSV/TXT file) once and keep what later steps need.
+
+The metadata (sheet names, dimensions, row count and per-column statistics)
+is stored as JSON next to the uploaded file, so validation, processing and
+preview can reuse it instead of opening the workbook again. Text files are
+described as a workbook with one sheet named after the file.
+"""
+import os
+import json
+import threading
+import openpyxl
+from openpyxl.utils import get_column_letter, column_index_from_string
+
+import split
+
+METADATA_SUFFIX = '.meta.json'
+# (2: total_columns of text files is their widest row, like the text engine counts it; 3: column_range)
+METADATA_VERSION = 3
+SAMPLE_LENGTH = 50  # Characters kept from the first value of each column
+
+
+def metadata_path(filepath):
+    """Path of the metadata sidecar for a stored file"""
+    return f"{filepath}{METADATA_SUFFIX}"
+
+
+def inspect_file(filepath):
+    """Collect the metadata of a workbook or text file, see inspect_workbook"""
+    if split.is_text_file(filepath):
+        return inspect_text_file(filepath)
+    return inspect_workbook(filepath)
+
+
+def inspect_text_file(filepath):
+    """Collect the metadata of a CSV/TSV/TXT file in a single pass with the csv module"""
+    metadata = _new_metadata(filepath, [os.path.basename(filepath)])
+    metadata['sheet_name'] = metadata['sheet_names'][0]
+    _scan_columns(metadata, split.iter_text_rows(filepath))
+    return metadata
+
+
+def _new_metadata(filepath, sheet_names):
+    return {
+        'version': METADATA_VERSION,
+        'size': os.path.getsize(filepath),
+        'sheet_names': sheet_names,
+        'sheet_count': len(sheet_names),
+        'sheet_name': None,
+        'total_rows': 0,
+        'total_columns': 0,
+        'column_range': None,  # [min, max] column index recorded in the sheet dimensions, if any
+        'data_rows': 0,
+        'columns_with_data': []
+    }
+
+
+def _scan_columns(metadata, rows):
+    """Per-column statistics, collected in one row-ordered pass"""
+    columns = {}
+    data_rows = 0
+    rows_seen = 0
+    widest = 0
+    for row in rows:
+        rows_seen += 1
+        if len(row) > widest:
+            widest = len(row)
+        row_has_data = False
+        for col_idx, value in enumerate(row, start=1):
+            if not split.has_value(value):
+                continue
+            row_has_data = True
+            stats = columns.get(col_idx)
+            if stats is None:
+                stats = columns[col_idx] = {
+                    'letter': get_column_letter(col_idx),
+                    'index': col_idx,
+                    'sample': str(value)[:SAMPLE_LENGTH],
+                    'cells': 0,
+                    'text_cells': 0,
+                    'total_length': 0,
+                    'max_length': 0
+                }
+            stats['cells'] += 1
+            if isinstance(value, str):
+                length = len(value.strip())
+                stats['text_cells'] += 1
+                stats['total_length'] += length
+                if length > stats['max_length']:
+                    stats['max_length'] = length
+        if row_has_data:
+            data_rows += 1
+
+    # Not every writer records the sheet dimensions
+    metadata['total_rows'] = max(metadata['total_rows'], rows_seen)
+    metadata['data_rows'] = data_rows
+    for col_idx in sorted(columns):
+        stats = columns[col_idx]
+        text_cells = stats.pop('text_cells')
+        total_length = stats.pop('total_length')
+        stats['avg_length'] = round(total_length / text_cells, 0) if text_cells else 0
+        metadata['columns_with_data'].append(stats)
+    metadata['total_columns'] = max(metadata['total_columns'], widest)
+
+
+def inspect_workbook(filepath):
+    """
+    Open a workbook once (read-only) and collect its metadata in a single row pass.
+
+    Raises whatever openpyxl raises for files it cannot open.
+    """
+    wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        metadata = _new_metadata(filepath, wb.sheetnames)
+        # Files with several sheets are rejected, no need to scan them
+        if len(wb.sheetnames) != 1:
+            return metadata
+
+        sheet = wb.active
+        metadata['sheet_name'] = sheet.title
+        metadata['total_rows'] = sheet.max_row or 0
+        metadata['total_columns'] = sheet.max_column or 0
+        # The engines check the processing column against the recorded dimensions (not every writer records them)
+        if sheet.max_column:
+            metadata['column_range'] = [sheet.min_column or 1, sheet.max_column]
+
+        _scan_columns(metadata, sheet.iter_rows(values_only=True))
+        return metadata
+    finally:
+        wb.close()
+
+
+def save_metadata(filepath, metadata):
+    """Store metadata next to the file (atomically, other workers may be reading it)"""
+    path = metadata_path(filepath)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(metadata, f)
+    os.replace(tmp_path, path)
+
+
+def load_metadata(filepath):
+    """Load stored metadata. Returns None if there is none or it is outdated."""
+    try:
+        with open(metadata_path(filepath), 'r') as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if metadata.get('version') != METADATA_VERSION:
+        return None
+    return metadata
+
+
+def remove_metadata(filepath):
+    """Remove the metadata sidecar of a file, if any"""
+    try:
+        os.remove(metadata_path(filepath))
+    except OSError:
+        pass
+
+
+def check_column(metadata, column, text=False):
+    """
+    Check a processing column against stored metadata without opening the workbook.
+    text is True for the metadata of a CSV/TSV/TXT file.
+
+    Returns: (is_valid, error_message) using the same messages as split.main
+    """
+    try:
+        col_idx = column_index_from_string(column)
+    except ValueError:
+        return False, f"Invalid column name: '{column}'"
+    if metadata['sheet_count'] != 1:
+        return False, f"The Excel file must contain exactly ONE sheet. Found {metadata['sheet_count']} sheet(s): {', '.join(metadata['sheet_names'])}"
+    if text:
+        error_message = split.text_column_error(column, col_idx, metadata['total_columns'])
+        if error_message:
+            return False, error_message
+    elif metadata.get('column_range'):
+        min_col, max_col = metadata['column_range']
+        if col_idx < min_col or col_idx > max_col:
+            return False, f"Column '{column}' does not exist in the sheet. Available columns: {get_column_letter(min_col)} to {get_column_letter(max_col)}"
+    letters = [col['letter'] for col in metadata['columns_with_data']]
+    other_columns = [letter for letter in letters if letter != column]
+    if other_columns:
+        return False, f"Data exists in multiple columns. Found data in columns: {', '.join(other_columns)}. Data must exist ONLY in column '{column}'."
+    if column not in letters:
+        return False, f"No data found in column '{column}'. The column exists but is empty."
+    return True, None
@@ -0,0 +1,198 @@
+"""
+Background job queue for file processing.
+
+Jobs run on a small thread pool inside each worker process, so a request only
+has to enqueue the job and can return right away. The state of every job is
+stored as one JSON file in the job folder, which lets any gunicorn worker
+answer status requests for jobs started by another worker. Jobs submitted with
+progress=True also get a progress(dict) callback whose last value is stored in
+the same file. Files of finished jobs are removed max_age seconds after their
+last write.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+# Job states
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED)
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+DEFAULT_MAX_AGE = 24 * 3600  # Seconds a finished job stays available
+EXPIRE_INTERVAL = 600  # Seconds between two scans for expired jobs in a worker process
+
+
+def _pid_alive(pid):
+    """Check if a process with the given pid is still running on this host"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """Thread pool backed job queue with file-based job state"""
+
+    def __init__(self, folder, max_workers=2, max_age=DEFAULT_MAX_AGE):
+        self.folder = folder
+        self.max_workers = max_workers
+        self.max_age = max_age
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._last_expire = 0
+        os.makedirs(folder, exist_ok=True)
+
+    def _get_executor(self):
+        # Created lazily (and again after a fork) so every gunicorn worker gets its own threads
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+                self._executor_pid = os.getpid()
+                self._pending = 0
+            return self._executor
+
+    def _path(self, job_id):
+        return os.path.join(self.folder, f"{job_id}.json")
+
+    def _write(self, job):
+        """Write job state atomically so readers never see a partial file"""
+        path = self._path(job['id'])
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def submit(self, func, kwargs=None, owner=None, params=None, progress=False):
+        """
+        Enqueue func(**kwargs). func must return a result dict with a 'success' key.
+        With progress=True func is also passed progress=callback, see set_progress.
+
+        Returns: job_id
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'state': JOB_QUEUED,
+            'owner': owner,
+            'params': params or {},
+            'pid': os.getpid(),
+            'created_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'queue_time': None,
+            'run_time': None,
+            'progress': None,
+            'result': None,
+            'error': None
+        }
+        self._write(job)
+        executor = self._get_executor()
+        with self._lock:
+            self._pending += 1
+        kwargs = dict(kwargs or {})
+        if progress:
+            kwargs['progress'] = lambda data: self.set_progress(job, data)
+        executor.submit(self._run, job, func, kwargs, time.time())
+        self._remove_expired_if_due()
+        return job_id
+
+    def _run(self, job, func, kwargs, queued_at):
+        started_at = time.time()
+        job['state'] = JOB_RUNNING
+        job['started_at'] = datetime.now().isoformat()
+        job['queue_time'] = round(started_at - queued_at, 3)
+        self._write(job)
+
+        try:
+            result = func(**kwargs)
+            job['result'] = result
+            job['state'] = JOB_SUCCEEDED if result.get('success') else JOB_FAILED
+            if not result.get('success'):
+                job['error'] = result.get('error')
+        except Exception as e:
+            log.exception('job %s failed', job['id'])
+            job['state'] = JOB_FAILED
+            job['error'] = str(e)
+            job['result'] = {'success': False, 'error': str(e)}
+        finally:
+            job['finished_at'] = datetime.now().isoformat()
+            job['run_time'] = round(time.time() - started_at, 3)
+            self._write(job)
+            with self._lock:
+                self._pending -= 1
+
+    def set_progress(self, job, progress):
+        """Store the progress of a running job (called from its own thread, at the rate the job reports)"""
+        job['progress'] = dict(progress, updated_at=time.time())
+        self._write(job)
+
+    def get(self, job_id):
+        """Load a job by id. Returns None if the id is invalid or unknown."""
+        if not job_id or not JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(self._path(job_id), 'r') as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # A job whose worker process died can never finish
+        if job['state'] not in FINISHED_STATES and not _pid_alive(job.get('pid')):
+            job['state'] = JOB_FAILED
+            job['error'] = 'The worker processing this job stopped before it finished'
+            job['result'] = {'success': False, 'error': job['error']}
+            job['finished_at'] = datetime.now().isoformat()
+            self._write(job)
+        return job
+
+    def _remove_expired_if_due(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_expire < EXPIRE_INTERVAL:
+                return
+            self._last_expire = now
+        self.remove_expired()
+
+    def remove_expired(self):
+        """Remove jobs finished (or left behind by a stopped worker) more than max_age seconds ago"""
+        now = time.time()
+        for entry in os.scandir(self.folder):
+            try:
+                if now - entry.stat().st_mtime <= self.max_age:
+                    continue
+                # Leftovers of interrupted writes
+                if entry.name.endswith('.tmp'):
+                    os.remove(entry.path)
+                    continue
+                if not entry.name.endswith('.json'):
+                    continue
+                with open(entry.path, 'r') as f:
+                    job = json.load(f)
+                # Queued jobs are not written while they wait, they stay until they ran
+                if job['state'] in FINISHED_STATES or not _pid_alive(job.get('pid')):
+                    os.remove(entry.path)
+            except (OSError, ValueError, KeyError):
+                continue
+
+    def depth(self):
+        """Number of jobs queued or running in this process"""
+        return self._pending
@@ -0,0 +1,180 @@
+"""
+Background email outbox.
+
+Jobs only enqueue their notification. A sender thread in each worker process
+delivers the queued messages in batches over one authenticated SMTP
+connection, which stays open while mail keeps coming and is closed after a
+short idle period. Failed sends are retried with exponential backoff.
+"""
+import os
+import time
+import heapq
+import queue
+import atexit
+import logging
+import smtplib
+import itertools
+import threading
+
+DEFAULT_BATCH_SIZE = 20  # Messages sent per wake-up of the sender
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF = 5.0  # Seconds before the first retry, doubled for every further attempt
+MAX_BACKOFF = 300.0
+DEFAULT_IDLE_TIMEOUT = 30.0  # Seconds an unused SMTP connection is kept open
+
+log = logging.getLogger(__name__)
+
+# Errors that will not go away by sending again
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPAuthenticationError)
+
+
+class MailOutbox:
+    """Queue of Flask-Mail messages delivered by a background thread over a reused connection"""
+
+    def __init__(self, app, mail, batch_size=DEFAULT_BATCH_SIZE, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 backoff=DEFAULT_BACKOFF, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.app = app
+        self.mail = mail
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        # Heap of (not_before, seq, message, attempts). It, _in_flight and _counts are changed by the
+        # sender thread and read by requests, always under _lock
+        self._retries = []
+        self._seq = itertools.count()
+        self._connection = None
+        self._last_used = 0.0
+        self._in_flight = 0
+        self._counts = {'sent': 0, 'failed': 0, 'retried': 0, 'connections': 0}
+        atexit.register(self.flush)
+
+    def _ensure_sender(self):
+        # Started lazily (and again after a fork) so every gunicorn worker has its own sender
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._retries = []
+                self._connection = None
+                self._last_used = 0.0
+                self._in_flight = 0
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='mail-outbox', daemon=True)
+                self._thread.start()
+            return self._queue
+
+    def enqueue(self, message):
+        """Queue a flask_mail.Message for delivery. Returns immediately."""
+        self._ensure_sender().put((message, 0))
+
+    def depth(self):
+        """Messages waiting to be sent (queued, being sent or waiting for a retry) in this process"""
+        if self._queue is None or self._pid != os.getpid():
+            return 0
+        with self._lock:
+            return self._queue.qsize() + len(self._retries) + self._in_flight
+
+    def stats(self):
+        """Queue depth and delivery counters of this process"""
+        with self._lock:
+            counts = dict(self._counts)
+        return dict(counts, pending=self.depth(), connected=self._connection is not None)
+
+    def flush(self, timeout=10.0):
+        """Wait until the outbox is empty (used at shutdown). Returns False on timeout."""
+        deadline = time.time() + timeout
+        while self.depth() and time.time() < deadline:
+            time.sleep(0.05)
+        return not self.depth()
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                batch = self._next_batch()
+                if batch:
+                    self._send_batch(batch)
+                elif self._connection is not None and time.time() - self._last_used >= self.idle_timeout:
+                    # Nothing to send for a while: close the idle connection
+                    self._disconnect()
+
+    def _next_batch(self):
+        """Wait for due messages (at most idle_timeout) and return up to batch_size of them"""
+        timeout = self.idle_timeout if self._connection is not None else None
+        with self._lock:
+            if self._retries:
+                wait = max(0.0, self._retries[0][0] - time.time())
+                timeout = wait if timeout is None else min(timeout, wait)
+
+        batch = []
+        try:
+            item = self._queue.get(timeout=timeout)
+            with self._lock:
+                self._in_flight += 1
+            batch.append(item)
+        except queue.Empty:
+            pass
+        with self._lock:
+            while self._retries and self._retries[0][0] <= time.time() and len(batch) < self.batch_size:
+                _, _, message, attempts = heapq.heappop(self._retries)
+                self._in_flight += 1
+                batch.append((message, attempts))
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._in_flight += 1
+                batch.append(item)
+        return batch
+
+    def _connect(self):
+        if self._connection is None:
+            connection = self.mail.connect()
+            connection.__enter__()
+            self._connection = connection
+            with self._lock:
+                self._counts['connections'] += 1
+        return self._connection
+
+    def _disconnect(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except Exception:
+                # The server may already have dropped the connection
+                pass
+
+    def _send_batch(self, batch):
+        for message, attempts in batch:
+            try:
+                self._connect().send(message)
+                with self._lock:
+                    self._counts['sent'] += 1
+                log.info('Email sent', extra={'subject': message.subject, 'recipients': message.recipients, 'attempts': attempts + 1})
+            except Exception as e:
+                # Start over with a fresh connection for the next message
+                self._disconnect()
+                self._retry(message, attempts + 1, e)
+            finally:
+                self._last_used = time.time()
+                with self._lock:
+                    self._in_flight -= 1
+
+    def _retry(self, message, attempts, error):
+        if isinstance(error, PERMANENT_ERRORS) or attempts >= self.max_attempts:
+            with self._lock:
+                self._counts['failed'] += 1
+            log.error('Email not sent, giving up: %s: %s', type(error).__name__, error,
+                      extra={'subject': message.subject, 'recipients': message.recipients, 'attempts': attempts})
+            return
+        delay = min(self.backoff * (2 ** (attempts - 1)), MAX_BACKOFF)
+        log.warning('Email send failed, retrying in %.0fs: %s: %s', delay, type(error).__name__, error,
+                    extra={'subject': message.subject, 'recipients': message.recipients, 'attempts': attempts})
+        with self._lock:
+            self._counts['retried'] += 1
+            heapq.heappush(self._retries, (time.time() + delay, next(self._seq), message, attempts))
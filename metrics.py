@@ -0,0 +1,298 @@
+"""
+Prometheus-style metrics shared across gunicorn workers.
+
+Every worker process keeps its counters and histograms in memory and writes
+a snapshot to <folder>/<pid>.json every few seconds. /metrics merges the
+snapshots of all workers into the Prometheus text format. Snapshots of
+workers that have exited are folded into one archive file so their counts
+are kept without the folder growing with every worker restart.
+"""
+import os
+import json
+import time
+import fcntl
+import bisect
+import threading
+from contextlib import contextmanager
+from flask import g, request
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+GAUGE = 'gauge'
+
+ARCHIVE_FILE = 'archive.json'
+LOCK_FILE = '.lock'
+DEFAULT_FLUSH_INTERVAL = 5.0  # Seconds between snapshot writes of a worker
+
+# Latency buckets (seconds) used when a histogram does not define its own
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _label_key(labels):
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + (list(extra) if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metrics:
+    """Metric registry of one worker process, plus the merge across all workers"""
+
+    def __init__(self, folder, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.folder = folder
+        self.flush_interval = flush_interval
+        self._definitions = {}  # name -> (type, help, buckets or gauge function)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # The flush thread and /metrics requests write the same snapshot
+        self._pid = None
+        self._counters = {}
+        self._histograms = {}
+        self._dirty = False
+        os.makedirs(folder, exist_ok=True)
+
+    # Definitions
+
+    def counter(self, name, help_text):
+        self._definitions[name] = (COUNTER, help_text, None)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self._definitions[name] = (HISTOGRAM, help_text, tuple(sorted(buckets)))
+
+    def gauge(self, name, help_text, func):
+        """A per-process value read when a snapshot is written, summed across workers"""
+        self._definitions[name] = (GAUGE, help_text, func)
+
+    # Recording
+
+    def _ensure_process(self):
+        # Counts belong to one process: start over (and start a flusher) after a fork
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._counters = {}
+            self._histograms = {}
+            self._dirty = False
+            threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def inc(self, name, value=1, **labels):
+        """Add value to a counter"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._ensure_process()
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._dirty = True
+
+    def observe(self, name, value, **labels):
+        """Record one observation in a histogram"""
+        buckets = self._definitions[name][2]
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._ensure_process()
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = {'counts': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0}
+            entry['counts'][bisect.bisect_left(buckets, value)] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+            self._dirty = True
+
+    # Snapshots
+
+    def _snapshot(self):
+        with self._lock:
+            snapshot = {
+                'pid': os.getpid(),
+                'counters': [[name, list(map(list, labels)), value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(map(list, labels)), entry['counts'], entry['sum'], entry['count']]
+                               for (name, labels), entry in self._histograms.items()],
+                'gauges': []
+            }
+            self._dirty = False
+        for name, (kind, _, func) in self._definitions.items():
+            if kind == GAUGE:
+                try:
+                    snapshot['gauges'].append([name, [], func()])
+                except Exception:
+                    # A broken gauge must not stop the snapshot
+                    pass
+        return snapshot
+
+    def _write_json(self, path, data):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def flush(self):
+        """Write this process' snapshot"""
+        with self._lock:
+            self._ensure_process()
+        # Taken and written under one lock, so an older snapshot never replaces a newer one
+        with self._flush_lock:
+            self._write_json(os.path.join(self.folder, f"{os.getpid()}.json"), self._snapshot())
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            if self._dirty or any(kind == GAUGE for kind, _, _ in self._definitions.values()):
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+    # Merging
+
+    def _merge(self, total, snapshot, include_gauges=True):
+        for name, labels, value in snapshot.get('counters', []):
+            key = (name, tuple(map(tuple, labels)))
+            total['counters'][key] = total['counters'].get(key, 0) + value
+        for name, labels, counts, value_sum, count in snapshot.get('histograms', []):
+            key = (name, tuple(map(tuple, labels)))
+            entry = total['histograms'].get(key)
+            if entry is None or len(entry['counts']) != len(counts):
+                entry = total['histograms'][key] = {'counts': [0] * len(counts), 'sum': 0.0, 'count': 0}
+            entry['counts'] = [a + b for a, b in zip(entry['counts'], counts)]
+            entry['sum'] += value_sum
+            entry['count'] += count
+        if include_gauges:
+            for name, labels, value in snapshot.get('gauges', []):
+                key = (name, tuple(map(tuple, labels)))
+                total['gauges'][key] = total['gauges'].get(key, 0) + value
+
+    def _to_snapshot(self, total):
+        return {
+            'counters': [[name, list(map(list, labels)), value] for (name, labels), value in total['counters'].items()],
+            'histograms': [[name, list(map(list, labels)), e['counts'], e['sum'], e['count']]
+                           for (name, labels), e in total['histograms'].items()]
+        }
+
+    def _read_json(self, path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def collect(self):
+        """Merge the snapshots of all workers (folding in exited ones). Returns the merged totals."""
+        self.flush()
+        total = {'counters': {}, 'histograms': {}, 'gauges': {}}
+        with open(os.path.join(self.folder, LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                archive_path = os.path.join(self.folder, ARCHIVE_FILE)
+                archive = {'counters': {}, 'histograms': {}, 'gauges': {}}
+                self._merge(archive, self._read_json(archive_path) or {}, include_gauges=False)
+                archive_changed = False
+                for entry in os.scandir(self.folder):
+                    name, ext = os.path.splitext(entry.name)
+                    if ext != '.json' or not name.isdigit():
+                        continue
+                    snapshot = self._read_json(entry.path)
+                    if snapshot is None:
+                        continue
+                    if int(name) != os.getpid() and not _pid_alive(int(name)):
+                        self._merge(archive, snapshot, include_gauges=False)
+                        archive_changed = True
+                        os.remove(entry.path)
+                    else:
+                        self._merge(total, snapshot)
+                if archive_changed:
+                    self._write_json(archive_path, self._to_snapshot(archive))
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self._merge(total, self._to_snapshot(archive), include_gauges=False)
+        return total
+
+    def render(self):
+        """All metrics of all workers in the Prometheus text exposition format"""
+        total = self.collect()
+        lines = []
+        for name, (kind, help_text, extra) in sorted(self._definitions.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == COUNTER:
+                samples = {labels: value for (n, labels), value in total['counters'].items() if n == name}
+                for labels, value in sorted(samples.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                if not samples:
+                    lines.append(f"{name} 0")
+            elif kind == GAUGE:
+                value = sum(v for (n, _), v in total['gauges'].items() if n == name)
+                lines.append(f"{name} {_format_value(value)}")
+            else:
+                for (n, labels), entry in sorted(total['histograms'].items()):
+                    if n != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(list(extra) + [float('inf')], entry['counts']):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels, [('le', _format_value(bound))])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(entry['sum'])}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {entry['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def server_timing(name):
+    """Time a step of the current request for its Server-Timing header"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = g.setdefault('server_timings', [])
+        timings.append((name, (time.perf_counter() - started) * 1000))
+
+
+class RequestMetrics:
+    """Records per-route latency and counts, and adds the Server-Timing header to every response"""
+
+    def __init__(self, app, registry):
+        self.registry = registry
+        registry.histogram('http_request_duration_seconds', 'Request latency by route')
+        registry.counter('http_requests_total', 'Requests by route, method and status')
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+
+    def _after_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        duration = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        self.registry.observe('http_request_duration_seconds', duration, route=route, method=request.method)
+        self.registry.inc('http_requests_total', route=route, method=request.method, status=response.status_code)
+
+        entries = [f"{name};dur={ms:.1f}" for name, ms in g.pop('server_timings', [])]
+        entries.append(f"app;dur={duration * 1000:.1f}")
+        response.headers['Server-Timing'] = ', '.join(entries)
+        return response
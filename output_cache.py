@@ -0,0 +1,110 @@
+"""
+Content-addressed cache of processed outputs.
+
+Entries are keyed by the fingerprint of the input bytes plus the processing
+parameters, so re-running the same file with the same column and max_chars
+returns the stored output instead of splitting it again. Entries are evicted
+by age and, least recently used first, by total size, together with their
+sidecar files.
+"""
+import os
+import time
+import shutil
+import threading
+import hashlib
+
+# Bump when the split output or the input fingerprint changes, so older entries are no longer used
+# (2: block fingerprint of chunked_upload instead of a plain SHA-256)
+CACHE_VERSION = 2
+ENTRY_SUFFIX = '.xlsx'  # Also used for CSV outputs, entries are only ever copied out
+
+
+def make_key(content_hash, column, max_chars, output_format='xlsx'):
+    """Cache key for an input fingerprint and the processing parameters"""
+    raw = f"{CACHE_VERSION}:{content_hash}:{column}:{max_chars}"
+    # xlsx keys stay as they were before other output formats existed
+    if output_format != 'xlsx':
+        raw += f":{output_format}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def link_or_copy(src, dst):
+    """Place a copy of src at dst, using a hard link when possible (outputs are never modified)"""
+    # Already in place (a hard link to the same file)
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
+    tmp_path = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+
+class OutputCache:
+    """Output files stored as <key>.xlsx in one folder, evicted by age and total size"""
+
+    def __init__(self, folder, max_bytes, max_age, sidecar_suffixes=(), on_store=None):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.sidecar_suffixes = tuple(sidecar_suffixes)  # <entry><suffix> files removed with an entry
+        self.on_store = on_store  # on_store(output_path, entry_path) after an output is stored, for its sidecars
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}{ENTRY_SUFFIX}")
+
+    def get(self, key):
+        """Return the path of a cached output, or None on a miss"""
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if time.time() - stat.st_mtime > self.max_age:
+            return None
+        # The modification time is the last use, for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, key, output_path):
+        """Store an output file under a key, then evict old entries"""
+        path = self._path(key)
+        link_or_copy(output_path, path)
+        if self.on_store:
+            self.on_store(output_path, path)
+        self.evict()
+
+    def evict(self):
+        """Remove expired entries, then the least recently used ones until the cache fits in max_bytes"""
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.folder):
+            if not entry.name.endswith(ENTRY_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.max_age:
+                self._remove(entry.path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            self._remove(path)
+            total_size -= size
+
+    def _remove(self, path):
+        for remove_path in [path] + [f"{path}{suffix}" for suffix in self.sidecar_suffixes]:
+            try:
+                os.remove(remove_path)
+            except OSError:
+                pass
@@ -0,0 +1,223 @@
+"""
+Page index for file previews.
+
+The first preview request for a file streams the sheet once and writes the
+preview rows, one JSON line per page, into a sidecar file next to it. A small
+index with the byte offset of every page is written last. Any later page is
+then served with a single seek and readline instead of re-parsing the sheet
+from the top.
+
+Outputs do not need an index: the engine keeps their first rows while it
+writes them (split.OutputPreview), and they are stored in a preview sidecar
+that answers the output preview without opening the file.
+"""
+import os
+import json
+import threading
+import openpyxl
+
+import split
+
+PAGES_SUFFIX = '.pages'
+INDEX_SUFFIX = '.pages.idx'
+INDEX_VERSION = 1
+OUTPUT_PREVIEW_SUFFIX = '.preview.json'
+
+ROWS_PER_PAGE = 50
+PREVIEW_MAX_COLUMNS = 50  # Limit columns for very wide files
+PREVIEW_MAX_CELL_LENGTH = 200  # Limit string length to prevent huge JSON responses
+
+
+def format_preview_value(value):
+    """Convert a cell value to the string shown in the preview"""
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        # Convert other types to string
+        value = str(value)
+    if len(value) > PREVIEW_MAX_CELL_LENGTH:
+        return value[:PREVIEW_MAX_CELL_LENGTH] + '...'
+    return value
+
+
+def _source_signature(filepath):
+    # Size and inode: files are replaced (never edited in place), and the output
+    # cache touches the modification time of hard-linked outputs
+    stat = os.stat(filepath)
+    return stat.st_size, stat.st_ino
+
+
+def _open_rows(filepath):
+    """
+    Open the rows of a workbook's active sheet, or of a CSV/TSV/TXT file.
+
+    Returns: (sheet_name, total_rows, total_columns, rows, close) - the totals
+    are 0 when unknown, rows are limited to the preview columns when known
+    """
+    if split.is_text_file(filepath):
+        rows = split.iter_text_rows(filepath)
+        return os.path.basename(filepath), 0, 0, rows, rows.close
+
+    wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    sheet = wb.active
+    total_rows = sheet.max_row or 0
+    total_cols = sheet.max_column or 0
+    # Sheets without recorded dimensions are read until their last row
+    rows = sheet.iter_rows(min_row=1, max_row=total_rows or None, min_col=1,
+                           max_col=min(PREVIEW_MAX_COLUMNS, total_cols) or None, values_only=True)
+    return sheet.title, total_rows, total_cols, rows, wb.close
+
+
+def build_index(filepath, rows_per_page=ROWS_PER_PAGE):
+    """Stream the sheet once and write the page file and its index. Returns the index."""
+    pages_path = f"{filepath}{PAGES_SUFFIX}"
+    index_path = f"{filepath}{INDEX_SUFFIX}"
+    tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    source_size, source_inode = _source_signature(filepath)
+
+    sheet_name, total_rows, total_cols, rows, close = _open_rows(filepath)
+    try:
+        preview_col_count = min(PREVIEW_MAX_COLUMNS, total_cols)
+
+        offsets = []
+        rows_seen = 0
+        widest_row = 0
+        with open(pages_path + tmp_suffix, 'wb') as pages_file:
+            page_rows = []
+            for row in rows:
+                rows_seen += 1
+                if not preview_col_count:
+                    widest_row = max(widest_row, len(row))
+                    row = row[:PREVIEW_MAX_COLUMNS]
+                page_rows.append([format_preview_value(value) for value in row])
+                if len(page_rows) == rows_per_page:
+                    offsets.append(pages_file.tell())
+                    pages_file.write(json.dumps(page_rows).encode('utf-8') + b'\n')
+                    page_rows = []
+            if page_rows:
+                offsets.append(pages_file.tell())
+                pages_file.write(json.dumps(page_rows).encode('utf-8') + b'\n')
+
+        if not total_rows:
+            total_rows = rows_seen
+        if not total_cols:
+            total_cols = widest_row
+            preview_col_count = min(PREVIEW_MAX_COLUMNS, total_cols)
+
+        index = {
+            'version': INDEX_VERSION,
+            'source_size': source_size,
+            'source_inode': source_inode,
+            'rows_per_page': rows_per_page,
+            'sheet_name': sheet_name,
+            'total_rows': total_rows,
+            'total_columns': total_cols,
+            'preview_columns': preview_col_count,
+            'offsets': offsets
+        }
+    finally:
+        close()
+
+    # The index goes last: once it exists the page file is complete
+    os.replace(pages_path + tmp_suffix, pages_path)
+    with open(index_path + tmp_suffix, 'w') as f:
+        json.dump(index, f)
+    os.replace(index_path + tmp_suffix, index_path)
+    return index
+
+
+def load_index(filepath, rows_per_page=ROWS_PER_PAGE):
+    """Load the page index of a file. Returns None if missing or built for another version of the file."""
+    try:
+        with open(f"{filepath}{INDEX_SUFFIX}", 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get('version') != INDEX_VERSION or index.get('rows_per_page') != rows_per_page:
+        return None
+    if (index['source_size'], index['source_inode']) != _source_signature(filepath):
+        return None
+    return index
+
+
+def get_index(filepath, rows_per_page=ROWS_PER_PAGE):
+    """Load the page index of a file, building it on first use"""
+    index = load_index(filepath, rows_per_page)
+    if index is None:
+        index = build_index(filepath, rows_per_page)
+    return index
+
+
+def read_page(filepath, index, page):
+    """Read the rows of one page (1-based) with a direct seek"""
+    offsets = index['offsets']
+    if page < 1 or page > len(offsets):
+        return []
+    with open(f"{filepath}{PAGES_SUFFIX}", 'rb') as f:
+        f.seek(offsets[page - 1])
+        return json.loads(f.readline())
+
+
+def remove_index(filepath):
+    """Remove the page file and index of a file, if any"""
+    for suffix in (PAGES_SUFFIX, INDEX_SUFFIX):
+        try:
+            os.remove(f"{filepath}{suffix}")
+        except OSError:
+            pass
+
+
+def save_output_preview(filepath, preview):
+    """Store the split.OutputPreview kept while writing an output, formatted like a first page"""
+    preview_col_count = min(PREVIEW_MAX_COLUMNS, preview.total_columns)
+    rows = []
+    for row in preview.rows[:ROWS_PER_PAGE]:
+        rows.append([format_preview_value(value) for value in row[:PREVIEW_MAX_COLUMNS]])
+
+    source_size, source_inode = _source_signature(filepath)
+    payload = {
+        'version': INDEX_VERSION,
+        'source_size': source_size,
+        'source_inode': source_inode,
+        'sheet_name': preview.sheet_name,
+        'total_rows': preview.total_rows,
+        'total_columns': preview.total_columns,
+        'preview_columns': preview_col_count,
+        'longest_chain': preview.longest_chain,
+        'rows': rows
+    }
+    _write_output_preview(filepath, payload)
+
+
+def _write_output_preview(filepath, payload):
+    path = f"{filepath}{OUTPUT_PREVIEW_SUFFIX}"
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def load_output_preview(filepath):
+    """Load the stored preview of an output. Returns None if missing or stored for another version of the file."""
+    try:
+        with open(f"{filepath}{OUTPUT_PREVIEW_SUFFIX}", 'r') as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if payload.get('version') != INDEX_VERSION:
+        return None
+    if (payload['source_size'], payload['source_inode']) != _source_signature(filepath):
+        return None
+    return payload
+
+
+def copy_output_preview(src, dst):
+    """Store the preview of output src for its copy dst (e.g. in or out of the output cache).
+    Returns False if src has no current preview."""
+    payload = load_output_preview(src)
+    if payload is None:
+        return False
+    # A copy has another inode than the file the preview was stored for
+    payload['source_size'], payload['source_inode'] = _source_signature(dst)
+    _write_output_preview(dst, payload)
+    return True
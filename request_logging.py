@@ -0,0 +1,153 @@
+"""
+Structured, non-blocking logging.
+
+Log records are formatted as JSON lines and handed to a queue; a listener
+thread in each worker process does the actual writing, so request threads
+never block on stdout. Request logs are one line per request with the
+duration as a field, and high-frequency routes can be sampled.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, request
+
+# Attributes every LogRecord has, anything else was passed in `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any `extra` fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class ProcessQueueHandler(QueueHandler):
+    """QueueHandler whose listener thread is (re)started in every process that logs"""
+
+    def __init__(self, target_handler):
+        super().__init__(queue.SimpleQueue())
+        self.target_handler = target_handler
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        # Threads do not survive a fork (gunicorn preload_app), so each worker starts its own
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self.queue = queue.SimpleQueue()
+                    self._listener = QueueListener(self.queue, self.target_handler, respect_handler_level=True)
+                    self._listener.start()
+                    self._pid = os.getpid()
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        super().enqueue(record)
+
+    def stop(self):
+        """Write out queued records (called at exit)"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._pid = None
+
+
+def setup_logging(level='INFO', stream=None):
+    """Send all logging through one queue handler with JSON output. Returns the handler."""
+    target = logging.StreamHandler(stream or sys.stdout)
+    target.setFormatter(JsonFormatter())
+    handler = ProcessQueueHandler(target)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if isinstance(existing, ProcessQueueHandler):
+            root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    atexit.register(handler.stop)
+    return handler
+
+
+def parse_sample_rates(value):
+    """
+    Parse 'path_prefix=rate,...' (e.g. '/api/preview=0.1,/api/statistics=0.05').
+
+    Returns a list of (prefix, rate), longest prefix first. Invalid entries are ignored.
+    """
+    rates = []
+    for item in (value or '').split(','):
+        prefix, _, rate = item.strip().partition('=')
+        try:
+            rate = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            continue
+        if prefix:
+            rates.append((prefix, rate))
+    return sorted(rates, key=lambda item: len(item[0]), reverse=True)
+
+
+class RequestLogger:
+    """Logs one structured line per request, sampling routes listed in sample_rates"""
+
+    def __init__(self, app, sample_rates=None, slow_ms=1000, logger_name='app.request'):
+        self.sample_rates = sample_rates or []
+        self.slow_ms = slow_ms
+        self.logger = logging.getLogger(logger_name)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def sample_rate(self, path):
+        for prefix, rate in self.sample_rates:
+            if path.startswith(prefix):
+                return rate
+        return 1.0
+
+    def _before_request(self):
+        g.request_started = time.perf_counter()
+
+    def _after_request(self, response):
+        started = g.pop('request_started', None)
+        duration_ms = round((time.perf_counter() - started) * 1000, 2) if started is not None else None
+
+        # Errors and slow requests are always logged, the rest according to the route's sample rate
+        rate = self.sample_rate(request.path)
+        if response.status_code < 400 and (duration_ms is None or duration_ms < self.slow_ms):
+            if rate < 1.0 and random.random() >= rate:
+                return response
+
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': duration_ms,
+            'response_bytes': response.calculate_content_length(),
+            'remote_addr': request.headers.get('X-Real-IP', request.remote_addr)
+        }
+        if request.method == 'POST':
+            fields['content_type'] = request.content_type
+            fields['request_bytes'] = request.content_length
+        if rate < 1.0:
+            fields['sample_rate'] = rate
+        self.logger.info('%s %s %s', response.status_code, request.method, request.path, extra=fields)
+        return response
@@ -80,7 +80,8 @@ echo "Creating Gunicorn configuration..."
 cat > /home/lastchance/ProjectTextApp/gunicorn_config.py << 'GUNICORNEOF'
 bind = "127.0.0.1:5000"
 workers = 4
-worker_class = "sync"
+worker_class = "gthread"  # Job progress streams stay open while a job runs
+threads = 8
 worker_connections = 1000
 timeout = 30
 keepalive = 2
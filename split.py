@@ -1,73 +1,940 @@
 
 import argparse
+import codecs
+import csv
+import glob
+import io
+import os
+import re
+import sys
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.utils import get_column_letter, column_index_from_string
 from openpyxl.styles import numbers
 
-def validate_column_data(sheet, column):
+# Available processing engines
+# - "streaming": read-only row iterator in, write-only workbook out (flat memory)
+# - "in_memory": full openpyxl workbook, every cell loaded as a Cell object
+# - "raw_xml": sheet XML parsed and written directly (xlsx_raw), falls back to
+#   "streaming" for workbooks it does not handle
+# - "auto": "raw_xml" from RAW_XML_MIN_SIZE up, "streaming" below
+ENGINE_STREAMING = 'streaming'
+ENGINE_IN_MEMORY = 'in_memory'
+ENGINE_RAW_XML = 'raw_xml'
+ENGINE_AUTO = 'auto'
+ENGINES = (ENGINE_STREAMING, ENGINE_IN_MEMORY, ENGINE_RAW_XML)
+DEFAULT_ENGINE = ENGINE_AUTO
+RAW_XML_MIN_SIZE = 16 * 1024  # Bytes; below this the milliseconds saved do not pay for a possible fallback
+# CSV/TSV/TXT inputs always use the text engine (csv module in, no openpyxl parsing)
+ENGINE_TEXT = 'text'
+
+# Plain text inputs
+# - .csv: delimiter detected from the first rows (comma, semicolon, tab or pipe)
+# - .tsv: tab separated
+# - .txt: one value per line, i.e. a single column A
+TEXT_FORMATS = {'.csv': ',', '.tsv': '\t', '.txt': None}
+CSV_DELIMITERS = ',;\t|'
+TEXT_SAMPLE_SIZE = 64 * 1024  # Bytes read to detect the delimiter
+# Tried in order; cp1250 covers older Romanian Excel exports. The last one is read with replacement characters.
+TEXT_ENCODINGS = ('utf-8-sig', 'cp1250')
+TEXT_OUTPUT_ENCODING = 'utf-8-sig'  # With a BOM, so Excel opens the diacritics correctly
+
+# Output formats (CSV output is only available for text inputs)
+OUTPUT_XLSX = 'xlsx'
+OUTPUT_CSV = 'csv'
+OUTPUT_FORMATS = (OUTPUT_XLSX, OUTPUT_CSV)
+
+# Per-job split cache limits
+SPLIT_CACHE_SIZE = 10000  # Maximum number of distinct values kept
+SPLIT_CACHE_MAX_VALUE_LENGTH = 4096  # Longer values are split without being cached
+
+# First non-whitespace character (same whitespace definition as str.strip)
+_NON_SPACE = re.compile(r'\S')
+
+def split_text(value, max_chars):
+    """
+    Split a cell value into parts that fit in max_chars characters.
+
+    Each split happens on the last space before the max_chars-th character of the
+    remaining text, and the parts are stripped. The remaining text is tracked as
+    bounds into the original string instead of being sliced and re-stripped on
+    every split, so long values are split in linear time. Non-string values and
+    values that already fit are returned unchanged.
+
+    Returns: list of parts (first part for the original cell, the rest for the overflow columns)
+    """
+    if not isinstance(value, str) or len(value) <= max_chars:
+        return [value]
+    if len(value.strip()) <= max_chars:
+        return [value]
+
+    # The first split works on the raw (unstripped) value
+    split_index = value.rfind(' ', 0, max_chars)
+    if split_index == -1:
+        return [value]
+    parts = [value[:split_index].strip()]
+
+    # From here on the remaining text is value[start:end], already stripped
+    end = len(value.rstrip())
+    match = _NON_SPACE.search(value, split_index + 1, end)
+    start = match.start() if match else end
+    while end - start > max_chars:
+        split_index = value.rfind(' ', start, start + max_chars)
+        if split_index == -1:
+            # Cannot split the remaining text any further
+            break
+        parts.append(value[start:split_index].rstrip())
+        match = _NON_SPACE.search(value, split_index + 1, end)
+        start = match.start() if match else end
+    parts.append(value[start:end])
+    return parts
+
+class SplitCache:
+    """
+    Bounded LRU memo of split_text results, keyed by (value, max_chars).
+
+    Catalogues repeat the same long description many times, so each job keeps
+    one cache and identical values are split only once. Values that fit in
+    max_chars are returned directly and are not counted.
+    """
+
+    def __init__(self, maxsize=SPLIT_CACHE_SIZE, max_value_length=SPLIT_CACHE_MAX_VALUE_LENGTH):
+        self.maxsize = maxsize
+        self.max_value_length = max_value_length
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def split(self, value, max_chars):
+        """Same as split_text, the returned list must not be modified"""
+        if not isinstance(value, str) or len(value) <= max_chars:
+            return [value]
+        if len(value) > self.max_value_length:
+            self.misses += 1
+            return split_text(value, max_chars)
+
+        key = (value, max_chars)
+        parts = self._entries.get(key)
+        if parts is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return parts
+
+        self.misses += 1
+        parts = split_text(value, max_chars)
+        self._entries[key] = parts
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return parts
+
+    def stats(self):
+        """Hit/miss counters for the job result"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'hit_rate': round(self.hits / lookups * 100, 2) if lookups else 0.0
+        }
+
+# Phases timed by SplitReport, in the order they happen
+PHASE_LOAD = 'load'  # Opening the workbook (and, for streaming, parsing its rows)
+PHASE_VALIDATE = 'validate'  # Sheet and column checks
+PHASE_FORMAT = 'format'  # Text number format on the processed column
+PHASE_SPLIT = 'split'  # Splitting the values
+PHASE_SAVE = 'save'  # Writing the output workbook
+PHASES = (PHASE_LOAD, PHASE_VALIDATE, PHASE_FORMAT, PHASE_SPLIT, PHASE_SAVE)
+
+class SplitReport:
+    """
+    Per-phase timings and counters of one split.main run.
+
+    Pass one to split.main and read it afterwards, like SplitCache. Times are
+    in seconds; phases that did not run (e.g. after a validation error) stay 0.
+    """
+
+    def __init__(self):
+        self.engine = None
+        self.phases = OrderedDict((phase, 0.0) for phase in PHASES)
+        self.rows_scanned = 0
+        self.cells_split = 0  # Cells whose value was split into more than one part
+        self.overflow_cells = 0  # Cells written to the right of the processed column
+        self.overflow_columns = 0  # Columns added to the right of the processed column
+        self.longest_chain = 0  # Most parts a single value was split into
+        self.fallback = None  # Why the raw_xml engine handed the file to the streaming engine
+        self.output_format = None
+        self.input_bytes = None
+        self.output_bytes = None
+
+    def reset(self):
+        """Start over, e.g. when an engine hands the file to another one"""
+        self.__init__()
+
+    def add_time(self, phase, seconds):
+        self.phases[phase] += seconds
+
+    def count_parts(self, parts):
+        """Count the parts a value was split into"""
+        if len(parts) > 1:
+            self.cells_split += 1
+            self.overflow_cells += len(parts) - 1
+        if len(parts) > self.longest_chain:
+            self.longest_chain = len(parts)
+            self.overflow_columns = len(parts) - 1
+
+    @property
+    def total_time(self):
+        return sum(self.phases.values())
+
+    def to_dict(self):
+        """JSON-friendly view for job results and statistics"""
+        return {
+            'engine': self.engine,
+            'phases': {phase: round(seconds, 4) for phase, seconds in self.phases.items()},
+            'total_time': round(self.total_time, 4),
+            'rows_scanned': self.rows_scanned,
+            'cells_split': self.cells_split,
+            'overflow_cells': self.overflow_cells,
+            'overflow_columns': self.overflow_columns,
+            'longest_chain': self.longest_chain,
+            'fallback': self.fallback,
+            'output_format': self.output_format,
+            'input_bytes': self.input_bytes,
+            'output_bytes': self.output_bytes
+        }
+
+PREVIEW_ROWS = 50  # Output rows kept by OutputPreview (the output preview shows the first 50)
+
+class OutputPreview:
+    """
+    First rows and totals of an output, kept by the engines while they write
+    it, so the output can be previewed without opening it again.
+    """
+
+    def __init__(self, max_rows=PREVIEW_ROWS):
+        self.max_rows = max_rows
+        self.reset()
+
+    def reset(self):
+        """Start over, e.g. when an engine hands the file to another one"""
+        self.sheet_name = None
+        self.rows = []
+        self.total_rows = 0
+        self.total_columns = 0
+        self.longest_chain = 0
+
+    def add(self, padding, values):
+        """Keep an output row (padding + values) while the preview is not full"""
+        if len(self.rows) < self.max_rows:
+            self.rows.append(padding + values)
+
+    def finish(self, sheet_name, total_rows, total_columns, longest_chain):
+        self.sheet_name = sheet_name
+        self.total_rows = total_rows
+        self.total_columns = total_columns
+        self.longest_chain = longest_chain
+
+    def to_dict(self):
+        return {
+            'sheet_name': self.sheet_name,
+            'total_rows': self.total_rows,
+            'total_columns': self.total_columns,
+            'longest_chain': self.longest_chain,
+            'rows': self.rows
+        }
+
+PROGRESS_INTERVAL = 0.5  # Seconds between progress reports
+PROGRESS_CHECK_ROWS = 500  # Rows between two looks at the clock
+
+class SplitProgress:
+    """
+    Progress of one split.main run, handed to callback(progress_dict) at a
+    bounded rate: once when a phase starts and at most every `interval`
+    seconds while rows are processed. Without a callback it only counts.
+    """
+
+    def __init__(self, callback=None, interval=PROGRESS_INTERVAL):
+        self.callback = callback
+        self.interval = interval
+        self._last_report = 0.0
+        self.reset()
+
+    def reset(self):
+        """Start over, e.g. when an engine hands the file to another one"""
+        self.phase = None
+        self.total_rows = None  # Rows recorded in the sheet dimensions, None when unknown
+        self.rows_scanned = 0
+        self.cells_split = 0
+        self._next_check = PROGRESS_CHECK_ROWS
+
+    def start(self, phase, total_rows=None):
+        """Enter a phase (one of PHASES) and report it"""
+        self.phase = phase
+        if total_rows is not None:
+            self.total_rows = total_rows
+        self._report()
+
+    def rows(self, rows_scanned, cells_split):
+        """Called by the engines after every row; cheap unless a report is due"""
+        self.rows_scanned = rows_scanned
+        self.cells_split = cells_split
+        if rows_scanned >= self._next_check:
+            self._next_check = rows_scanned + PROGRESS_CHECK_ROWS
+            if time.monotonic() - self._last_report >= self.interval:
+                self._report()
+
+    def _report(self):
+        if self.callback is not None:
+            self._last_report = time.monotonic()
+            self.callback(self.to_dict())
+
+    def to_dict(self):
+        percent = None
+        if self.total_rows:
+            percent = round(min(self.rows_scanned / self.total_rows, 1.0) * 100, 1)
+        return {
+            'phase': self.phase,
+            'rows_scanned': self.rows_scanned,
+            'total_rows': self.total_rows,
+            'cells_split': self.cells_split,
+            'percent': percent
+        }
+
+ESTIMATE_SAMPLE_ROWS = 20000  # Rows read by a sampled dry run
+
+class SplitEstimate:
+    """
+    What a run would produce, filled by a dry run (split.main with an estimate).
+
+    With sample_rows only the first rows are read and the counts are projected
+    to the rows recorded in the sheet dimensions (the lines of a text file).
+    The overflow columns are those seen in the rows read, so a sample can miss
+    a longer value further down.
+    """
+
+    def __init__(self, sample_rows=None):
+        self.sample_rows = sample_rows  # None reads the whole column
+        self.reset()
+
+    def reset(self):
+        self.rows_read = 0
+        self.total_rows = None
+        self.sampled = False  # Stopped after sample_rows, before the end of the sheet
+        self.parts_histogram = Counter()  # Parts per non-empty cell -> number of cells
+        self.cells_split = 0
+        self.overflow_cells = 0
+        self.longest_chain = 0
+
+    def add(self, value, parts):
+        if value is None:
+            return
+        self.parts_histogram[len(parts)] += 1
+        if len(parts) > 1:
+            self.cells_split += 1
+            self.overflow_cells += len(parts) - 1
+        if len(parts) > self.longest_chain:
+            self.longest_chain = len(parts)
+
+    @property
+    def scale(self):
+        """Factor from the rows read to the whole sheet (1 when the sheet was read to the end)"""
+        if not self.sampled or not self.total_rows or not self.rows_read:
+            return 1.0
+        return max(self.total_rows / self.rows_read, 1.0)
+
+    def to_dict(self):
+        scale = self.scale
+        return {
+            'rows_read': self.rows_read,
+            'sampled': self.sampled,
+            'total_rows': self.total_rows if self.sampled and self.total_rows else self.rows_read,
+            'overflow_columns': max(self.longest_chain - 1, 0),
+            'longest_chain': self.longest_chain,
+            'parts_histogram': {str(parts): cells for parts, cells in sorted(self.parts_histogram.items())},
+            'cells_split': round(self.cells_split * scale),
+            'overflow_cells': round(self.overflow_cells * scale)
+        }
+
+def has_value(value):
+    """Check if a cell value counts as data (None and blank strings do not)"""
+    if value is None:
+        return False
+    if isinstance(value, str):
+        return bool(value.strip())
+    return bool(str(value).strip())
+
+def skip_trailing_empty_rows(rows):
+    """
+    Yield the rows of a row iterator, holding rows without any cell (empty
+    tuples or lists) back until a row with cells follows. The empty rows that
+    end a sheet are left out, like the in-memory engine never sees them.
+    """
+    empty_rows = 0
+    try:
+        for row in rows:
+            if not row:
+                empty_row = row
+                empty_rows += 1
+                continue
+            for _ in range(empty_rows):
+                yield empty_row
+            empty_rows = 0
+            yield row
+    finally:
+        rows.close()
+
+class ColumnScan:
+    """
+    Result of a single row-ordered pass over a sheet.
+
+    Rows are fed one at a time (as tuples of values), so the same scan works for
+    in-memory sheets, read-only row iterators and the streaming engine. The scan
+    stops being fed on the first cell with data outside the target column.
+    """
+
+    def __init__(self, column, col_idx, min_col=1, min_row=1):
+        self.column = column
+        self.col_idx = col_idx
+        self.min_col = min_col
+        self.min_row = min_row
+        self.rows_scanned = 0
+        self.target_has_data = False
+        self.target_cells = 0
+        self.columns_with_data = set()
+        self.first_offending_column = None
+        self.first_offending_row = None
+        self.error_message = None
+
+    def feed(self, row):
+        """Scan one row of values. Returns False as soon as the data is known to be invalid."""
+        self.rows_scanned += 1
+        for idx, value in enumerate(row, start=self.min_col):
+            if not has_value(value):
+                continue
+            self.columns_with_data.add(idx)
+            if idx == self.col_idx:
+                self.target_has_data = True
+                self.target_cells += 1
+            else:
+                self.first_offending_column = get_column_letter(idx)
+                self.first_offending_row = self.min_row + self.rows_scanned - 1
+                return self.fail(f"Data exists in multiple columns. Found data in columns: {self.first_offending_column}. Data must exist ONLY in column '{self.column}'.")
+        return True
+
+    def finish(self):
+        """Complete the scan once all rows were fed. Returns True if the column data is valid."""
+        if self.error_message:
+            return False
+        if not self.target_has_data:
+            return self.fail(f"No data found in column '{self.column}'. The column exists but is empty.")
+        return True
+
+    def fail(self, error_message):
+        self.error_message = error_message
+        return False
+
+    @property
+    def is_valid(self):
+        return self.error_message is None and self.target_has_data
+
+    def data_column_letters(self):
+        return [get_column_letter(idx) for idx in sorted(self.columns_with_data)]
+
+    def to_dict(self):
+        return {
+            'column': self.column,
+            'is_valid': self.is_valid,
+            'error': self.error_message,
+            'rows_scanned': self.rows_scanned,
+            'target_has_data': self.target_has_data,
+            'target_cells': self.target_cells,
+            'columns_with_data': self.data_column_letters(),
+            'first_offending_column': self.first_offending_column,
+            'first_offending_row': self.first_offending_row,
+        }
+
+def scan_column_data(sheet, column):
     """
     Validate that:
     1. Column exists in the sheet
     2. Data exists ONLY in the specified column
     3. Data exists in the specified column
-    
-    Returns: (is_valid, error_message)
+
+    All three checks are done in one row-ordered pass that stops at the first
+    violation. Returns: ColumnScan
     """
     # Get the column index
     try:
         col_idx = column_index_from_string(column)
     except ValueError:
-        return False, f"Invalid column name: '{column}'"
-    
+        scan = ColumnScan(column, None)
+        scan.fail(f"Invalid column name: '{column}'")
+        return scan
+
     # Check if sheet has any data
     if not sheet.dimensions:
-        return False, "The sheet is empty (no data found)."
-    
-    # Get all columns that have data
+        scan = ColumnScan(column, col_idx)
+        scan.fail("The sheet is empty (no data found).")
+        return scan
+
     min_col = sheet.min_column
     max_col = sheet.max_column
     min_row = sheet.min_row
     max_row = sheet.max_row
-    
+    scan = ColumnScan(column, col_idx, min_col=min_col, min_row=min_row)
+
     # Check if specified column is within the data range
     if col_idx < min_col or col_idx > max_col:
-        return False, f"Column '{column}' does not exist in the sheet. Available columns: {get_column_letter(min_col)} to {get_column_letter(max_col)}"
-    
-    # Check if there's any data in the specified column
-    column_has_data = False
-    for row in range(min_row, max_row + 1):
-        cell = sheet.cell(row=row, column=col_idx)
-        if cell.value is not None and str(cell.value).strip():
-            column_has_data = True
-            break
-    
-    if not column_has_data:
-        return False, f"No data found in column '{column}'. The column exists but is empty."
-    
-    # Check if data exists in other columns (only check columns with data)
-    other_columns_with_data = []
-    for col in range(min_col, max_col + 1):
-        if col == col_idx:
-            continue  # Skip the specified column
-        
-        # Check if this column has any non-empty data
-        for row in range(min_row, max_row + 1):
-            cell = sheet.cell(row=row, column=col)
-            if cell.value is not None and str(cell.value).strip():
-                col_letter = get_column_letter(col)
-                other_columns_with_data.append(col_letter)
-                break  # Found data in this column, move to next column
-    
-    if other_columns_with_data:
-        return False, f"Data exists in multiple columns. Found data in columns: {', '.join(other_columns_with_data)}. Data must exist ONLY in column '{column}'."
-    
-    return True, None
-
-def main(file_name, column, max_chars):
+        scan.fail(f"Column '{column}' does not exist in the sheet. Available columns: {get_column_letter(min_col)} to {get_column_letter(max_col)}")
+        return scan
+
+    for row in sheet.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col, values_only=True):
+        if not scan.feed(row):
+            return scan
+
+    scan.finish()
+    return scan
+
+def validate_column_data(sheet, column):
+    """
+    Validate the column data of a sheet, see scan_column_data.
+
+    Returns: (is_valid, error_message)
+    """
+    scan = scan_column_data(sheet, column)
+    return scan.is_valid, scan.error_message
+
+def is_text_file(file_name):
+    """Check if a file is a CSV/TSV/TXT input (by extension)"""
+    return os.path.splitext(file_name)[1].lower() in TEXT_FORMATS
+
+def _detect_encoding(file_name):
+    # Decoding is far cheaper than parsing, so the whole file is checked: an
+    # invalid byte near the end must not fail the job after everything else was done
+    for encoding in TEXT_ENCODINGS[:-1]:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(file_name, 'rb') as f:
+                while True:
+                    chunk = f.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    decoder.decode(chunk)
+            decoder.decode(b'', final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return TEXT_ENCODINGS[-1]
+
+def _detect_delimiter(sample, truncated):
+    """The candidate delimiter that splits every sample row into the same number (> 1) of columns"""
+    best, best_width = ',', 1
+    for delimiter in CSV_DELIMITERS:
+        rows = [row for row in csv.reader(io.StringIO(sample, newline=''), delimiter=delimiter) if row]
+        if truncated:
+            # The last row may be cut off by the sample size
+            rows = rows[:-1]
+        widths = {len(row) for row in rows}
+        if len(widths) == 1:
+            width = widths.pop()
+            if width > best_width:
+                best, best_width = delimiter, width
+    return best
+
+def detect_text_format(file_name):
+    """
+    Find the encoding and delimiter of a text input.
+
+    Returns: (encoding, delimiter) - the delimiter is None for .txt (one value per line)
+    """
+    encoding = _detect_encoding(file_name)
+    delimiter = TEXT_FORMATS[os.path.splitext(file_name)[1].lower()]
+    if delimiter == ',':
+        with open(file_name, 'rb') as f:
+            raw = f.read(TEXT_SAMPLE_SIZE + 1)
+        truncated = len(raw) > TEXT_SAMPLE_SIZE
+        sample = codecs.getincrementaldecoder(encoding)(errors='replace').decode(raw[:TEXT_SAMPLE_SIZE])
+        delimiter = _detect_delimiter(sample, truncated)
+    return encoding, delimiter
+
+def iter_text_rows(file_name, text_format=None):
+    """Yield the rows of a text input as lists of strings (like values_only rows of a sheet)"""
+    encoding, delimiter = text_format or detect_text_format(file_name)
+    with open(file_name, 'r', encoding=encoding, errors='replace', newline='') as f:
+        if delimiter is None:
+            for line in f:
+                line = line.rstrip('\r\n')
+                # A blank line has no cell, like the csv module reads it
+                yield [line] if line else []
+        else:
+            yield from csv.reader(f, delimiter=delimiter)
+
+OUTPUT_MARKER = '_ProjectTextReady'
+OUTPUT_SUFFIX = f'{OUTPUT_MARKER}.xlsx'
+
+def get_output_filename(file_name, output_dir=None, output_format=OUTPUT_XLSX):
+    """Build the output path for a processed file (next to it, or in output_dir)"""
+    extension = '.xlsx'
+    if output_format == OUTPUT_CSV:
+        # CSV outputs keep the delimiter of the input, so TSV stays TSV
+        extension = '.tsv' if os.path.splitext(file_name)[1].lower() == '.tsv' else '.csv'
+    if output_dir:
+        return os.path.join(output_dir, f"{os.path.basename(file_name).split('.')[0]}{OUTPUT_MARKER}{extension}")
+    return f"{file_name.split('.')[0]}{OUTPUT_MARKER}{extension}"
+
+def choose_engine(file_name):
+    """Engine used for ENGINE_AUTO: the raw XML engine for files large enough to benefit from it"""
+    try:
+        size = os.path.getsize(file_name)
+    except OSError:
+        # The streaming engine reports the error
+        return ENGINE_STREAMING
+    return ENGINE_RAW_XML if size >= RAW_XML_MIN_SIZE else ENGINE_STREAMING
+
+def _file_size(file_name):
+    try:
+        return os.path.getsize(file_name)
+    except OSError:
+        return None
+
+def main(file_name, column, max_chars, engine=DEFAULT_ENGINE, cache=None, report=None, output_dir=None,
+         output_format=OUTPUT_XLSX, preview=None, progress=None, estimate=None):
+    """
+    Split cells in the given column that exceed max_chars.
+
+    Pass a SplitCache to read its hit/miss counters after the job, a
+    SplitReport to read the phase timings and split counters, an
+    OutputPreview to get the first rows of the output and a SplitProgress to
+    follow the run; fresh ones are used otherwise. The output is written next
+    to the input unless an output_dir is given. CSV/TSV/TXT inputs are
+    processed by the text engine whatever the engine argument, and only they
+    can have CSV output.
+
+    With a SplitEstimate, main does a dry run instead (see dry_run): nothing
+    is written and output_filename is None.
+
+    Returns: (success, message, output_filename)
+    """
+    if cache is None:
+        cache = SplitCache()
+    if report is None:
+        report = SplitReport()
+    if preview is None:
+        preview = OutputPreview()
+    if progress is None:
+        progress = SplitProgress()
+    if output_format not in OUTPUT_FORMATS:
+        return False, f"Unknown output format: '{output_format}'. Available formats: {', '.join(OUTPUT_FORMATS)}", None
+    if output_format != OUTPUT_XLSX and not is_text_file(file_name):
+        return False, "CSV output is only available for CSV, TSV and TXT files.", None
+    if engine == ENGINE_AUTO:
+        engine = ENGINE_TEXT if is_text_file(file_name) else choose_engine(file_name)
+    if estimate is not None:
+        report.engine = ENGINE_TEXT if is_text_file(file_name) else engine
+        report.output_format = output_format
+        report.input_bytes = _file_size(file_name)
+        return dry_run(file_name, column, max_chars, cache, report, estimate, progress)
+
+    result = _run_engine(file_name, column, max_chars, engine, cache, report, output_dir, output_format, preview, progress)
+    # Sizes go in the report last: falling back to another engine resets it
+    report.output_format = output_format
+    report.input_bytes = _file_size(file_name)
+    if result[0]:
+        report.output_bytes = _file_size(result[2])
+    return result
+
+def _run_engine(file_name, column, max_chars, engine, cache, report, output_dir, output_format, preview, progress):
+    output_filename = get_output_filename(file_name, output_dir, output_format)
+    if is_text_file(file_name):
+        report.engine = ENGINE_TEXT
+        return process_text(file_name, column, max_chars, cache, report, output_filename, preview, progress, output_format)
+    report.engine = engine
+    if engine == ENGINE_RAW_XML:
+        # Imported here: xlsx_raw builds on this module
+        import xlsx_raw
+        try:
+            return xlsx_raw.process_raw_xml(file_name, column, max_chars, cache, report, output_filename, preview, progress)
+        except Exception as e:
+            # Anything the raw engine does not handle (or fails on) goes through openpyxl,
+            # which also reports the errors of invalid files
+            reason = str(e) or type(e).__name__
+            report.reset()
+            preview.reset()
+            progress.reset()
+            report.engine = engine = ENGINE_STREAMING
+            report.fallback = reason
+    if engine == ENGINE_STREAMING:
+        return process_streaming(file_name, column, max_chars, cache, report, output_filename, preview, progress)
+    if engine == ENGINE_IN_MEMORY:
+        return process_in_memory(file_name, column, max_chars, cache, report, output_filename, preview, progress)
+    return False, f"Unknown engine: '{engine}'. Available engines: {', '.join(ENGINES + (ENGINE_AUTO,))}", None
+
+def process_streaming(file_name, column, max_chars, cache, report, output_filename, preview, progress):
+    """
+    Streaming engine: rows are read with a read-only iterator and written
+    straight into a write-only workbook, so memory stays flat regardless of
+    the number of rows. Validation happens in the same pass.
+    """
+    try:
+        col_idx = column_index_from_string(column)
+    except ValueError:
+        return False, f"Invalid column name: '{column}'", None
+
+    try:
+        progress.start(PHASE_LOAD)
+        started = time.perf_counter()
+        wb = openpyxl.load_workbook(file_name, read_only=True)
+        report.add_time(PHASE_LOAD, time.perf_counter() - started)
+        try:
+            started = time.perf_counter()
+            # Validate that only ONE sheet exists
+            sheet_count = len(wb.sheetnames)
+            if sheet_count != 1:
+                return False, f"The Excel file must contain exactly ONE sheet. Found {sheet_count} sheet(s): {', '.join(wb.sheetnames)}", None
+
+            sheet = wb.active
+
+            # Check the column against the declared sheet dimensions (not every writer records them)
+            max_col = sheet.max_column
+            if max_col:
+                min_col = sheet.min_column or 1
+                if col_idx < min_col or col_idx > max_col:
+                    return False, f"Column '{column}' does not exist in the sheet. Available columns: {get_column_letter(min_col)} to {get_column_letter(max_col)}", None
+            max_row = sheet.max_row
+            # Rows are read unpadded from here on, so a row without any cell is an empty tuple
+            sheet.reset_dimensions()
+            report.add_time(PHASE_VALIDATE, time.perf_counter() - started)
+
+            out_wb = openpyxl.Workbook(write_only=True)
+            out_sheet = out_wb.create_sheet(title=sheet.title)
+            padding = [None] * (col_idx - 1)
+
+            # Every phase runs once per row: accumulate locally, the report gets the totals
+            load_time = validate_time = format_time = split_time = save_time = 0.0
+            scan = ColumnScan(column, col_idx)
+            progress.start(PHASE_SPLIT, total_rows=max_row)
+            try:
+                last = time.perf_counter()
+                for row in skip_trailing_empty_rows(sheet.iter_rows(max_row=max_row, values_only=True)):
+                    # Cells beyond the declared dimensions are not read
+                    if max_col and len(row) > max_col:
+                        row = row[:max_col]
+                    now = time.perf_counter()
+                    load_time += now - last
+                    last = now
+
+                    # Data must exist ONLY in the specified column
+                    if not scan.feed(row):
+                        _discard_output(out_wb, output_filename)
+                        return False, scan.error_message, None
+                    now = time.perf_counter()
+                    validate_time += now - last
+                    last = now
+
+                    value = row[col_idx - 1] if len(row) >= col_idx else None
+
+                    # Split the value into the original cell plus overflow cells to the right
+                    parts = cache.split(value, max_chars)
+                    report.count_parts(parts)
+                    now = time.perf_counter()
+                    split_time += now - last
+                    last = now
+
+                    # Only the processed column is formatted as text, overflow cells keep the default format
+                    cell = WriteOnlyCell(out_sheet, value=parts[0])
+                    cell.number_format = numbers.FORMAT_TEXT
+                    now = time.perf_counter()
+                    format_time += now - last
+                    last = now
+
+                    # The write-only workbook streams appended rows to the output
+                    out_sheet.append(padding + [cell] + parts[1:])
+                    preview.add(padding, parts)
+                    progress.rows(scan.rows_scanned, report.cells_split)
+                    now = time.perf_counter()
+                    save_time += now - last
+                    last = now
+            finally:
+                report.rows_scanned = scan.rows_scanned
+                report.add_time(PHASE_LOAD, load_time)
+                report.add_time(PHASE_VALIDATE, validate_time)
+                report.add_time(PHASE_SPLIT, split_time)
+                report.add_time(PHASE_FORMAT, format_time)
+                report.add_time(PHASE_SAVE, save_time)
+
+            if not scan.finish():
+                _discard_output(out_wb, output_filename)
+                return False, scan.error_message, None
+
+            progress.start(PHASE_SAVE)
+            started = time.perf_counter()
+            out_wb.save(output_filename)
+            report.add_time(PHASE_SAVE, time.perf_counter() - started)
+            preview.finish(sheet.title, scan.rows_scanned, col_idx - 1 + report.longest_chain, report.longest_chain)
+            return True, "File successfully processed.", output_filename
+        finally:
+            wb.close()
+
+    except Exception as e:
+        return False, str(e), None
+
+def process_text(file_name, column, max_chars, cache, report, output_filename, preview, progress, output_format=OUTPUT_XLSX):
+    """
+    Text engine for CSV/TSV/TXT inputs: rows are read with the csv module and
+    written straight to the output (a write-only workbook, or CSV), validating
+    in the same pass like the streaming engine. Every value is a string.
+    """
+    try:
+        col_idx = column_index_from_string(column)
+    except ValueError:
+        return False, f"Invalid column name: '{column}'", None
+
+    discard = None
+    try:
+        progress.start(PHASE_LOAD)
+        started = time.perf_counter()
+        encoding, delimiter = detect_text_format(file_name)
+        report.add_time(PHASE_LOAD, time.perf_counter() - started)
+
+        if output_format == OUTPUT_CSV:
+            out_file = open(output_filename, 'w', encoding=TEXT_OUTPUT_ENCODING, newline='')
+            writer = csv.writer(out_file, delimiter=delimiter or ',')
+            out_wb = out_sheet = None
+            padding = [''] * (col_idx - 1)
+            sheet_name = os.path.basename(output_filename)
+        else:
+            out_file = writer = None
+            out_wb = openpyxl.Workbook(write_only=True)
+            title = re.sub(r'[\[\]:*?/\\]', '', os.path.splitext(os.path.basename(file_name))[0])[:31]
+            out_sheet = out_wb.create_sheet(title=title or 'Sheet1')
+            sheet_name = out_sheet.title
+            padding = [None] * (col_idx - 1)
+
+        def discard():
+            if out_file is not None:
+                out_file.close()
+                try:
+                    os.remove(output_filename)
+                except OSError:
+                    pass
+            else:
+                _discard_output(out_wb, output_filename)
+
+        # Every phase runs once per row: accumulate locally, the report gets the totals
+        load_time = validate_time = format_time = split_time = save_time = 0.0
+        scan = ColumnScan(column, col_idx)
+        widest = 0
+        widest_output = 0
+        rows = skip_trailing_empty_rows(iter_text_rows(file_name, (encoding, delimiter)))
+        progress.start(PHASE_SPLIT)
+        try:
+            last = time.perf_counter()
+            for row in rows:
+                now = time.perf_counter()
+                load_time += now - last
+                last = now
+
+                # Data must exist ONLY in the specified column
+                if len(row) > widest:
+                    widest = len(row)
+                if not scan.feed(row):
+                    discard()
+                    # A column beyond the data is reported first, the remaining rows tell how wide it is
+                    for row in rows:
+                        widest = max(widest, len(row))
+                    return False, text_column_error(column, col_idx, widest) or scan.error_message, None
+                now = time.perf_counter()
+                validate_time += now - last
+                last = now
+
+                value = row[col_idx - 1] if len(row) >= col_idx else None
+
+                parts = cache.split(value, max_chars)
+                report.count_parts(parts)
+                now = time.perf_counter()
+                split_time += now - last
+                last = now
+
+                if writer is not None:
+                    if value is not None:
+                        writer.writerow(padding + parts)
+                        preview.add(padding, parts)
+                        widest_output = max(widest_output, col_idx - 1 + len(parts))
+                    else:
+                        writer.writerow(row)
+                        preview.add(row, [])
+                        widest_output = max(widest_output, len(row))
+                else:
+                    # Only the processed column is formatted as text, like the streaming engine
+                    cell = WriteOnlyCell(out_sheet, value=parts[0])
+                    cell.number_format = numbers.FORMAT_TEXT
+                    now = time.perf_counter()
+                    format_time += now - last
+                    last = now
+                    out_sheet.append(padding + [cell] + parts[1:])
+                    preview.add(padding, parts)
+                    widest_output = max(widest_output, col_idx - 1 + len(parts))
+                progress.rows(scan.rows_scanned, report.cells_split)
+                now = time.perf_counter()
+                save_time += now - last
+                last = now
+        finally:
+            rows.close()
+            report.rows_scanned = scan.rows_scanned
+            report.add_time(PHASE_LOAD, load_time)
+            report.add_time(PHASE_VALIDATE, validate_time)
+            report.add_time(PHASE_SPLIT, split_time)
+            report.add_time(PHASE_FORMAT, format_time)
+            report.add_time(PHASE_SAVE, save_time)
+
+        if not scan.finish():
+            discard()
+            return False, text_column_error(column, col_idx, widest) or scan.error_message, None
+
+        progress.start(PHASE_SAVE)
+        started = time.perf_counter()
+        if out_file is not None:
+            out_file.close()
+        else:
+            out_wb.save(output_filename)
+        report.add_time(PHASE_SAVE, time.perf_counter() - started)
+        preview.finish(sheet_name, scan.rows_scanned, widest_output, report.longest_chain)
+        return True, "File successfully processed.", output_filename
+
+    except Exception as e:
+        if discard is not None:
+            discard()
+        return False, str(e), None
+
+def text_column_error(column, col_idx, widest):
+    """Error of a text input whose widest row has widest columns, None if the column is within them"""
+    if not widest:
+        return "The file is empty (no data found)."
+    if col_idx > widest:
+        return f"Column '{column}' does not exist in the file. Available columns: A to {get_column_letter(widest)}"
+    return None
+
+def _discard_output(out_wb, output_filename):
+    """Flush a write-only workbook that failed validation and remove it, so no temp files are left behind"""
+    try:
+        out_wb.save(output_filename)
+        os.remove(output_filename)
+    except Exception:
+        pass
+
+def process_in_memory(file_name, column, max_chars, cache, report, output_filename, preview, progress):
+    """In-memory engine: loads the full workbook and edits the cells in place"""
     try:
         # Open the Excel file and select the active sheet
+        progress.start(PHASE_LOAD)
+        started = time.perf_counter()
         wb = openpyxl.load_workbook(file_name)
+        report.add_time(PHASE_LOAD, time.perf_counter() - started)
         
+        started = time.perf_counter()
         # Validate that only ONE sheet exists
         sheet_count = len(wb.sheetnames)
         if sheet_count != 1:
@@ -76,55 +943,298 @@ def main(file_name, column, max_chars):
         sheet = wb.active
 
         # Validate column data
-        is_valid, error_message = validate_column_data(sheet, column)
-        if not is_valid:
-            return False, error_message, None
+        progress.start(PHASE_VALIDATE, total_rows=sheet.max_row)
+        scan = scan_column_data(sheet, column)
+        report.rows_scanned = scan.rows_scanned
+        report.add_time(PHASE_VALIDATE, time.perf_counter() - started)
+        if not scan.is_valid:
+            return False, scan.error_message, None
 
         # Select the specified column and set the number format to "text"
+        started = time.perf_counter()
         column_cells = sheet[column]
         for cell in column_cells:
             cell.number_format = numbers.FORMAT_TEXT
+        report.add_time(PHASE_FORMAT, time.perf_counter() - started)
 
         # Iterate through each cell in the column
+        progress.start(PHASE_SPLIT)
+        started = time.perf_counter()
         for cell in column_cells:
-            # Check if the cell contains a string value and its length is > max_chars
-            while isinstance(cell.value, str) and len(cell.value.strip()) > max_chars:
-                # Split the cell value on the last space character that occurs before the max_chars-th character
-                split_index = cell.value.rfind(' ', 0, max_chars)
-                if split_index != -1:
-                    # Get the column letter of the new column
-                    new_column = get_column_letter(cell.column + 1)
-                    # Insert a new column to the right of the current column
-                    #sheet.insert_cols(cell.column + 1, amount=1, idx=cell.column + 1)
-                    # Move the remaining text to the new column
-                    sheet.cell(row=cell.row, column=cell.column + 1).value = cell.value[split_index+1:].strip()
-                    # Truncate the original cell value to the first part
-                    cell.value = cell.value[:split_index].strip()
-                    # Set the number format of the new column to "text"
-                    #sheet[new_column][cell.row].number_format = numbers.FORMAT_TEXT
-                    # Check if the new cell also needs to be split
-                    cell = sheet.cell(row=cell.row, column=cell.column + 1)
-                else:
-                    # Cannot split the cell any further, move to the next cell
-                    break
-         # Save the modified Excel file
-        output_filename = f"{file_name.split('.')[0]}_ProjectTextReady.xlsx"
+            parts = cache.split(cell.value, max_chars)
+            report.count_parts(parts)
+            progress.rows(cell.row, report.cells_split)
+            if len(parts) == 1:
+                continue
+            # Keep the first part in the original cell and move the rest to the columns on the right
+            cell.value = parts[0]
+            for offset, part in enumerate(parts[1:], start=1):
+                sheet.cell(row=cell.row, column=cell.column + offset).value = part
+        report.add_time(PHASE_SPLIT, time.perf_counter() - started)
+
+        # Save the modified Excel file
+        progress.start(PHASE_SAVE)
+        started = time.perf_counter()
         wb.save(output_filename)
+        report.add_time(PHASE_SAVE, time.perf_counter() - started)
+
+        # The edited sheet is still in memory: its first rows are the preview
+        for row in sheet.iter_rows(min_row=1, max_row=min(sheet.max_row, preview.max_rows), values_only=True):
+            preview.add([], list(row))
+        preview.finish(sheet.title, sheet.max_row, sheet.max_column, report.longest_chain)
         return True, "File successfully processed.", output_filename
 
     except Exception as e:
         return False, str(e), None
 
+def _count_lines(file_name):
+    """Number of lines of a text file, read in binary (a quoted value spanning lines counts more than once)"""
+    lines = 0
+    last = b'\n'
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    return lines + (last != b'\n')
 
-if __name__ == '__main__':
-    # Create argument parser
-    parser = argparse.ArgumentParser(description='Split cells in a given column if they exceed a maximum length.')
-    parser.add_argument('file_name', type=str, help='the name of the Excel file to be processed')
+def dry_run(file_name, column, max_chars, cache, report, estimate, progress):
+    """
+    Dry run: the rows go through the same checks and splitting as a real run
+    (a read-only workbook, or the csv module for text files) and are counted
+    in the estimate; no output is written. A sampled run does not see the rows
+    after the sample, so it cannot report the errors they would cause.
+
+    Returns: (success, message, None)
+    """
+    try:
+        col_idx = column_index_from_string(column)
+    except ValueError:
+        return False, f"Invalid column name: '{column}'", None
+
+    estimate.reset()
+    wb = None
+    try:
+        progress.start(PHASE_LOAD)
+        started = time.perf_counter()
+        if is_text_file(file_name):
+            rows = skip_trailing_empty_rows(iter_text_rows(file_name))
+            total_rows = None
+        else:
+            wb = openpyxl.load_workbook(file_name, read_only=True)
+            sheet_count = len(wb.sheetnames)
+            if sheet_count != 1:
+                return False, f"The Excel file must contain exactly ONE sheet. Found {sheet_count} sheet(s): {', '.join(wb.sheetnames)}", None
+            sheet = wb.active
+            max_col = sheet.max_column
+            if max_col:
+                min_col = sheet.min_column or 1
+                if col_idx < min_col or col_idx > max_col:
+                    return False, f"Column '{column}' does not exist in the sheet. Available columns: {get_column_letter(min_col)} to {get_column_letter(max_col)}", None
+            # Read like the streaming engine: unpadded rows, without the empty rows ending the sheet
+            total_rows = sheet.max_row
+            sheet.reset_dimensions()
+            rows = skip_trailing_empty_rows(sheet.iter_rows(max_row=total_rows, values_only=True))
+        report.add_time(PHASE_LOAD, time.perf_counter() - started)
+
+        progress.start(PHASE_SPLIT, total_rows=total_rows)
+        started = time.perf_counter()
+        scan = ColumnScan(column, col_idx)
+        widest = 0
+        try:
+            for row in rows:
+                if wb is not None and max_col and len(row) > max_col:
+                    row = row[:max_col]
+                if len(row) > widest:
+                    widest = len(row)
+                if not scan.feed(row):
+                    if wb is None:
+                        # Like the text engine: a column beyond the data is reported first
+                        for row in rows:
+                            widest = max(widest, len(row))
+                        return False, text_column_error(column, col_idx, widest) or scan.error_message, None
+                    return False, scan.error_message, None
+                value = row[col_idx - 1] if len(row) >= col_idx else None
+                parts = cache.split(value, max_chars)
+                report.count_parts(parts)
+                estimate.add(value, parts)
+                progress.rows(scan.rows_scanned, report.cells_split)
+                if estimate.sample_rows and scan.rows_scanned >= estimate.sample_rows:
+                    estimate.sampled = True
+                    break
+        finally:
+            rows.close()
+            report.rows_scanned = estimate.rows_read = scan.rows_scanned
+            report.add_time(PHASE_SPLIT, time.perf_counter() - started)
+
+        if estimate.sampled:
+            estimate.total_rows = total_rows if wb is not None else _count_lines(file_name)
+        elif not scan.finish():
+            if wb is None:
+                return False, text_column_error(column, col_idx, widest) or scan.error_message, None
+            return False, scan.error_message, None
+        return True, "Dry run completed, no output was written.", None
+
+    except Exception as e:
+        return False, str(e), None
+    finally:
+        if wb is not None:
+            wb.close()
+
+
+def find_input_files(paths, recursive=False):
+    """
+    Expand files, glob patterns and directories into a sorted list of input files
+    (.xlsx, .csv, .tsv, .txt).
+
+    Outputs of earlier runs (*_ProjectTextReady.*) found in directories or
+    globs are skipped. Returns: (files, unmatched paths)
+    """
+    files = []
+    unmatched = []
+    extensions = ('.xlsx',) + tuple(TEXT_FORMATS)
+    for path in paths:
+        if os.path.isdir(path):
+            pattern = os.path.join(path, '**', '*') if recursive else os.path.join(path, '*')
+            matches = [m for m in glob.glob(pattern, recursive=recursive) if os.path.splitext(m)[1].lower() in extensions]
+        elif glob.has_magic(path):
+            matches = glob.glob(path, recursive=recursive)
+        else:
+            # Explicitly named files are taken as they are
+            if os.path.isfile(path):
+                files.append(path)
+            else:
+                unmatched.append(path)
+            continue
+        matches = [m for m in matches if os.path.isfile(m) and not os.path.splitext(m)[0].endswith(OUTPUT_MARKER)]
+        if not matches:
+            unmatched.append(path)
+        files.extend(sorted(matches))
+
+    # The same file named twice (e.g. directly and through a glob) is processed once
+    unique = []
+    seen = set()
+    for path in files:
+        key = os.path.realpath(path)
+        if key not in seen:
+            seen.add(key)
+            unique.append(path)
+    return unique, unmatched
+
+def process_file(file_name, column, max_chars, engine=DEFAULT_ENGINE, output_dir=None, output_format=OUTPUT_XLSX):
+    """Process one file for the command line or a batch (runs in a worker process). Returns a result dict."""
+    report = SplitReport()
+    started = time.perf_counter()
+    try:
+        success, message, output_filename = main(file_name, column, max_chars, engine=engine, report=report,
+                                                 output_dir=output_dir, output_format=output_format)
+    except Exception as e:
+        success, message, output_filename = False, str(e), None
+    return {
+        'file': file_name,
+        'success': success,
+        'message': message,
+        'output': output_filename,
+        'time': time.perf_counter() - started,
+        'report': report.to_dict()
+    }
+
+def format_summary(results):
+    """Summary table of command line results, in input order"""
+    header = f"{'STATUS':<7} {'ROWS':>8} {'SPLIT':>8} {'TIME':>8}  FILE"
+    lines = [header, '-' * len(header)]
+    for result in results:
+        status = 'ok' if result['success'] else 'FAILED'
+        report = result['report'] or {}
+        detail = f" -> {result['output']}" if result['success'] else f" ({result['message']})"
+        lines.append(f"{status:<7} {report.get('rows_scanned', 0):>8} {report.get('cells_split', 0):>8} "
+                     f"{result['time']:>7.2f}s  {result['file']}{detail}")
+    failed = sum(1 for result in results if not result['success'])
+    lines.append('-' * len(header))
+    lines.append(f"{len(results)} file(s): {len(results) - failed} processed, {failed} failed, "
+                 f"{sum(result['time'] for result in results):.2f}s total processing time")
+    return '\n'.join(lines)
+
+def cli(argv=None):
+    """
+    Command line entry point.
+
+    Returns the exit code: 0 if every file was processed, 1 if any failed,
+    2 if no input files were found.
+    """
+    parser = argparse.ArgumentParser(
+        description='Split cells in a given column if they exceed a maximum length.',
+        epilog='Example: python split.py catalogue/*.xlsx A 40 -j 4 -o processed/'
+    )
+    parser.add_argument('inputs', nargs='+', help='Excel/CSV/TSV/TXT files, glob patterns or directories to be processed')
     parser.add_argument('column', type=str, help='the column to be processed')
     parser.add_argument('max_chars', type=int, help='the maximum number of characters allowed in a cell')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='number of files processed in parallel (default: number of CPUs)')
+    parser.add_argument('-o', '--output-dir', type=str, help='write the outputs to this directory instead of next to the inputs')
+    parser.add_argument('-r', '--recursive', action='store_true', help='search directories (and ** globs) recursively')
+    parser.add_argument('--engine', choices=ENGINES + (ENGINE_AUTO,), default=DEFAULT_ENGINE,
+                        help='processing engine for Excel files (default: auto, picked by file size)')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default=OUTPUT_XLSX,
+                        help='output format (csv only for CSV/TSV/TXT inputs)')
 
     # Parse command line arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    column = args.column.upper()
+
+    files, unmatched = find_input_files(args.inputs, args.recursive)
+    for path in unmatched:
+        print(f"warning: no input files found for '{path}'", file=sys.stderr)
+    if not files:
+        print('error: no input files', file=sys.stderr)
+        return 2
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    # Inputs that would write the same output file are not processed twice
+    results = {}
+    to_process = []
+    outputs = {}
+    for path in files:
+        output = os.path.realpath(get_output_filename(path, args.output_dir, args.output_format))
+        if output in outputs:
+            results[path] = {'file': path, 'success': False, 'output': None, 'time': 0.0, 'report': None,
+                             'message': f"Same output file as {outputs[output]}"}
+        else:
+            outputs[output] = path
+            to_process.append(path)
 
-    # Call main function with command line arguments
-    main(args.file_name, args.column, args.max_chars)
\ No newline at end of file
+    workers = max(1, min(args.jobs, len(to_process)))
+    print(f"Processing {len(to_process)} file(s) with {workers} worker(s)...", file=sys.stderr)
+
+    def progress(result):
+        done = len(results)
+        status = 'ok' if result['success'] else 'FAILED'
+        print(f"[{done}/{len(files)}] {status:<6} {result['file']} ({result['time']:.2f}s)", file=sys.stderr)
+
+    if workers == 1:
+        for path in to_process:
+            result = results[path] = process_file(path, column, args.max_chars, args.engine, args.output_dir, args.output_format)
+            progress(result)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(process_file, path, column, args.max_chars, args.engine, args.output_dir, args.output_format): path
+                for path in to_process
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process itself failed (e.g. killed)
+                    result = {'file': path, 'success': False, 'message': str(e), 'output': None, 'time': 0.0, 'report': None}
+                results[path] = result
+                progress(result)
+
+    ordered = [results[path] for path in files]
+    print(format_summary(ordered))
+    return 0 if all(result['success'] for result in ordered) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
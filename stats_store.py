@@ -0,0 +1,377 @@
+"""
+Processing statistics store.
+
+Statistics live in a SQLite database in WAL mode: every job appends one
+history row and bumps the counters in a single short transaction, so
+concurrent gunicorn workers never overwrite each other's updates and the
+cost of a record does not grow with the history size. The legacy
+processing_stats.json file is imported once on first use.
+"""
+import os
+import json
+import sqlite3
+import bisect
+import logging
+import threading
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+HISTORY_LIMIT = 1000  # Number of history records kept
+
+# Rollup granularities and the format of their bucket keys
+ROLLUP_ALL = 'all'
+ROLLUP_DAY = 'day'
+ROLLUP_HOUR = 'hour'
+ROLLUP_BUCKET_FORMATS = {
+    ROLLUP_DAY: '%Y-%m-%d',
+    ROLLUP_HOUR: '%Y-%m-%dT%H',
+}
+
+# Upper bounds (seconds) of the processing time histogram kept in every rollup,
+# percentiles are interpolated inside a bucket. The last bucket is unbounded.
+TIME_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_processed INTEGER NOT NULL DEFAULT 0,
+    total_successful INTEGER NOT NULL DEFAULT 0,
+    total_failed INTEGER NOT NULL DEFAULT 0,
+    total_processing_time REAL NOT NULL DEFAULT 0,
+    updated_at TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    total_cache_hits INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO counters (id) VALUES (1);
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    processing_time REAL,
+    user_email TEXT,
+    report TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    successful INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    total_processing_time REAL NOT NULL DEFAULT 0,
+    time_histogram TEXT NOT NULL,
+    cache_hits INTEGER NOT NULL DEFAULT 0,
+    partial INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (granularity, bucket)
+);
+"""
+
+
+def rollup_buckets(timestamp):
+    """Rollup (granularity, bucket) keys a record with this timestamp counts towards"""
+    return [(ROLLUP_ALL, ROLLUP_ALL)] + [
+        (granularity, timestamp.strftime(bucket_format))
+        for granularity, bucket_format in ROLLUP_BUCKET_FORMATS.items()
+    ]
+
+
+def percentile(histogram, fraction):
+    """Estimate a percentile from a TIME_BUCKETS histogram (linear inside the bucket)"""
+    count = sum(histogram)
+    if not count:
+        return 0.0
+    target = fraction * count
+    cumulative = 0
+    for idx, bucket_count in enumerate(histogram):
+        if bucket_count and cumulative + bucket_count >= target:
+            lower = TIME_BUCKETS[idx - 1] if idx > 0 else 0.0
+            upper = TIME_BUCKETS[idx] if idx < len(TIME_BUCKETS) else TIME_BUCKETS[-1] * 2
+            return lower + (upper - lower) * (target - cumulative) / bucket_count
+        cumulative += bucket_count
+    return float(TIME_BUCKETS[-1])
+
+
+def rollup_to_dict(row):
+    """Public view of a rollup row"""
+    histogram = json.loads(row['time_histogram'])
+    return {
+        'bucket': row['bucket'],
+        'total_processed': row['total'],
+        'total_successful': row['successful'],
+        'total_failed': row['failed'],
+        'success_rate': round(row['successful'] / row['total'] * 100, 2) if row['total'] else 0.0,
+        'average_processing_time': round(row['total_processing_time'] / row['successful'], 2) if row['successful'] else 0.0,
+        'p50_processing_time': round(percentile(histogram, 0.50), 2),
+        'p95_processing_time': round(percentile(histogram, 0.95), 2),
+        'cache_hits': row['cache_hits'],
+        # Built from a history that no longer had every record, counts and percentiles cover part of it
+        'partial': bool(row['partial'])
+    }
+
+
+class StatsStore:
+    """SQLite-backed processing statistics, safe for concurrent processes and threads"""
+
+    def __init__(self, db_path, legacy_json_path=None, history_limit=HISTORY_LIMIT):
+        self.db_path = db_path
+        self.legacy_json_path = legacy_json_path
+        self.history_limit = history_limit
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connection(self):
+        # One connection per thread, and new ones after a fork (connections must not cross processes)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(SCHEMA)
+                    self._upgrade_schema(conn)
+                    self._migrate_legacy_json(conn)
+                    self._backfill_rollups(conn)
+                    self._initialized = True
+        return conn
+
+    def _upgrade_schema(self, conn):
+        """Add columns introduced after the database was created"""
+        for table, column, definition in (('counters', 'version', 'INTEGER NOT NULL DEFAULT 0'),
+                                          ('history', 'report', 'TEXT'),
+                                          ('counters', 'total_cache_hits', 'INTEGER NOT NULL DEFAULT 0'),
+                                          ('rollups', 'cache_hits', 'INTEGER NOT NULL DEFAULT 0'),
+                                          ('rollups', 'partial', 'INTEGER NOT NULL DEFAULT 0')):
+            columns = [row['name'] for row in conn.execute(f'PRAGMA table_info({table})')]
+            if column not in columns:
+                try:
+                    conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+                except sqlite3.OperationalError:
+                    # Added by another process in the meantime
+                    pass
+
+    def _backfill_rollups(self, conn):
+        """
+        Build the rollups once from the history recorded before they existed.
+
+        The history only keeps the last history_limit records (the legacy JSON file too), so when
+        the counters saw more jobs the all-time rollup and the buckets of the oldest record are
+        marked partial instead of passing for the full population.
+        """
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            oldest = None
+            if not conn.execute("SELECT 1 FROM meta WHERE key = 'rollups_backfilled'").fetchone():
+                for row in conn.execute('SELECT timestamp, success, processing_time FROM history ORDER BY id').fetchall():
+                    try:
+                        timestamp = datetime.fromisoformat(row['timestamp'])
+                    except (TypeError, ValueError):
+                        continue
+                    oldest = oldest or timestamp
+                    self._update_rollups(conn, timestamp, bool(row['success']), row['processing_time'])
+                conn.execute("INSERT INTO meta (key, value) VALUES ('rollups_backfilled', ?)", (datetime.now().isoformat(),))
+            # Also once for databases backfilled before partial rollups were marked (only the all-time one is known then)
+            if not conn.execute("SELECT 1 FROM meta WHERE key = 'rollups_partial_checked'").fetchone():
+                all_time = conn.execute(
+                    'SELECT total FROM rollups WHERE granularity = ? AND bucket = ?', (ROLLUP_ALL, ROLLUP_ALL)
+                ).fetchone()
+                total_processed = conn.execute('SELECT total_processed FROM counters WHERE id = 1').fetchone()[0]
+                if total_processed > (all_time['total'] if all_time else 0):
+                    buckets = rollup_buckets(oldest) if oldest else [(ROLLUP_ALL, ROLLUP_ALL)]
+                    for granularity, bucket in buckets:
+                        conn.execute(
+                            """INSERT INTO rollups (granularity, bucket, time_histogram, partial) VALUES (?, ?, ?, 1)
+                            ON CONFLICT (granularity, bucket) DO UPDATE SET partial = 1""",
+                            (granularity, bucket, json.dumps([0] * (len(TIME_BUCKETS) + 1)))
+                        )
+                conn.execute("INSERT INTO meta (key, value) VALUES ('rollups_partial_checked', ?)", (datetime.now().isoformat(),))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _update_rollups(self, conn, timestamp, success, processing_time):
+        """Add one record to the all-time, daily and hourly rollups (inside the caller's transaction)"""
+        for granularity, bucket in rollup_buckets(timestamp):
+            row = conn.execute(
+                'SELECT time_histogram FROM rollups WHERE granularity = ? AND bucket = ?',
+                (granularity, bucket)
+            ).fetchone()
+            histogram = json.loads(row['time_histogram']) if row else [0] * (len(TIME_BUCKETS) + 1)
+            # Like the average, percentiles describe successful jobs
+            if success and processing_time is not None:
+                histogram[bisect.bisect_left(TIME_BUCKETS, processing_time)] += 1
+            conn.execute(
+                """INSERT INTO rollups (granularity, bucket, total, successful, failed, total_processing_time, time_histogram)
+                VALUES (?, ?, 1, ?, ?, ?, ?)
+                ON CONFLICT (granularity, bucket) DO UPDATE SET
+                    total = total + 1,
+                    successful = successful + excluded.successful,
+                    failed = failed + excluded.failed,
+                    total_processing_time = total_processing_time + excluded.total_processing_time,
+                    time_histogram = excluded.time_histogram""",
+                (granularity, bucket, 1 if success else 0, 0 if success else 1,
+                 processing_time or 0.0, json.dumps(histogram))
+            )
+
+    def _migrate_legacy_json(self, conn):
+        """Import the old JSON statistics file once"""
+        if not self.legacy_json_path or not os.path.exists(self.legacy_json_path):
+            return
+        try:
+            with open(self.legacy_json_path, 'r') as f:
+                legacy = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning('Stats migration: could not read %s: %s', self.legacy_json_path, e)
+            return
+
+        # BEGIN IMMEDIATE takes the write lock, so only one process imports the file
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_json_migrated'").fetchone():
+                conn.execute('COMMIT')
+                return
+            conn.execute(
+                """UPDATE counters SET
+                    total_processed = total_processed + ?,
+                    total_successful = total_successful + ?,
+                    total_failed = total_failed + ?,
+                    total_processing_time = total_processing_time + ?,
+                    updated_at = ?
+                WHERE id = 1""",
+                (legacy.get('total_processed', 0), legacy.get('total_successful', 0),
+                 legacy.get('total_failed', 0), legacy.get('total_processing_time', 0.0),
+                 datetime.now().isoformat())
+            )
+            conn.executemany(
+                'INSERT INTO history (timestamp, success, processing_time, user_email) VALUES (?, ?, ?, ?)',
+                [(record.get('timestamp'), 1 if record.get('success') else 0,
+                  record.get('processing_time'), record.get('user_email'))
+                 for record in legacy.get('processing_history', [])]
+            )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_json_migrated', ?)", (datetime.now().isoformat(),))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        # Keep the old file around, renamed so it is not imported again by hand
+        try:
+            os.replace(self.legacy_json_path, f"{self.legacy_json_path}.migrated")
+        except OSError:
+            pass
+        log.info('Stats migration: imported %s into %s', self.legacy_json_path, self.db_path)
+
+    def add_record(self, success, processing_time, user_email=None, report=None):
+        """
+        Append a processing record and update the counters and rollups in one transaction.
+
+        report is the split report (a dict) of the job, stored with the history record.
+        """
+        conn = self._connection()
+        timestamp = datetime.now()
+        now = timestamp.isoformat()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = conn.execute(
+                'INSERT INTO history (timestamp, success, processing_time, user_email, report) VALUES (?, ?, ?, ?, ?)',
+                (now, 1 if success else 0, processing_time, user_email, json.dumps(report) if report else None)
+            )
+            conn.execute(
+                """UPDATE counters SET
+                    total_processed = total_processed + 1,
+                    total_successful = total_successful + ?,
+                    total_failed = total_failed + ?,
+                    total_processing_time = total_processing_time + ?,
+                    updated_at = ?,
+                    version = version + 1
+                WHERE id = 1""",
+                (1 if success else 0, 0 if success else 1, processing_time or 0.0, now)
+            )
+            self._update_rollups(conn, timestamp, success, processing_time)
+            # Keep only the last history_limit records
+            conn.execute('DELETE FROM history WHERE id <= ?', (cursor.lastrowid - self.history_limit,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def add_cache_hit(self, user_email=None):
+        """
+        Count a request answered from the output cache. Hits take no processing time, so they
+        are kept out of the history, the timings and the percentiles.
+        """
+        conn = self._connection()
+        timestamp = datetime.now()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'UPDATE counters SET total_cache_hits = total_cache_hits + 1, updated_at = ?, version = version + 1 WHERE id = 1',
+                (timestamp.isoformat(),)
+            )
+            for granularity, bucket in rollup_buckets(timestamp):
+                conn.execute(
+                    """INSERT INTO rollups (granularity, bucket, total, successful, failed, total_processing_time, time_histogram, cache_hits)
+                    VALUES (?, ?, 0, 0, 0, 0, ?, 1)
+                    ON CONFLICT (granularity, bucket) DO UPDATE SET cache_hits = cache_hits + 1""",
+                    (granularity, bucket, json.dumps([0] * (len(TIME_BUCKETS) + 1)))
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get_totals(self):
+        """Current counters"""
+        row = self._connection().execute(
+            'SELECT total_processed, total_successful, total_failed, total_processing_time, total_cache_hits, updated_at, version '
+            'FROM counters WHERE id = 1'
+        ).fetchone()
+        return dict(row)
+
+    def get_version(self):
+        """Change counter and time of the last record: cheap check for cached aggregates"""
+        row = self._connection().execute('SELECT version, updated_at FROM counters WHERE id = 1').fetchone()
+        return row['version'], row['updated_at']
+
+    def get_rollup(self, granularity, bucket):
+        """One rollup as a dict, None if nothing was recorded in it"""
+        row = self._connection().execute(
+            'SELECT * FROM rollups WHERE granularity = ? AND bucket = ?', (granularity, bucket)
+        ).fetchone()
+        return rollup_to_dict(row) if row else None
+
+    def get_rollups(self, granularity, start_bucket, end_bucket):
+        """Rollups of a granularity between two bucket keys (inclusive), oldest first"""
+        rows = self._connection().execute(
+            'SELECT * FROM rollups WHERE granularity = ? AND bucket BETWEEN ? AND ? ORDER BY bucket',
+            (granularity, start_bucket, end_bucket)
+        ).fetchall()
+        return [rollup_to_dict(row) for row in rows]
+
+    def get_history(self, limit=None):
+        """Most recent history records, oldest first"""
+        limit = limit or self.history_limit
+        rows = self._connection().execute(
+            'SELECT timestamp, success, processing_time, user_email, report FROM history ORDER BY id DESC LIMIT ?',
+            (limit,)
+        ).fetchall()
+        return [
+            {
+                'timestamp': row['timestamp'],
+                'success': bool(row['success']),
+                'processing_time': row['processing_time'],
+                'user_email': row['user_email'],
+                'report': json.loads(row['report']) if row['report'] else None
+            }
+            for row in reversed(rows)
+        ]
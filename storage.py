@@ -0,0 +1,257 @@
+"""
+Retention of stored uploads and outputs.
+
+Every file kept in the storage folders is recorded in a small SQLite index
+(owner, size, created, last accessed) when it is written, and touched when it
+is used again, so the request path never lists a directory. A background
+thread in each worker process wakes up periodically; the worker that takes
+the run lease removes files older than the TTL, then the least recently used
+ones until the folders fit in the quota. Sidecars of a file (metadata, preview
+index, ETag) are removed with it.
+
+Once in a while the run also scans the folders: files missing from the index
+(written before it existed, or by code that does not record them) are added,
+rows of files removed by other code are dropped, and leftover temporary files
+(temp_* copies of /api/validate-file, *.tmp of interrupted atomic writes,
+orphaned sidecars) are removed.
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+DEFAULT_INTERVAL = 300  # Seconds between janitor runs (across all workers)
+DEFAULT_SCAN_INTERVAL = 3600  # Seconds between folder scans
+DEFAULT_GRACE = 3600  # Files used this recently are never evicted (e.g. uploads waiting for their job)
+DEFAULT_TEMP_MAX_AGE = 3600  # Temporary files older than this are leftovers
+
+TEMP_PREFIX = 'temp_'
+TMP_SUFFIX = '.tmp'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    owner TEXT,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_accessed_at ON files (accessed_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL
+);
+"""
+
+log = logging.getLogger('storage')
+
+
+class StorageJanitor:
+    """File index of the storage folders, plus the background thread that enforces TTL and quota"""
+
+    def __init__(self, db_path, folders, max_bytes, max_age, sidecar_suffixes=(), interval=DEFAULT_INTERVAL,
+                 scan_interval=DEFAULT_SCAN_INTERVAL, grace=DEFAULT_GRACE, temp_max_age=DEFAULT_TEMP_MAX_AGE,
+                 on_remove=None):
+        self.db_path = db_path
+        self.folders = [os.path.normpath(folder) for folder in folders]
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.sidecar_suffixes = tuple(sidecar_suffixes)
+        self.interval = interval
+        self.scan_interval = scan_interval
+        self.grace = grace
+        self.temp_max_age = temp_max_age
+        self.on_remove = on_remove  # on_remove(reason, size) after every removed file
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _connection(self):
+        # One connection per thread, and new ones after a fork (connections must not cross processes)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _ensure_thread(self):
+        # Started lazily (and again after a fork) so every gunicorn worker gets its own thread
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='storage-janitor', daemon=True)
+                self._thread.start()
+
+    # Request path
+
+    def record(self, path, owner=None):
+        """Add a newly written file to the index"""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        now = time.time()
+        self._connection().execute(
+            'INSERT OR REPLACE INTO files (path, owner, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+            (os.path.normpath(path), owner, size, now, now)
+        )
+        self._ensure_thread()
+
+    def touch(self, path):
+        """Mark a file as used (it moves to the end of the eviction order)"""
+        self._connection().execute('UPDATE files SET accessed_at = ? WHERE path = ?', (time.time(), os.path.normpath(path)))
+        self._ensure_thread()
+
+    def forget(self, path):
+        """Drop a file removed by other code from the index"""
+        self._connection().execute('DELETE FROM files WHERE path = ?', (os.path.normpath(path),))
+
+    def usage(self):
+        """Number of indexed files and their total size"""
+        row = self._connection().execute('SELECT COUNT(*) AS files, COALESCE(SUM(size), 0) AS bytes FROM files').fetchone()
+        return {'files': row['files'], 'bytes': row['bytes']}
+
+    # Janitor
+
+    def _run(self):
+        while True:
+            try:
+                self.run_if_due()
+            except Exception:
+                log.exception('Storage janitor run failed')
+            time.sleep(self.interval)
+
+    def _take_lease(self, conn, key, interval, now):
+        """True for the one process that should run a task now (the others see the updated time)"""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+            if row is not None and now - row['value'] < interval:
+                conn.execute('COMMIT')
+                return False
+            conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, now))
+            conn.execute('COMMIT')
+            return True
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def run_if_due(self):
+        """Run the janitor if no worker did in the last interval. Returns the removed file counts, or None."""
+        conn = self._connection()
+        now = time.time()
+        # Slightly less than the interval, so the lease is free again when the same worker wakes up
+        if not self._take_lease(conn, 'last_run', self.interval * 0.9, now):
+            return None
+        scan = self._take_lease(conn, 'last_scan', self.scan_interval, now)
+        return self.run(scan=scan)
+
+    def run(self, scan=False):
+        """Remove expired files, then the least recently used ones over the quota. Returns the removed file counts."""
+        conn = self._connection()
+        removed = {'ttl': 0, 'quota': 0, 'temp': 0}
+        if scan:
+            removed['temp'] = self.scan()
+
+        now = time.time()
+        for row in conn.execute('SELECT path, size FROM files WHERE accessed_at < ?', (now - self.max_age,)).fetchall():
+            self._remove(row['path'], row['size'], 'ttl')
+            removed['ttl'] += 1
+
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM files').fetchone()[0]
+        if total > self.max_bytes:
+            for row in conn.execute('SELECT path, size FROM files WHERE accessed_at < ? ORDER BY accessed_at',
+                                    (now - self.grace,)).fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._remove(row['path'], row['size'], 'quota')
+                removed['quota'] += 1
+                total -= row['size']
+
+        if any(removed.values()):
+            log.info('Storage janitor removed files', extra={'removed': removed, 'bytes_left': total})
+        return removed
+
+    def _remove(self, path, size, reason):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning('Could not remove %s: %s', path, e)
+            return
+        self._remove_sidecars(path)
+        self.forget(path)
+        if self.on_remove:
+            self.on_remove(reason, size)
+
+    def _remove_sidecars(self, path):
+        for suffix in self.sidecar_suffixes:
+            try:
+                os.remove(f"{path}{suffix}")
+            except OSError:
+                pass
+
+    def _sidecar_owner(self, path):
+        """Path of the file a sidecar belongs to, or None if path is not a sidecar"""
+        for suffix in self.sidecar_suffixes:
+            if path.endswith(suffix):
+                return path[:-len(suffix)]
+        return None
+
+    def scan(self):
+        """Bring the index in line with the folders and remove leftover temporary files. Returns how many were removed."""
+        conn = self._connection()
+        now = time.time()
+        indexed = {row['path'] for row in conn.execute('SELECT path FROM files').fetchall()}
+        seen = set()
+        removed = 0
+        for folder in self.folders:
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                path = os.path.normpath(entry.path)
+                sidecar_of = self._sidecar_owner(path)
+                leftover = (
+                    entry.name.startswith(TEMP_PREFIX) or entry.name.endswith(TMP_SUFFIX)
+                    or (sidecar_of is not None and not os.path.exists(sidecar_of))
+                )
+                if leftover:
+                    if now - stat.st_mtime > self.temp_max_age:
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            continue
+                        removed += 1
+                        if self.on_remove:
+                            self.on_remove('temp', stat.st_size)
+                    continue
+                if sidecar_of is not None:
+                    continue
+                seen.add(path)
+                if path not in indexed:
+                    conn.execute(
+                        'INSERT OR IGNORE INTO files (path, owner, size, created_at, accessed_at) VALUES (?, NULL, ?, ?, ?)',
+                        (path, stat.st_size, stat.st_mtime, stat.st_mtime)
+                    )
+
+        # Files removed by other code
+        for path in indexed - seen:
+            if os.path.dirname(path) in self.folders and not os.path.exists(path):
+                self.forget(path)
+        return removed
@@ -0,0 +1,110 @@
+import io
+import os
+import sys
+import random
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chunked_upload
+
+CHUNK_SIZE = 1024
+
+
+@pytest.fixture
+def sessions(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunked_upload, 'CHUNK_SIZE', CHUNK_SIZE)
+    return chunked_upload.UploadSessions(str(tmp_path / 'sessions'), max_size=1024 * 1024, max_age=3600,
+                                         max_sessions=2)
+
+
+def file_bytes(size, seed=1):
+    return random.Random(seed).randbytes(size)
+
+
+def send(sessions, upload_id, data, index, owner='user@example.com'):
+    chunk = data[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]
+    return sessions.add_chunk(upload_id, index, io.BytesIO(chunk), len(chunk), owner=owner)
+
+
+def test_upload_resumes_from_the_next_chunk(sessions, tmp_path):
+    data = file_bytes(3 * CHUNK_SIZE + 100)
+    state = sessions.create('data.xlsx', len(data), owner='user@example.com')
+    assert state['total_chunks'] == 4
+    send(sessions, state['id'], data, 0)
+    send(sessions, state['id'], data, 1)
+
+    # The connection dropped: the client asks for the state and continues from there
+    public = chunked_upload.public_state(sessions.get(state['id'], owner='user@example.com'))
+    assert (public['next_chunk'], public['received_bytes'], public['complete']) == (2, 2 * CHUNK_SIZE, False)
+    for index in range(public['next_chunk'], public['total_chunks']):
+        state = send(sessions, state['id'], data, index)
+    assert chunked_upload.public_state(state)['next_chunk'] is None
+
+    filepath = tmp_path / 'data.xlsx'
+    content_hash, size = sessions.complete(state['id'], str(filepath), owner='user@example.com')
+    assert filepath.read_bytes() == data
+    assert size == len(data)
+    assert os.listdir(sessions.folder) == ['.create.lock']
+
+
+def test_out_of_order_and_duplicate_chunks(sessions):
+    data = file_bytes(3 * CHUNK_SIZE)
+    state = sessions.create('data.xlsx', len(data), owner='user@example.com')
+
+    with pytest.raises(chunked_upload.UploadError, match='expected chunk 0') as error:
+        send(sessions, state['id'], data, 1)
+    assert error.value.status_code == 409
+
+    send(sessions, state['id'], data, 0)
+    # A chunk sent again is acknowledged without being written again
+    other = file_bytes(CHUNK_SIZE, seed=2)
+    state = sessions.add_chunk(state['id'], 0, io.BytesIO(other), CHUNK_SIZE, owner='user@example.com')
+    assert state['received'] == 1
+    with open(os.path.join(sessions.folder, f"{state['id']}.part"), 'rb') as f:
+        assert f.read(CHUNK_SIZE) == data[:CHUNK_SIZE]
+
+    with pytest.raises(chunked_upload.UploadError, match='out of order'):
+        send(sessions, state['id'], data, 2)
+    with pytest.raises(chunked_upload.UploadError, match='must be 1024 bytes'):
+        sessions.add_chunk(state['id'], 1, io.BytesIO(b'short'), 5, owner='user@example.com')
+    with pytest.raises(chunked_upload.UploadError, match='incomplete') as error:
+        sessions.complete(state['id'], os.path.join(sessions.folder, 'out'), owner='user@example.com')
+    assert error.value.status_code == 409
+    # Another user cannot see or add to the upload
+    with pytest.raises(chunked_upload.UploadError, match='not found'):
+        send(sessions, state['id'], data, 1, owner='other@example.com')
+
+
+@pytest.mark.parametrize('size', [1, CHUNK_SIZE - 1, CHUNK_SIZE, 3 * CHUNK_SIZE, 3 * CHUNK_SIZE + 7])
+def test_chunked_and_single_request_uploads_have_the_same_fingerprint(sessions, tmp_path, size):
+    data = file_bytes(size)
+    state = sessions.create('data.xlsx', size, owner='user@example.com')
+    for index in range(state['total_chunks']):
+        send(sessions, state['id'], data, index)
+    content_hash, _ = sessions.complete(state['id'], str(tmp_path / 'data.xlsx'), owner='user@example.com')
+
+    # Like save_upload (/upload), fed in reads that do not line up with the blocks
+    hasher = chunked_upload.BlockHasher()
+    stream = io.BytesIO(data)
+    while True:
+        read = stream.read(700)
+        if not read:
+            break
+        hasher.update(read)
+    assert hasher.hexdigest() == content_hash
+
+
+def test_unfinished_uploads_are_limited_per_owner(sessions, tmp_path):
+    first = sessions.create('first.xlsx', 10, owner='user@example.com')
+    sessions.create('second.xlsx', 10, owner='user@example.com')
+    with pytest.raises(chunked_upload.UploadError, match='Too many unfinished uploads') as error:
+        sessions.create('third.xlsx', 10, owner='user@example.com')
+    assert error.value.status_code == 429
+    # Other users have their own limit
+    sessions.create('other.xlsx', 10, owner='other@example.com')
+
+    # Completing or cancelling an upload frees its place
+    sessions.abort(first['id'], owner='user@example.com')
+    sessions.create('third.xlsx', 10, owner='user@example.com')
@@ -0,0 +1,131 @@
+import io
+import os
+import sys
+import time
+
+import openpyxl
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import split
+import stats_store
+
+LONG_TEXT = 'a long text that has to be split into several parts'
+
+
+@pytest.fixture(scope='module')
+def appmod(tmp_path_factory):
+    # The app keeps its folders and databases relative to the working directory
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('app'))
+    import app
+    app.app.config['TESTING'] = True
+    yield app
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def client(appmod, tmp_path, monkeypatch):
+    monkeypatch.setattr(appmod, 'stats', stats_store.StatsStore(str(tmp_path / 'stats.db')))
+    client = appmod.app.test_client()
+    with client.session_transaction() as session:
+        session['user_info'] = {'id': 'u1', 'email': 'u1@example.com', 'name': 'User One', 'picture': ''}
+        session['_user_id'] = 'u1'
+        session['_fresh'] = True
+    return client
+
+
+def upload(client, rows=1000):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for row in range(1, rows + 1):
+        ws.cell(row, 1, LONG_TEXT if row % 2 else 'short')
+    data = io.BytesIO()
+    wb.save(data)
+    data.seek(0)
+    response = client.post('/upload', data={'file': (data, 'rows.xlsx')}, content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['uploaded_filename']
+
+
+def estimate(client, uploaded_filename, **params):
+    response = client.post('/api/estimate', json={'uploaded_filename': uploaded_filename, 'column': 'A',
+                                                  'max_chars': 20, **params})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def add_jobs(appmod, count, engine, processing_time=2.0, rows_scanned=1000, input_bytes=10000, output_bytes=16000,
+             overflow_cells=1000):
+    for _ in range(count):
+        appmod.stats.add_record(True, processing_time, report={
+            'engine': engine, 'output_format': split.OUTPUT_XLSX, 'rows_scanned': rows_scanned,
+            'input_bytes': input_bytes, 'output_bytes': output_bytes, 'overflow_cells': overflow_cells
+        })
+
+
+def test_sampled_estimate_is_projected_to_the_whole_sheet(client):
+    uploaded_filename = upload(client)
+    parts = len(split.split_text(LONG_TEXT, 20))
+
+    result = estimate(client, uploaded_filename, sample_rows=100)
+    assert (result['sampled'], result['rows_read'], result['total_rows']) == (True, 100, 1000)
+    assert result['overflow_cells'] == 500 * (parts - 1)
+    assert result['overflow_columns'] == parts - 1
+    assert result['cached'] is False
+
+    full = estimate(client, uploaded_filename, sample_rows=0)
+    assert (full['sampled'], full['rows_read']) == (False, 1000)
+    assert full['overflow_cells'] == result['overflow_cells']
+    assert full['estimated_output_bytes'] == result['estimated_output_bytes']
+
+
+def test_estimate_uses_defaults_below_the_minimum_jobs(appmod, client):
+    uploaded_filename = upload(client)
+    engine = estimate(client, uploaded_filename)['engine']
+    add_jobs(appmod, appmod.ESTIMATE_MIN_JOBS - 1, engine)
+    # Failed jobs and other engines do not count
+    appmod.stats.add_record(False, 2.0, report={'engine': engine, 'rows_scanned': 1000})
+    add_jobs(appmod, 1, split.ENGINE_IN_MEMORY if engine != split.ENGINE_IN_MEMORY else split.ENGINE_STREAMING)
+
+    result = estimate(client, uploaded_filename)
+    calibration = result['calibration']
+    assert (calibration['timed_jobs'], calibration['sized_jobs']) == (appmod.ESTIMATE_MIN_JOBS - 1,) * 2
+    seconds_per_row = appmod.ESTIMATE_DEFAULT_SECONDS_PER_ROW[(engine, split.OUTPUT_XLSX)]
+    assert calibration['seconds_per_row'] == seconds_per_row
+    assert calibration['overflow_cell_bytes'] == appmod.ESTIMATE_DEFAULT_OVERFLOW_CELL_BYTES
+    assert result['estimated_runtime'] == round(1000 * seconds_per_row, 2)
+    assert result['estimated_output_bytes'] == (
+        result['input_bytes'] + result['overflow_cells'] * appmod.ESTIMATE_DEFAULT_OVERFLOW_CELL_BYTES
+    )
+
+    # From ESTIMATE_MIN_JOBS matching jobs on, their measurements are used
+    add_jobs(appmod, 1, engine)
+    calibration = estimate(client, uploaded_filename)['calibration']
+    assert calibration['timed_jobs'] == appmod.ESTIMATE_MIN_JOBS
+    assert calibration['seconds_per_row'] == pytest.approx(2.0 / 1000)
+    assert calibration['overflow_cell_bytes'] == pytest.approx(6.0)
+
+
+def test_estimate_of_a_processed_file_is_cached(client):
+    uploaded_filename = upload(client)
+    assert estimate(client, uploaded_filename)['cached'] is False
+
+    job_id = client.post('/process', json={'uploaded_filename': uploaded_filename, 'column': 'A',
+                                           'max_chars': 20}).get_json()['job_id']
+    deadline = time.time() + 30
+    while True:
+        job = client.get(f'/jobs/{job_id}').get_json()['job']
+        if job['done']:
+            break
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.05)
+    assert job['result']['success'], job['result']
+
+    result = estimate(client, uploaded_filename)
+    assert result['cached'] is True
+    assert result['estimated_runtime'] == 0.0
+    assert result['estimated_output_bytes'] == job['result']['report']['output_bytes']
+    # Another max_chars is another output
+    assert estimate(client, uploaded_filename, max_chars=18)['cached'] is False
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingest
+import split
+
+
+def test_check_column_of_text_file_beyond_the_data(tmp_path):
+    source = tmp_path / 'two_columns.csv'
+    source.write_text('first,second\nthird,fourth\n')
+    metadata = ingest.inspect_file(str(source))
+
+    assert ingest.check_column(metadata, 'D', text=True) == (
+        False, "Column 'D' does not exist in the file. Available columns: A to B")
+    assert ingest.check_column(metadata, 'B', text=True)[1].startswith('Data exists in multiple columns')
+
+
+def test_check_column_of_workbook_outside_the_sheet_matches_split(tmp_path):
+    source = str(tmp_path / 'sheet.xlsx')
+    wb = openpyxl.Workbook()
+    wb.active['B1'] = 'a long text that has to be split into several parts'
+    wb.active['B2'] = 'another one'
+    wb.save(source)
+    metadata = ingest.inspect_file(source)
+
+    success, message, _ = split.main(source, 'D', 20, output_dir=str(tmp_path))
+    assert not success
+    assert ingest.check_column(metadata, 'D') == (False, message)
+    assert message == "Column 'D' does not exist in the sheet. Available columns: B to B"
+    assert ingest.check_column(metadata, 'B') == (True, None)
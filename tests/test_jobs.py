@@ -0,0 +1,60 @@
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jobs
+
+
+def wait_done(queue, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['state'] in jobs.FINISHED_STATES:
+            return job
+        time.sleep(0.01)
+    raise TimeoutError(job_id)
+
+
+def age(queue, job_id, seconds):
+    path = queue._path(job_id)
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_remove_expired_keeps_recent_and_unfinished_jobs(tmp_path):
+    queue = jobs.JobQueue(str(tmp_path), max_workers=1, max_age=60)
+    old_id = queue.submit(lambda: {'success': True})
+    recent_id = queue.submit(lambda: {'success': False, 'error': 'failed'})
+    wait_done(queue, old_id)
+    wait_done(queue, recent_id)
+    age(queue, old_id, 120)
+
+    # A job of this (running) process that is still queued is kept however old
+    queued_id = '0' * 32
+    with open(queue._path(queued_id), 'w') as f:
+        json.dump({'id': queued_id, 'state': jobs.JOB_QUEUED, 'pid': os.getpid()}, f)
+    age(queue, queued_id, 120)
+
+    queue.remove_expired()
+
+    assert queue.get(old_id) is None
+    assert queue.get(recent_id)['state'] == jobs.JOB_FAILED
+    assert queue.get(queued_id)['state'] == jobs.JOB_QUEUED
+
+
+def test_failing_job_is_logged(tmp_path, caplog):
+    queue = jobs.JobQueue(str(tmp_path), max_workers=1)
+
+    def fail():
+        raise ValueError('broken input')
+
+    job_id = queue.submit(fail)
+    job = wait_done(queue, job_id)
+    assert job['state'] == jobs.JOB_FAILED
+    assert job['error'] == 'broken input'
+    record = next(record for record in caplog.records if record.name == 'jobs')
+    assert record.getMessage() == f'job {job_id} failed'
+    assert record.exc_info[0] is ValueError
@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+import threading
+import socketserver
+
+import pytest
+from flask import Flask
+from flask_mail import Mail, Message
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mail_outbox
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Minimal SMTP server on localhost: refuses recipients starting with 'refused', answers the
+    first DATA of a message with the subject 'flaky' with a transient error"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.delivered = []  # (subject, time)
+        self.attempts = []  # Subjects of every DATA and refused RCPT
+        self.flaky_failed_at = None
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply('220 localhost ESMTP stand-in')
+        while True:
+            line = self.rfile.readline().decode('utf-8', 'replace').strip()
+            command = line[:4].upper()
+            if not line or command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            if command == 'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif command == 'RCPT' and '<refused' in line:
+                server.attempts.append('refused')
+                self.reply('550 No such user')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                subject = None
+                while True:
+                    data = self.rfile.readline().decode('utf-8', 'replace')
+                    if data in ('.\r\n', ''):
+                        break
+                    if data.startswith('Subject: '):
+                        subject = data[len('Subject: '):].strip()
+                server.attempts.append(subject)
+                if subject == 'flaky' and server.flaky_failed_at is None:
+                    server.flaky_failed_at = time.time()
+                    self.reply('451 Try again later')
+                else:
+                    server.delivered.append((subject, time.time()))
+                    self.reply('250 Queued')
+            else:
+                # HELO, MAIL, RCPT, RSET, NOOP
+                self.reply('250 OK')
+
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_outbox(port, **kwargs):
+    app = Flask(__name__)
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=port, MAIL_USE_TLS=False, MAIL_USE_SSL=False,
+                      MAIL_DEFAULT_SENDER='app@example.com')
+    return mail_outbox.MailOutbox(app, Mail(app), **kwargs)
+
+
+def message(outbox, subject, recipient='user@example.com'):
+    with outbox.app.app_context():
+        return Message(subject=subject, recipients=[recipient], body='Your file was processed.')
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_messages_are_sent_over_one_connection(smtp_server):
+    outbox = make_outbox(smtp_server.server_address[1])
+    for number in range(5):
+        outbox.enqueue(message(outbox, f'message {number}'))
+
+    assert outbox.flush()
+    assert sorted(subject for subject, _ in smtp_server.delivered) == [f'message {number}' for number in range(5)]
+    assert smtp_server.connections == 1
+    stats = outbox.stats()
+    assert (stats['sent'], stats['failed'], stats['retried'], stats['connections']) == (5, 0, 0, 1)
+    assert stats['pending'] == 0 and stats['connected']
+
+
+def test_transient_errors_are_retried_with_backoff(smtp_server):
+    outbox = make_outbox(smtp_server.server_address[1], backoff=0.3)
+    outbox.enqueue(message(outbox, 'flaky'))
+
+    # Waiting for the retry, the message still counts in the depth
+    wait_for(lambda: outbox.stats()['retried'] == 1)
+    assert outbox.depth() == 1
+    assert outbox.flush()
+
+    assert smtp_server.attempts == ['flaky', 'flaky']
+    assert smtp_server.delivered[0][1] - smtp_server.flaky_failed_at >= 0.3
+    stats = outbox.stats()
+    assert (stats['sent'], stats['failed'], stats['retried'], stats['pending']) == (1, 0, 1, 0)
+
+
+def test_permanent_errors_are_not_retried(smtp_server):
+    outbox = make_outbox(smtp_server.server_address[1], backoff=0.05)
+    outbox.enqueue(message(outbox, 'refused', recipient='refused@example.com'))
+    outbox.enqueue(message(outbox, 'accepted'))
+
+    assert outbox.flush()
+    time.sleep(0.2)  # Longer than the backoff: nothing is sent again
+    assert smtp_server.attempts == ['refused', 'accepted']
+    assert [subject for subject, _ in smtp_server.delivered] == ['accepted']
+    stats = outbox.stats()
+    assert (stats['sent'], stats['failed'], stats['retried'], stats['pending']) == (1, 1, 0, 0)
@@ -0,0 +1,318 @@
+import os
+import re
+import sys
+import random
+import zipfile
+from datetime import datetime
+
+import openpyxl
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import split
+import xlsx_raw
+
+ENGINES = (split.ENGINE_IN_MEMORY, split.ENGINE_STREAMING, split.ENGINE_RAW_XML)
+LONG_TEXT = 'a long text that has to be split into several parts'
+
+
+def baseline_split(value, max_chars):
+    """The cell loop of the original main(): split on the last space before max_chars, strip both parts"""
+    parts = [value]
+    while isinstance(parts[-1], str) and len(parts[-1].strip()) > max_chars:
+        split_index = parts[-1].rfind(' ', 0, max_chars)
+        if split_index == -1:
+            break
+        remaining = parts[-1]
+        parts[-1] = remaining[:split_index].strip()
+        parts.append(remaining[split_index + 1:].strip())
+    return parts
+
+
+@pytest.mark.parametrize('value', [
+    None, '', ' ', 42, 3.5, True, datetime(2024, 1, 2, 3, 4),
+    'short',
+    'exactly twenty chars',
+    'a value with   runs of    spaces   between words',
+    '   leading and trailing whitespace around the words   ',
+    'tabs\tand\nnewlines are not split points but are stripped\t',
+    'nonbreaking\u00a0spaces\u00a0only\u00a0count\u00a0for\u00a0strip and this',
+    'averyveryverylongwordwithoutanyspace',
+    'short words then averyveryverylongwordwithoutanyspace at the end',
+    'averyveryverylongwordwithoutanyspace then short words',
+    'x' * 19 + ' ' + 'y' * 19 + '    ' + 'z' * 5,
+    ' ' * 30 + 'word',
+])
+@pytest.mark.parametrize('max_chars', [1, 5, 20])
+def test_split_text_matches_the_original_loop(value, max_chars):
+    assert split.split_text(value, max_chars) == baseline_split(value, max_chars)
+
+
+def test_split_text_matches_the_original_loop_on_random_values():
+    rng = random.Random(1)
+    for _ in range(3000):
+        value = ''.join(rng.choice('ab  \t\u00a0') for _ in range(rng.randint(0, 80)))
+        max_chars = rng.randint(1, 25)
+        assert split.split_text(value, max_chars) == baseline_split(value, max_chars), (value, max_chars)
+
+
+def make_workbook(path):
+    """Column A ends with an empty formatted cell, then rows that only have a height"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for row in (1, 2, 4):
+        ws.cell(row, 1, LONG_TEXT)
+    ws.cell(5, 1).number_format = '@'
+    ws.row_dimensions[6].height = 20
+    ws.row_dimensions[7].height = 20
+    wb.save(path)
+
+    # Like LibreOffice, record the formatted rows in the sheet dimensions (openpyxl leaves them out)
+    rewritten = f"{path}.tmp"
+    with zipfile.ZipFile(path) as zin, zipfile.ZipFile(rewritten, 'w', zipfile.ZIP_DEFLATED) as zout:
+        for item in zin.infolist():
+            data = zin.read(item.filename)
+            if item.filename == 'xl/worksheets/sheet1.xml':
+                data = data.replace(b'<dimension ref="A1:A5"', b'<dimension ref="A1:A7"')
+            zout.writestr(item, data)
+    os.replace(rewritten, path)
+
+
+def read_output(path):
+    ws = openpyxl.load_workbook(path).active
+    return ws.max_row, [list(row) for row in ws.iter_rows(values_only=True)]
+
+
+def test_engines_leave_out_the_same_trailing_empty_rows(tmp_path):
+    source = str(tmp_path / 'trailing.xlsx')
+    make_workbook(source)
+
+    outputs = {}
+    for engine in ENGINES:
+        output_dir = tmp_path / engine
+        output_dir.mkdir()
+        preview = split.OutputPreview()
+        success, message, output = split.main(source, 'A', 20, engine=engine, output_dir=str(output_dir),
+                                              preview=preview)
+        assert success, message
+        outputs[engine] = read_output(output) + (preview.total_rows,)
+
+    max_row, rows, preview_rows = outputs[split.ENGINE_IN_MEMORY]
+    assert max_row == preview_rows == 5
+    assert not any(rows[2])
+    assert outputs[split.ENGINE_STREAMING] == outputs[split.ENGINE_IN_MEMORY]
+    assert outputs[split.ENGINE_RAW_XML] == outputs[split.ENGINE_IN_MEMORY]
+
+
+@pytest.mark.parametrize('content', ['first line\n\nsecond line\n\n\n', 'first line\n\nsecond line\r\n\r\n'])
+def test_text_engine_leaves_out_trailing_blank_lines(tmp_path, content):
+    source = tmp_path / 'lines.txt'
+    source.write_text(content)
+    preview = split.OutputPreview()
+    success, message, output = split.main(str(source), 'A', 20, output_dir=str(tmp_path), preview=preview)
+    assert success, message
+    assert preview.total_rows == 3
+    assert read_output(output)[0] == 3
+
+
+def test_text_column_beyond_the_data_does_not_exist(tmp_path):
+    source = tmp_path / 'two_columns.csv'
+    source.write_text('first,second\nthird,fourth\nfifth,sixth,\n')
+    expected = "Column 'E' does not exist in the file. Available columns: A to C"
+
+    success, message, output = split.main(str(source), 'E', 20, output_dir=str(tmp_path))
+    assert (success, message, output) == (False, expected, None)
+
+    estimate = split.SplitEstimate()
+    success, message, _ = split.dry_run(str(source), 'E', 20, split.SplitCache(), split.SplitReport(), estimate,
+                                        split.SplitProgress())
+    assert (success, message) == (False, expected)
+
+    # Within the rows, data in other columns is the error
+    success, message, _ = split.main(str(source), 'C', 20, output_dir=str(tmp_path))
+    assert message.startswith('Data exists in multiple columns')
+
+
+def test_split_cache_evicts_the_least_recently_used_value():
+    cache = split.SplitCache(maxsize=2)
+    first, second, third = (f'{word} value long enough to be split' for word in ('first', 'second', 'third'))
+
+    assert cache.split(first, 10) == split.split_text(first, 10)
+    cache.split(second, 10)
+    cache.split(first, 10)  # first is now the most recently used
+    cache.split(third, 10)  # evicts second
+    cache.split(first, 10)
+    cache.split(second, 10)
+    assert cache.stats() == {'hits': 2, 'misses': 4, 'entries': 2, 'hit_rate': 33.33}
+
+
+def test_split_cache_keys_include_max_chars():
+    cache = split.SplitCache()
+    assert cache.split(LONG_TEXT, 10) == split.split_text(LONG_TEXT, 10)
+    assert cache.split(LONG_TEXT, 20) == split.split_text(LONG_TEXT, 20)
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    # Values that fit are not looked up, values above max_value_length are split without being kept
+    cache = split.SplitCache(max_value_length=30)
+    cache.split('short', 10)
+    cache.split(LONG_TEXT, 10)
+    cache.split(LONG_TEXT, 10)
+    assert cache.stats() == {'hits': 0, 'misses': 2, 'entries': 0, 'hit_rate': 0.0}
+
+
+SHARED_STRINGS_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings'
+SHARED_STRINGS_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml'
+INLINE_STRING = re.compile(r'<c r="([A-Z]+[0-9]+)"( s="[0-9]+")? t="inlineStr"><is><t( xml:space="preserve")?>(.*?)</t></is></c>')
+
+
+def make_mixed_workbook(path):
+    """Column B with text to split, numbers, bools, error codes, padded and empty values"""
+    rng = random.Random(5)
+    words = ['cablu', 'NYY-J', '3x2.5', 'mm2', 'negru', 'rola', '100m', '  ', 'x' * 30, 'a&b', '<tag>', 'ăîșț']
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for row in range(1, 1500):
+        kind = rng.random()
+        if kind < 0.1:
+            continue
+        if kind < 0.13:
+            value = rng.randint(1, 10 ** 18)
+        elif kind < 0.15:
+            value = rng.random() * 1e6
+        elif kind < 0.16:
+            value = rng.choice([True, False])
+        elif kind < 0.17:
+            value = rng.choice(['#N/A', '#DIV/0!', '#VALUE!'])
+        elif kind < 0.18:
+            value = '  padded value with spaces at both ends and more  '
+        elif kind < 0.19:
+            value = ''
+        else:
+            value = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 12)))
+        ws.cell(row, 2, value)
+    wb.save(path)
+
+
+def to_shared_strings(source, path):
+    """Rewrite the inline strings openpyxl writes as a shared string table, the way Excel writes them"""
+    strings = {}
+
+    def shared(match):
+        ref, style, space, text = match.groups()
+        index = strings.setdefault((space or '', text), len(strings))
+        return f'<c r="{ref}"{style or ""} t="s"><v>{index}</v></c>'
+
+    with zipfile.ZipFile(source) as zin, zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zout:
+        for item in zin.infolist():
+            data = zin.read(item.filename).decode('utf-8')
+            if item.filename == 'xl/worksheets/sheet1.xml':
+                data = INLINE_STRING.sub(shared, data)
+            elif item.filename == 'xl/_rels/workbook.xml.rels':
+                data = data.replace('</Relationships>', f'<Relationship Id="rIdSS" Type="{SHARED_STRINGS_TYPE}" '
+                                                        'Target="sharedStrings.xml"/></Relationships>')
+            elif item.filename == '[Content_Types].xml':
+                data = data.replace('</Types>', '<Override PartName="/xl/sharedStrings.xml" '
+                                                f'ContentType="{SHARED_STRINGS_CONTENT_TYPE}"/></Types>')
+            zout.writestr(item.filename, data)
+        items = ''.join(f'<si><t{space}>{text}</t></si>' for space, text in strings)
+        zout.writestr('xl/sharedStrings.xml', '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                                              f'count="{len(strings)}" uniqueCount="{len(strings)}">{items}</sst>')
+    assert strings
+
+
+def sheet_xml(path):
+    with zipfile.ZipFile(path) as archive:
+        return archive.read('xl/worksheets/sheet1.xml')
+
+
+def run_engines(tmp_path, source, column='B', max_chars=20):
+    """Run the streaming and raw XML engines on source, each into its own directory"""
+    results = {}
+    for engine in (split.ENGINE_STREAMING, split.ENGINE_RAW_XML):
+        output_dir = tmp_path / f'{os.path.basename(source)}.{engine}'
+        output_dir.mkdir()
+        report = split.SplitReport()
+        results[engine] = split.main(source, column, max_chars, engine=engine, report=report,
+                                     output_dir=str(output_dir)) + (report, output_dir)
+    return results[split.ENGINE_STREAMING], results[split.ENGINE_RAW_XML]
+
+
+REPORT_COUNTS = ('rows_scanned', 'cells_split', 'overflow_cells', 'overflow_columns', 'longest_chain')
+
+
+@pytest.mark.parametrize('shared_strings', [False, True])
+def test_raw_xml_engine_writes_the_same_output_as_streaming(tmp_path, shared_strings):
+    source = str(tmp_path / 'mixed.xlsx')
+    make_mixed_workbook(source)
+    if shared_strings:
+        inline_source, source = source, str(tmp_path / 'mixed_shared.xlsx')
+        to_shared_strings(inline_source, source)
+
+    streaming, raw = run_engines(tmp_path, source)
+    assert streaming[0], streaming[1]
+    assert raw[:2] == streaming[:2]
+    streaming_report, raw_report = streaming[3], raw[3]
+    assert (raw_report.engine, raw_report.fallback) == (split.ENGINE_RAW_XML, None)
+    assert raw_report.overflow_columns > 1
+    assert sheet_xml(raw[2]) == sheet_xml(streaming[2])
+    streaming_counts, raw_counts = streaming_report.to_dict(), raw_report.to_dict()
+    assert [raw_counts[key] for key in REPORT_COUNTS] == [streaming_counts[key] for key in REPORT_COUNTS]
+
+
+@pytest.mark.parametrize('value, reason', [('=1+2', 'formulas'), (datetime(2024, 1, 2), 'dates')])
+def test_raw_xml_engine_falls_back_to_streaming(tmp_path, value, reason):
+    source = str(tmp_path / 'fallback.xlsx')
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for row in range(1, 100):
+        ws.cell(row, 2, LONG_TEXT)
+    ws.cell(100, 2, value)
+    wb.save(source)
+
+    # The raw engine stops at the last row, after writing the others, and removes what it wrote
+    output_dir = tmp_path / 'direct'
+    output_dir.mkdir()
+    output_filename = split.get_output_filename(source, str(output_dir))
+    with pytest.raises(xlsx_raw.Unsupported, match=reason):
+        xlsx_raw.process_raw_xml(source, 'B', 20, split.SplitCache(), split.SplitReport(), output_filename,
+                                 split.OutputPreview(), split.SplitProgress())
+    assert os.listdir(output_dir) == []
+
+    streaming, raw = run_engines(tmp_path, source)
+    assert raw[:2] == streaming[:2]
+    assert streaming[0], streaming[1]
+    assert (raw[3].engine, raw[3].fallback) == (split.ENGINE_STREAMING, reason)
+    assert os.listdir(raw[4]) == [os.path.basename(raw[2])]
+    assert sheet_xml(raw[2]) == sheet_xml(streaming[2])
+
+
+@pytest.mark.parametrize('extension', ['xlsx', 'csv'])
+def test_sampled_estimate_is_projected_to_every_row(tmp_path, extension):
+    source = tmp_path / f'rows.{extension}'
+    if extension == 'csv':
+        source.write_text(f'{LONG_TEXT}\nshort\n' * 500)
+    else:
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        for row in range(1, 1001):
+            ws.cell(row, 1, LONG_TEXT if row % 2 else 'short')
+        wb.save(source)
+    parts = len(split.split_text(LONG_TEXT, 20))
+
+    estimates = {}
+    for sample_rows in (100, None):
+        estimate = split.SplitEstimate(sample_rows)
+        success, message, output = split.main(str(source), 'A', 20, estimate=estimate)
+        assert (success, output) == (True, None), message
+        estimates[sample_rows] = estimate.to_dict()
+    assert os.listdir(tmp_path) == [source.name]
+
+    sampled, full = estimates[100], estimates[None]
+    assert (sampled['sampled'], sampled['rows_read'], sampled['total_rows']) == (True, 100, 1000)
+    assert sampled['parts_histogram'] == {'1': 50, str(parts): 50}
+    assert (full['sampled'], full['rows_read'], full['total_rows']) == (False, 1000, 1000)
+    # Counts of the sample are scaled to the rows of the whole file
+    for key in ('cells_split', 'overflow_cells', 'overflow_columns', 'longest_chain'):
+        assert sampled[key] == full[key], key
+    assert full['overflow_cells'] == 500 * (parts - 1)
@@ -0,0 +1,63 @@
+import os
+import sys
+import json
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stats_store
+
+
+def write_legacy_json(path, total_processed, history_count):
+    start = datetime(2024, 1, 1, 8, 30)
+    history = [
+        {
+            'timestamp': (start + timedelta(minutes=10 * i)).isoformat(),
+            'success': True,
+            'processing_time': 1.0,
+            'user_email': 'user@example.com'
+        }
+        for i in range(history_count)
+    ]
+    with open(path, 'w') as f:
+        json.dump({
+            'total_processed': total_processed,
+            'total_successful': total_processed,
+            'total_failed': 0,
+            'total_processing_time': float(total_processed),
+            'processing_history': history
+        }, f)
+    return start
+
+
+def test_migration_of_more_records_than_the_history_marks_rollups_partial(tmp_path):
+    legacy_path = str(tmp_path / 'processing_stats.json')
+    start = write_legacy_json(legacy_path, total_processed=2500, history_count=stats_store.HISTORY_LIMIT)
+    store = stats_store.StatsStore(str(tmp_path / 'processing_stats.db'), legacy_json_path=legacy_path)
+
+    totals = store.get_totals()
+    assert totals['total_processed'] == 2500
+    assert os.path.exists(f"{legacy_path}.migrated")
+
+    all_time = store.get_rollup(stats_store.ROLLUP_ALL, stats_store.ROLLUP_ALL)
+    assert all_time['total_processed'] == stats_store.HISTORY_LIMIT
+    assert all_time['partial'] is True
+
+    # The day of the oldest kept record lost its earlier records, the next days are complete
+    day_format = stats_store.ROLLUP_BUCKET_FORMATS[stats_store.ROLLUP_DAY]
+    assert store.get_rollup(stats_store.ROLLUP_DAY, start.strftime(day_format))['partial'] is True
+    assert store.get_rollup(stats_store.ROLLUP_DAY, (start + timedelta(days=1)).strftime(day_format))['partial'] is False
+
+    # New records keep the flag
+    store.add_record(True, 2.0)
+    assert store.get_rollup(stats_store.ROLLUP_ALL, stats_store.ROLLUP_ALL)['partial'] is True
+
+
+def test_migration_of_the_whole_history_is_complete(tmp_path):
+    legacy_path = str(tmp_path / 'processing_stats.json')
+    write_legacy_json(legacy_path, total_processed=50, history_count=50)
+    store = stats_store.StatsStore(str(tmp_path / 'processing_stats.db'), legacy_json_path=legacy_path)
+
+    all_time = store.get_rollup(stats_store.ROLLUP_ALL, stats_store.ROLLUP_ALL)
+    assert all_time['total_processed'] == store.get_totals()['total_processed'] == 50
+    assert all_time['partial'] is False
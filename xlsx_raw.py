@@ -0,0 +1,419 @@
+"""
+Raw-XML engine for split.main: the common case of one worksheet holding plain
+strings and numbers, without the openpyxl object model.
+
+The worksheet XML is stream-parsed with ElementTree's incremental parser and
+the output worksheet XML is written straight into the output ZIP. The rest of
+the output package (styles, workbook, content types) is taken from a one-row
+workbook saved by openpyxl, and cell values are written the way openpyxl
+writes them, so the output is the same as the streaming engine's. Anything
+this engine does not handle (several sheets, rich text, formulas, dates, ...)
+raises Unsupported, and split.main falls back to the streaming engine.
+"""
+import io
+import os
+import re
+import time
+import zipfile
+import posixpath
+from xml.etree.ElementTree import XMLPullParser, fromstring
+from xml.sax.saxutils import escape
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ERROR_CODES
+from openpyxl.styles import numbers
+from openpyxl.styles.stylesheet import Stylesheet
+from openpyxl.utils import get_column_letter, column_index_from_string, range_boundaries
+
+import split
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+WORKSHEET_REL = f'{REL_NS}/worksheet'
+SHARED_STRINGS_REL = f'{REL_NS}/sharedStrings'
+STYLES_REL = f'{REL_NS}/styles'
+OFFICE_DOCUMENT_REL = f'{REL_NS}/officeDocument'
+
+_ROW = f'{{{MAIN_NS}}}row'
+_CELL = f'{{{MAIN_NS}}}c'
+_VALUE = f'{{{MAIN_NS}}}v'
+_FORMULA = f'{{{MAIN_NS}}}f'
+_INLINE_STRING = f'{{{MAIN_NS}}}is'
+_TEXT = f'{{{MAIN_NS}}}t'
+_RICH_RUN = f'{{{MAIN_NS}}}r'
+_STRING_ITEM = f'{{{MAIN_NS}}}si'
+_DIMENSION = f'{{{MAIN_NS}}}dimension'
+_SHEET_DATA = f'{{{MAIN_NS}}}sheetData'
+
+READ_SIZE = 64 * 1024  # Bytes of XML fed to the parser at a time
+WRITE_BATCH_ROWS = 200  # Output rows encoded and written to the ZIP at a time
+MAX_STRING_LENGTH = 32767  # openpyxl truncates longer strings, leave those to it
+
+
+class Unsupported(Exception):
+    """The workbook uses something this engine does not handle, use another engine"""
+
+
+def _resolve(base_dir, target):
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(base_dir, target))
+
+
+def _read_rels(archive, part):
+    """Relationships of a package part: {id: (type, path)}"""
+    directory, name = posixpath.split(part)
+    try:
+        root = fromstring(archive.read(posixpath.join(directory, '_rels', f'{name}.rels')))
+    except KeyError:
+        return {}
+    return {
+        rel.get('Id'): (rel.get('Type'), _resolve(directory, rel.get('Target')))
+        for rel in root.iter(f'{{{PKG_REL_NS}}}Relationship')
+        if rel.get('TargetMode') != 'External'
+    }
+
+
+def _read_workbook(archive):
+    """
+    Find the parts of a single-sheet workbook.
+
+    Returns: (sheet_title, sheet_path, shared_strings_path, styles_path)
+    """
+    workbook_path = next((path for rel_type, path in _read_rels(archive, '').values()
+                          if rel_type == OFFICE_DOCUMENT_REL), None)
+    if workbook_path is None:
+        raise Unsupported('no workbook part (strict OOXML or not an xlsx file)')
+    workbook = fromstring(archive.read(workbook_path))
+    sheets = list(workbook.iter(f'{{{MAIN_NS}}}sheet'))
+    if len(sheets) != 1:
+        # The streaming engine reports the error
+        raise Unsupported(f'{len(sheets)} sheets')
+
+    rels = _read_rels(archive, workbook_path)
+    rel_type, sheet_path = rels.get(sheets[0].get(f'{{{REL_NS}}}id'), (None, None))
+    if rel_type != WORKSHEET_REL:
+        raise Unsupported('the sheet is not a worksheet')
+    shared_strings_path = styles_path = None
+    for rel_type, path in rels.values():
+        if rel_type == SHARED_STRINGS_REL:
+            shared_strings_path = path
+        elif rel_type == STYLES_REL:
+            styles_path = path
+    return sheets[0].get('name'), sheet_path, shared_strings_path, styles_path
+
+
+def _iter_elements(source, tag, container, headers=()):
+    """
+    Yield every completed `tag` element of an XML stream, plus the elements
+    whose tag is in `headers` as soon as they start (only their attributes are set).
+
+    Elements are detached from `container` once the caller is done with them,
+    so memory stays flat however many there are.
+    """
+    parser = XMLPullParser(events=('start', 'end'))
+    parent = None
+    while True:
+        data = source.read(READ_SIZE)
+        if data:
+            parser.feed(data)
+        else:
+            parser.close()
+        for event, element in parser.read_events():
+            if event == 'end':
+                if element.tag == tag:
+                    yield element
+                    if parent is not None:
+                        parent.clear()
+            elif element.tag == container:
+                parent = element
+            elif element.tag in headers:
+                yield element
+        if not data:
+            return
+
+
+def _read_shared_strings(archive, path):
+    """Shared strings as openpyxl reads them (without rich text)"""
+    strings = []
+    if path is None:
+        return strings
+    with archive.open(path) as source:
+        for item in _iter_elements(source, _STRING_ITEM, f'{{{MAIN_NS}}}sst'):
+            if item.find(_RICH_RUN) is not None:
+                raise Unsupported('rich text')
+            text = item.findtext(_TEXT) or ''
+            strings.append(text.replace('x005F_', ''))
+    return strings
+
+
+def _read_date_styles(archive, path):
+    """Indexes of the cell styles with a date or time number format"""
+    if path is None:
+        return set()
+    stylesheet = Stylesheet.from_tree(fromstring(archive.read(path)))
+    return stylesheet.date_formats | stylesheet.timedelta_formats
+
+
+def _template(title):
+    """
+    The output package from openpyxl: a write-only workbook with one text-formatted cell.
+
+    Returns: (parts, sheet_path, sheet_head, sheet_tail, text_style)
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    sheet = wb.create_sheet(title=title)
+    cell = WriteOnlyCell(sheet, value=None)
+    cell.number_format = numbers.FORMAT_TEXT
+    sheet.append([cell])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+
+    parts = []
+    with zipfile.ZipFile(buffer) as archive:
+        sheet_path = _read_workbook(archive)[1]
+        for info in archive.infolist():
+            parts.append((info.filename, archive.read(info.filename)))
+    sheet_xml = dict(parts)[sheet_path].decode('utf-8')
+    head, rest = sheet_xml.split('<sheetData>', 1)
+    row, tail = rest.split('</sheetData>', 1)
+    text_style = re.search(r' s="(\d+)"', row).group(1)
+    return parts, sheet_path, head + '<sheetData>', '</sheetData>' + tail, text_style
+
+
+def _format_value(ref, value, style=''):
+    """One <c> element, written the way openpyxl's write-only cells are"""
+    if value is None:
+        return f'<c r="{ref}"{style} t="n" />'
+    if isinstance(value, str):
+        if len(value) > 1 and value[0] == '=':
+            # openpyxl would write it as a formula
+            raise Unsupported('text starting with "="')
+        if value in ERROR_CODES:
+            return f'<c r="{ref}"{style} t="e"><v>{value}</v></c>'
+        if value == '':
+            return f'<c r="{ref}"{style} t="inlineStr" />'
+        stripped = value.strip()
+        space = ' xml:space="preserve"' if stripped and stripped != value else ''
+        return f'<c r="{ref}"{style} t="inlineStr"><is><t{space}>{escape(value)}</t></is></c>'
+    if isinstance(value, bool):
+        return f'<c r="{ref}"{style} t="b"><v>{1 if value else 0}</v></c>'
+    return f'<c r="{ref}"{style} t="n"><v>{"%.16g" % value}</v></c>'
+
+
+def _cell_value(cell, shared_strings, date_styles):
+    """The value openpyxl would read for a <c> element (data_only=False)"""
+    if cell.find(_FORMULA) is not None:
+        raise Unsupported('formulas')
+    data_type = cell.get('t', 'n')
+    if data_type == 'inlineStr':
+        child = cell.find(_INLINE_STRING)
+        if child is None:
+            return None
+        if child.find(_RICH_RUN) is not None:
+            raise Unsupported('rich text')
+        value = child.findtext(_TEXT) or ''
+    else:
+        value = cell.findtext(_VALUE) or None
+        if value is None:
+            return None
+        if data_type == 'n':
+            if int(cell.get('s', 0)) in date_styles:
+                raise Unsupported('dates')
+            return float(value) if '.' in value or 'E' in value or 'e' in value else int(value)
+        if data_type == 's':
+            value = shared_strings[int(value)]
+        elif data_type == 'b':
+            return bool(int(value))
+        elif data_type not in ('str', 'e'):
+            raise Unsupported(f"cell type '{data_type}'")
+    if len(value) > MAX_STRING_LENGTH:
+        raise Unsupported('strings longer than Excel allows')
+    return value
+
+
+def process_raw_xml(file_name, column, max_chars, cache, report, output_filename, preview, progress):
+    """
+    Raw-XML engine, same arguments and result as split.process_streaming.
+
+    Raises Unsupported (with any partial output removed) for workbooks it
+    does not handle.
+    """
+    try:
+        col_idx = column_index_from_string(column)
+    except ValueError:
+        return False, f"Invalid column name: '{column}'", None
+
+    progress.start(split.PHASE_LOAD)
+    started = time.perf_counter()
+    try:
+        archive = zipfile.ZipFile(file_name)
+    except zipfile.BadZipFile:
+        raise Unsupported('not a ZIP file')
+    try:
+        title, sheet_path, shared_strings_path, styles_path = _read_workbook(archive)
+        shared_strings = _read_shared_strings(archive, shared_strings_path)
+        date_styles = _read_date_styles(archive, styles_path)
+        report.add_time(split.PHASE_LOAD, time.perf_counter() - started)
+
+        with archive.open(sheet_path) as source:
+            return _process_sheet(source, title, col_idx, column, max_chars, shared_strings, date_styles,
+                                  cache, report, output_filename, preview, progress)
+    finally:
+        archive.close()
+
+
+def _process_sheet(source, title, col_idx, column, max_chars, shared_strings, date_styles, cache, report, output_filename,
+                   preview, progress):
+    started = time.perf_counter()
+    parts, sheet_path, sheet_head, sheet_tail, text_style = _template(title)
+    target_letter = get_column_letter(col_idx)
+    target_style = f' s="{text_style}"'
+    column_indexes = {}  # Column letters of input references -> index
+    column_letters = {}  # Column index of overflow cells -> letter
+    padding = [None] * (col_idx - 1)
+    empty = [None]
+
+    # Dimensions recorded in the sheet limit what openpyxl reads, so they limit what is read here
+    min_col = max_col = max_row = None
+
+    out = zipfile.ZipFile(output_filename, 'w', zipfile.ZIP_DEFLATED)
+    completed = False
+    try:
+        for name, data in parts:
+            if name != sheet_path:
+                out.writestr(name, data)
+        report.add_time(split.PHASE_SAVE, time.perf_counter() - started)
+
+        # Every phase runs once per row: accumulate locally, the report gets the totals
+        load_time = validate_time = split_time = save_time = 0.0
+        scan = split.ColumnScan(column, col_idx)
+        progress.start(split.PHASE_SPLIT)
+        with out.open(sheet_path, 'w', force_zip64=True) as sheet_out:
+            sheet_out.write(sheet_head.encode('utf-8'))
+            buffer = []
+            row_number = 0  # Last row written
+            last_number = 0  # Last row read
+            try:
+                last = time.perf_counter()
+                for element in _iter_elements(source, _ROW, _SHEET_DATA, headers=(_DIMENSION,)):
+                    if element.tag == _DIMENSION:
+                        if element.get('ref'):
+                            min_col, _, max_col, max_row = range_boundaries(element.get('ref'))
+                            progress.total_rows = max_row
+                            if col_idx < (min_col or 1) or col_idx > max_col:
+                                return False, f"Column '{column}' does not exist in the sheet. Available columns: {get_column_letter(min_col or 1)} to {get_column_letter(max_col)}", None
+                        continue
+
+                    number = element.get('r')
+                    number = int(number) if number else last_number + 1
+                    if max_row is not None and number > max_row:
+                        # openpyxl stops here (the empty rows it fills in up to max_row end the sheet)
+                        break
+                    if number <= last_number:
+                        # Repeated row numbers are skipped, like openpyxl does
+                        continue
+                    last_number = number
+
+                    # Values of the row by column, in document order
+                    values = {}
+                    column_counter = 0
+                    has_cells = False
+                    for cell in element:
+                        if cell.tag != _CELL:
+                            continue
+                        has_cells = True
+                        ref = cell.get('r')
+                        if ref:
+                            letter = ref.rstrip('0123456789')
+                            index = column_indexes.get(letter)
+                            if index is None:
+                                index = column_indexes[letter] = column_index_from_string(letter)
+                            column_counter = index
+                        else:
+                            column_counter += 1
+                        if max_col is not None and column_counter > max_col:
+                            continue
+                        value = _cell_value(cell, shared_strings, date_styles)
+                        if value is not None:
+                            values[column_counter] = value
+                    now = time.perf_counter()
+                    load_time += now - last
+                    last = now
+                    # A row without cells is written with the next row that has some (as a missing
+                    # row), so the empty rows that end the sheet are left out
+                    if not has_cells:
+                        continue
+
+                    # Rows missing from the XML are empty rows
+                    while row_number < number - 1:
+                        row_number += 1
+                        scan.feed(())
+                        preview.add(padding, empty)
+                        buffer.append(f'<row r="{row_number}"><c r="{target_letter}{row_number}"{target_style} t="n" /></row>')
+                    row_number = number
+
+                    # Data must exist ONLY in the specified column
+                    if values:
+                        row = [None] * max(values)
+                        for index, value in values.items():
+                            row[index - 1] = value
+                        valid = scan.feed(row)
+                    else:
+                        valid = scan.feed(())
+                    if not valid:
+                        return False, scan.error_message, None
+                    now = time.perf_counter()
+                    validate_time += now - last
+                    last = now
+
+                    # Split the value into the original cell plus overflow cells to the right
+                    value_parts = cache.split(values.get(col_idx), max_chars)
+                    report.count_parts(value_parts)
+                    now = time.perf_counter()
+                    split_time += now - last
+                    last = now
+
+                    cells = [_format_value(f'{target_letter}{number}', value_parts[0], target_style)]
+                    for offset, part in enumerate(value_parts[1:], start=1):
+                        letter = column_letters.get(col_idx + offset)
+                        if letter is None:
+                            letter = column_letters[col_idx + offset] = get_column_letter(col_idx + offset)
+                        cells.append(_format_value(f'{letter}{number}', part))
+                    buffer.append(f'<row r="{number}">{"".join(cells)}</row>')
+                    preview.add(padding, value_parts)
+                    progress.rows(scan.rows_scanned, report.cells_split)
+                    if len(buffer) >= WRITE_BATCH_ROWS:
+                        sheet_out.write(''.join(buffer).encode('utf-8'))
+                        buffer = []
+                    now = time.perf_counter()
+                    save_time += now - last
+                    last = now
+            finally:
+                report.rows_scanned = scan.rows_scanned
+                report.add_time(split.PHASE_LOAD, load_time)
+                report.add_time(split.PHASE_VALIDATE, validate_time)
+                report.add_time(split.PHASE_SPLIT, split_time)
+                report.add_time(split.PHASE_SAVE, save_time)
+
+            if not scan.finish():
+                return False, scan.error_message, None
+
+            progress.start(split.PHASE_SAVE)
+            started = time.perf_counter()
+            buffer.append(sheet_tail)
+            sheet_out.write(''.join(buffer).encode('utf-8'))
+        out.close()
+        report.add_time(split.PHASE_SAVE, time.perf_counter() - started)
+        preview.finish(title, row_number, col_idx - 1 + report.longest_chain, report.longest_chain)
+        completed = True
+        return True, "File successfully processed.", output_filename
+    finally:
+        if not completed:
+            out.close()
+            try:
+                os.remove(output_filename)
+            except OSError:
+                pass